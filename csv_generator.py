@@ -1,81 +1,189 @@
+import argparse
 import csv
-import random
 import datetime
 import math
+import random
+import sys
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+from operator import add, mul, sub, truediv
+
+# The settings used to generate each column, and their defaults (see the notes at the end of the file)
+DEFAULTS = OrderedDict([('base', 5.0), ('increase', 0.0), ('random_component', 10.0), ('rolls', 3),
+                        ('multiply', 0), ('divide', 0), ('season', 0.3), ('final', 1.0)])
+# Number of values generated and written at a time, so memory use doesn't grow with the file
+CHUNK_CELLS = 1 << 20
+
+
+'''
+Works out the smallest, crude average (with every random number set to 0.5) and largest values a
+column can take with the given settings, over a file spanning 'days' days.
+'''
+def value_range(days, base, increase, random_component, rolls, multiply, divide, season, final):
+    min = base
+    max = base
+    avg = base
+    if random_component != 0 and rolls != 0:
+        avg += random_component * 0.5
+        max += random_component
+    if multiply >= 1:
+        min = 0
+        avg *= pow(0.5, multiply)
+    if divide >= 1:
+        max /= pow(0.1, divide)
+        avg /= pow(0.55, divide)
+    min *= 1 - season
+    avg *= 1 - (season / 2)
+    avg *= math.pow(increase / 100 + 1, days / 730)
+    if increase >= 0:
+        max *= math.pow(increase / 100 + 1, days / 365)
+    else:
+        min *= math.pow(increase / 100 + 1, days / 365)
+    return min * final, avg * final, max * final
+
+
+'''
+Returns the strength of the seasonal effect on each date, which is the fraction of 'season' by
+which its values are reduced (0 in midwinter, up to 0.91 in midsummer), and the number of years
+since the first date of the file. Both are the same for every column.
+'''
+def date_factors(dates, start):
+    seasons = [(5.5 - abs(d.month - 6.5)) / 5.5 for d in dates]
+    years = [(d - start).days / 365 for d in dates]
+    return seasons, years
+
+
+'''
+Generates the values of one column for a list of dates, a whole column at a time: each random roll,
+multiplication and division is applied to every value at once with map() calls, which run in C,
+rather than value by value. The random numbers are drawn in the same order as a value-by-value loop
+would (every roll, multiplication and division for one day, then the next day), so the values don't
+depend on how many days are generated at a time. 'seasons' and 'years' come from date_factors(),
+'generator' is the column's random.Random, and the other settings are as in DEFAULTS.
+'''
+def generate_column(seasons, years, generator, base, increase, random_component, rolls, multiply, divide, season, final):
+    size = len(seasons)
+    passes = rolls + multiply + divide
+    rand = generator.random
+    draws = [rand() for i in repeat(None, size * passes)]
+    values = [float(base)] * size
+    for i in range(rolls):
+        values = list(map(add, values, map(mul, draws[i::passes], repeat(random_component / rolls))))
+    for i in range(rolls, rolls + multiply):
+        values = list(map(mul, values, draws[i::passes]))
+    for i in range(rolls + multiply, passes):
+        values = list(map(truediv, values, map(add, map(mul, draws[i::passes], repeat(0.9)), repeat(0.1))))
+    seasonal = map(sub, repeat(1), map(mul, seasons, repeat(season)))
+    growth = map(pow, repeat(increase / 100 + 1), years)
+    factors = map(mul, map(mul, seasonal, repeat(final)), growth)
+    return array('d', map(mul, values, factors))
+
 
-houses = int(input("Enter number of houses: "))
-headers = []
-if houses == 1:
-    headers = ["date", "electricity", "gas"]
-else:
-    headers = ["date"]
-    for i in range(houses):
-        headers.append(input("Enter house name: "))
-data = {}
-startdate = datetime.datetime.strptime(str(input("Enter start date (yyyymmdd): ")), '%Y%m%d').date()
-enddate = datetime.datetime.strptime(str(input("Enter end date (yyyymmdd): ")), '%Y%m%d').date()
-d = startdate
-while d <= enddate:
-    data[d] = []
-    d += datetime.timedelta(days=1)
-for h in headers:
-    if h == "date":
-        for d in list(data.keys()):
-            data[d].append(str(d.year) + '{num:02d}'.format(num=d.month) + '{num:02d}'.format(num=d.day))
+'''
+Writes a usage file readable by the Energy Monitor, with a value for every day from start to end
+(inclusive) for each column in 'names' (house names, or electricity and gas for a single house).
+'settings' is either one dictionary of settings used for every column, or a list with one per
+column; settings which aren't given take their value from DEFAULTS. Each column has its own random
+number generator, seeded from 'seed', so the same seed always gives the same file. The file is
+generated and written a chunk of rows at a time.
+'''
+def generate_file(file, names, start, end, settings=None, seed=None, chunk_rows=None):
+    if end < start:
+        raise ValueError("End date must not be before start date")
+    if settings is None or isinstance(settings, dict):
+        settings = [settings or {}] * len(names)
+    if len(settings) != len(names):
+        raise ValueError("Expected settings for each of the " + str(len(names)) + " columns")
+    columns = []
+    for column_settings in settings:
+        unknown = set(column_settings) - set(DEFAULTS)
+        if len(unknown) > 0:
+            raise ValueError("Unknown settings: " + ", ".join(sorted(unknown)))
+        columns.append(OrderedDict((name, column_settings.get(name, default)) for name, default in DEFAULTS.items()))
+    seed = random.randrange(1 << 32) if seed is None else seed
+    generators = [random.Random(str(seed) + ":" + str(i)) for i in range(len(names))]
+    chunk_rows = chunk_rows or max(1, CHUNK_CELLS // max(1, len(names)))
+    days = (end - start).days + 1
+
+    with open(file, "w", newline='') as output:
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(["date"] + list(names))
+        for first in range(0, days, chunk_rows):
+            dates = [start + datetime.timedelta(days=offset) for offset in range(first, min(first + chunk_rows, days))]
+            seasons, years = date_factors(dates, start)
+            values = [generate_column(seasons, years, generator, **column)
+                      for generator, column in zip(generators, columns)]
+            writer.writerows(zip(["{:%Y%m%d}".format(d) for d in dates], *values))
+    return seed
+
+
+# Asks for every setting in turn, as the generator always did before it had command line options
+def interactive():
+    houses = int(input("Enter number of houses: "))
+    if houses == 1:
+        names = ["electricity", "gas"]
     else:
-        base = float(input("Enter base usage for first date: "))
-        increase = float(input("Enter percentage to increase by each year: "))
-        randcomponent = float(input("Enter size of random component: "))
-        randdistr = int(input("Enter number of separate rolls to use (more = closer to normal distribution): "))
-        randmulti = int(input("Multiply by random? (makes distribution peakier): "))
-        randdiv = int(input("Divide by random? (makes distribution very peaky): "))
-        season = float(input("Enter strength of seasonal effect (0-1): "))
-        min = base
-        max = base
-        avg = base
-        if randcomponent != 0 and randdistr != 0:
-            avg += randcomponent * 0.5
-            max += randcomponent
-        if randmulti >= 1:
-            min = 0
-            avg *= pow(0.5, randmulti)
-        if randdiv >= 1:
-            max /= pow(0.1, randdiv)
-            avg /= pow(0.55, randdiv)
-        min *= 1 - season
-        avg *= 1 - (season / 2)
-        avg *= math.pow(increase / 100 + 1, (enddate - startdate).days / 730)
-        if increase >= 0:
-            max *= math.pow(increase / 100 + 1, (enddate - startdate).days / 365)
-        else:
-            min *= math.pow(increase / 100 + 1, (enddate - startdate).days / 365)
+        names = [input("Enter house name: ") for i in range(houses)]
+    startdate = datetime.datetime.strptime(str(input("Enter start date (yyyymmdd): ")), '%Y%m%d').date()
+    enddate = datetime.datetime.strptime(str(input("Enter end date (yyyymmdd): ")), '%Y%m%d').date()
+    settings = []
+    for name in names:
+        column = OrderedDict()
+        column['base'] = float(input("Enter base usage for first date: "))
+        column['increase'] = float(input("Enter percentage to increase by each year: "))
+        column['random_component'] = float(input("Enter size of random component: "))
+        column['rolls'] = int(input("Enter number of separate rolls to use (more = closer to normal distribution): "))
+        column['multiply'] = int(input("Multiply by random? (makes distribution peakier): "))
+        column['divide'] = int(input("Divide by random? (makes distribution very peaky): "))
+        column['season'] = float(input("Enter strength of seasonal effect (0-1): "))
+        (min, avg, max) = value_range((enddate - startdate).days, final=1, **column)
         print("Minimum value: " + str(min))
         print("Average value: " + str(avg))
         print("Maximum value: " + str(max))
-        final = float(input("Enter final multiplier: "))
-        for d in list(data.keys()):
-            val = base
-            if randdistr != 0:
-                for i in range(randdistr):
-                    val += random.random() * randcomponent / randdistr
-            if randmulti >= 1:
-                for i in range(randmulti):
-                    val *= random.random()
-            if randdiv >= 1:
-                for i in range(randdiv):
-                    val /= 0.9 * random.random() + 0.1
-            seasonal = (5.5-abs(d.month - 6.5)) / 5.5
-            val *= (1-seasonal * season) * final * math.pow(increase / 100 + 1, (d - startdate).days / 365)
-            data[d].append(val)
-print("Data generated")
-csvfile = input("Enter file name to write to: ")
-with open(csvfile, "w") as output:
-    writer = csv.writer(output, lineterminator='\n')
-    writer.writerow(headers)
-    for d in list(data.keys()):
-        writer.writerow(data[d])
-print("File writing successful")
-input()
+        column['final'] = float(input("Enter final multiplier: "))
+        settings.append(column)
+    csvfile = input("Enter file name to write to: ")
+    generate_file(csvfile, names, startdate, enddate, settings)
+    print("File writing successful")
+    input()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Generates realistic-looking usage data for the Energy Monitor. '
+                                     'Run without any options to be asked for each setting.')
+    parser.add_argument('output', help='CSV file to write')
+    parser.add_argument('--houses', type=int, default=1, help='number of houses (1 writes electricity and gas for one house)')
+    parser.add_argument('--names', help='comma separated house names (default: house_1, house_2, ...)')
+    parser.add_argument('--start', default='20160101', help='first date, yyyymmdd (default: %(default)s)')
+    parser.add_argument('--end', default='20161231', help='last date, yyyymmdd (default: %(default)s)')
+    parser.add_argument('--seed', type=int, help='seed for the random numbers, to generate the same file again')
+    for name, default in DEFAULTS.items():
+        parser.add_argument('--' + name.replace('_', '-'), type=type(default), default=default,
+                            help='(default: %(default)s)')
+    args = parser.parse_args(arguments)
+
+    if args.names is not None:
+        names = [name.strip() for name in args.names.split(',')]
+    elif args.houses == 1:
+        names = ["electricity", "gas"]
+    else:
+        names = ['house_' + str(i + 1) for i in range(args.houses)]
+    try:
+        start = datetime.datetime.strptime(args.start, '%Y%m%d').date()
+        end = datetime.datetime.strptime(args.end, '%Y%m%d').date()
+    except ValueError:
+        parser.error("Dates must be given as yyyymmdd")
+    settings = OrderedDict((name, getattr(args, name)) for name in DEFAULTS)
+    seed = generate_file(args.output, names, start, end, settings, args.seed)
+    print("Wrote " + args.output + " (seed " + str(seed) + ")")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 1:
+        interactive()
+    else:
+        main()
 
 '''This CSV writer generates realistic-looking electricity and/or gas consumption for any number of houses and writes
 it to a CSV in a way that is readable by the main program.
@@ -84,6 +192,12 @@ If the number of houses to generate for is 1, both gas and electricity data will
 only one of the two fuels will be written. Start and end dates are inclusive and there is very little restriction on
 the date range.
 
+Run without any options, the generator asks for each setting in turn. The same settings can be given on the command
+line instead (used for every column), with a seed so that the same file can be generated again, for example:
+    python csv_generator.py electricity_daily_big.csv --houses 1000 --start 20100101 --end 20191231 --seed 1
+From Python, generate_file() takes a separate set of settings for each column. Values are generated a whole column
+at a time and written a chunk of rows at a time, so very large files can be generated without running out of memory.
+
 When generating the data for each house or fuel, the user is prompted for several parameters which affect the
 final data set:
 * Base usage: Flat consumption amount
@@ -101,4 +215,4 @@ final data set:
 * Final multiplier: After all transformations have been applied, a minimum possible, maximum possible and crude average
     (obtained by setting all random numbers to 0.5) are displayed. A flat multipler can be used to change the values if
     they are not what is desired.
-'''
\ No newline at end of file
+'''
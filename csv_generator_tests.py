@@ -0,0 +1,54 @@
+import unittest
+import datetime
+import tempfile
+from os import path
+from csv_generator import generate_file, value_range
+from energy_dataset import EnergyDataset
+from energy_loader import CsvLoader
+
+
+class TestGenerator(unittest.TestCase):
+
+    def test_seed(self):
+        print("Testing that the same seed gives the same file, however many rows are written at a time")
+        settings = {'multiply': 1, 'divide': 2, 'increase': 5.0}
+        generate_file(self.file('a.csv'), ['a', 'b', 'c'], self.start, self.end, settings, seed=4)
+        generate_file(self.file('b.csv'), ['a', 'b', 'c'], self.start, self.end, settings, seed=4, chunk_rows=7)
+        generate_file(self.file('c.csv'), ['a', 'b', 'c'], self.start, self.end, settings, seed=5)
+        self.assertEqual(self.read('a.csv'), self.read('b.csv'))
+        self.assertNotEqual(self.read('a.csv'), self.read('c.csv'))
+
+    def test_values(self):
+        print("Testing that a generated file can be loaded, with every value inside the range given for its settings")
+        settings = [{'base': 2.0, 'random_component': 4.0}, {'base': 10.0, 'rolls': 6, 'season': 0.8, 'final': 0.5}]
+        generate_file(self.file('both.csv'), ['electricity', 'gas'], self.start, self.end, settings, seed=1)
+        dataset = EnergyDataset()
+        CsvLoader(self.file('both.csv')).load(dataset)
+        self.assertEqual(dataset.dates()[0], self.start)
+        self.assertEqual(dataset.last_date(), self.end)
+        for key, column_settings in zip(dataset.keys(), settings):
+            full = dict(base=5.0, increase=0.0, random_component=10.0, rolls=3, multiply=0, divide=0, season=0.3, final=1.0)
+            full.update(column_settings)
+            (min, avg, max) = value_range((self.end - self.start).days, **full)
+            self.assertTrue(all(min <= value <= max for value in dataset.column(key)))
+        with self.assertRaises(ValueError):
+            generate_file(self.file('bad.csv'), ['a'], self.start, self.end, {'bass': 1.0})
+
+    def file(self, name):
+        return path.join(self.temp_dir.name, name)
+
+    def read(self, name):
+        with open(self.file(name)) as file_contents:
+            return file_contents.read()
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.start = datetime.date(2015, 12, 20)
+        self.end = datetime.date(2016, 3, 1)
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
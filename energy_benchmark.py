@@ -0,0 +1,243 @@
+import argparse
+import csv
+import datetime
+import functools
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from os import path
+from unittest import mock
+
+from csv_generator import generate_file
+
+'''
+This file times the Energy Monitor's main operations on generated data sets, from 1,000 to
+10,000,000 usage values, without opening a window. It times loading single house, multiple house
+and supplier files (both parsing the CSV and reopening it from the cache), working out the monthly
+totals, metrics and costs, and building the graphs (plot_graph, pie_chart and
+distribution_graph_multi) up to the point where plotly would write the HTML file. Graphs are
+built in the background (see energy_figures.py), so each one is timed until it is ready.
+
+The EnergyMonitor is created with its tkinter widgets replaced by stand-ins (see HeadlessVar and
+headless_monitor), so the benchmarks can run on a server. plotly must be installed, since building
+the graph objects is part of what is timed.
+
+Results can be saved as a baseline, and later runs compared against it:
+    python energy_benchmark.py --sizes 1k,10k,100k --output baseline.json
+    python energy_benchmark.py --sizes 1k,10k,100k --compare baseline.json
+Any operation which takes longer than the baseline by more than the threshold (25% by default)
+is reported as a regression, and the exit status is 1.
+'''
+
+# Number of houses and days in the multiple house file for each size. Single house files hold
+# the same number of days for electricity and gas.
+SIZES = OrderedDict([('1k', (10, 100)), ('10k', (10, 1000)), ('100k', (100, 1000)),
+                     ('1M', (500, 2000)), ('10M', (2000, 5000))])
+FIRST_DATE = datetime.date(2000, 1, 1)
+
+
+'''
+Stand-ins for tkinter's StringVar and IntVar, which need a Tk window to exist.
+'''
+class HeadlessVar:
+
+    def __init__(self, master=None, value=''):
+        self.value = value
+
+    def set(self, value):
+        self.value = str(value)
+
+    def get(self):
+        return self.value
+
+
+class HeadlessIntVar(HeadlessVar):
+
+    def __init__(self, master=None, value=0):
+        self.value = value
+
+    def set(self, value):
+        self.value = int(value)
+
+
+'''
+Creates an EnergyMonitor whose widgets do nothing, which loads files through a cache in cache_dir
+and keeps each figure it plots in 'figures' instead of writing it out.
+'''
+def headless_monitor(cache_dir, figures):
+    import energy_monitor
+    from energy_cache import load_cached
+    energy_monitor.tk = mock.MagicMock()
+    energy_monitor.OptionMenu = mock.MagicMock()
+    energy_monitor.StringVar = HeadlessVar
+    energy_monitor.IntVar = HeadlessIntVar
+    energy_monitor.load_cached = functools.partial(load_cached, cache_dir=cache_dir)
+    energy_monitor.plotly.offline.plot = lambda figure, **options: figures.append(figure)
+    monitor = energy_monitor.EnergyMonitor(mock.MagicMock())
+    monitor.figures.output_dir = path.join(cache_dir, 'figures')
+    return monitor
+
+
+# Returns a function which plots a graph with 'plot', then waits for it to be built
+def drawn(monitor, plot):
+    def draw():
+        plot()
+        for file, seconds, error in monitor.figures.wait():
+            if error is not None:
+                raise error
+    return draw
+
+
+'''
+Writes a usage file of generated values (see csv_generator.py): one column per name in 'houses'
+(or electricity and gas if houses is None), with one row per day from FIRST_DATE.
+'''
+def write_usage_file(file, houses, days, seed):
+    columns = ['electricity', 'gas'] if houses is None else houses
+    generate_file(file, columns, FIRST_DATE, FIRST_DATE + datetime.timedelta(days=days - 1), seed=seed)
+
+
+def write_supplier_file(file, houses, seed):
+    generator = random.Random(seed)
+    rows = [['Data Type'] + houses, ['Name'] + ['Supplier ' + str(i % 5) for i in range(len(houses))]]
+    for name in ('Electricity Usage Rate', 'Electricity Standing Charge', 'Gas Usage Rate', 'Gas Standing Charge'):
+        rows.append([name] + ["%.2f" % (5 + generator.random() * 25) for h in houses])
+    with open(file, 'w', newline='') as output:
+        csv.writer(output, lineterminator='\n').writerows(rows)
+
+
+'''
+Returns the shortest time taken by 'repeat' calls of 'function', calling 'setup' (which isn't
+timed) before each one.
+'''
+def time_call(function, repeat, setup=None):
+    best = None
+    for i in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        taken = time.perf_counter() - start
+        best = taken if best is None else min(best, taken)
+    return best
+
+
+'''
+Runs every benchmark for one size, with files written to 'directory'. Returns an OrderedDict of
+operation -> seconds.
+'''
+def run_size(size, directory, repeat, seed=0):
+    houses, days = SIZES[size]
+    ids = ['house_' + str(i) for i in range(houses)]
+    multiple = path.join(directory, 'electricity_daily_' + size + '.csv')
+    single = path.join(directory, 'house_0_both_daily_' + size + '.csv')
+    suppliers = path.join(directory, 'suppliers_' + size + '.csv')
+    write_usage_file(multiple, ids, days, seed)
+    write_usage_file(single, None, days, seed + 1)
+    write_supplier_file(suppliers, ids, seed + 2)
+
+    figures = []
+    results = OrderedDict()
+    cache_dir = path.join(directory, 'cache_' + size)
+    monitor = headless_monitor(cache_dir, figures)
+    from energy_cache import evict
+
+    def clear_cache():
+        evict(cache_dir, max_size=0)
+
+    results['load_file (single house)'] = time_call(lambda: monitor.load_file(single), repeat, clear_cache)
+    results['plot_graph (single house, daily)'] = time_call(drawn(monitor, monitor.plot_graph), repeat)
+    results['load_file (suppliers)'] = time_call(lambda: monitor.load_file(suppliers), repeat)
+    results['load_file (multiple houses)'] = time_call(lambda: monitor.load_file(multiple), repeat, clear_cache)
+    results['load_file (multiple houses, cached)'] = time_call(lambda: monitor.load_file(multiple), repeat)
+    results['generate_monthly_data'] = time_call(monitor.generate_monthly_data, repeat, monitor.rollups.clear)
+    results['generate_metrics'] = time_call(monitor.generate_metrics, repeat, monitor.metrics_cache.clear)
+    results['generate_metrics (cached)'] = time_call(monitor.generate_metrics, repeat)
+    intersection = list(set(monitor.loaded_ids).intersection(monitor.loaded_ids_sup))
+    results['calculate_costs'] = time_call(lambda: monitor.calculate_costs(intersection), repeat)
+    monitor.chart_scope.set('daily')
+    results['plot_graph (daily)'] = time_call(drawn(monitor, monitor.plot_graph), repeat)
+    monitor.chart_scope.set('monthly')
+    results['plot_graph (monthly)'] = time_call(drawn(monitor, monitor.plot_graph), repeat)
+    results['pie_chart'] = time_call(drawn(monitor, monitor.pie_chart), repeat)
+    results['distribution_graph_multi'] = time_call(drawn(monitor, monitor.distribution_graph_multi), repeat)
+    return results
+
+
+def run(sizes, repeat, seed=0):
+    report = OrderedDict()
+    report['python'] = platform.python_version()
+    report['platform'] = platform.platform()
+    report['date'] = datetime.datetime.now().isoformat(timespec='seconds')
+    report['results'] = OrderedDict()
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            report['results'][size] = run_size(size, directory, repeat, seed)
+    return report
+
+
+'''
+Compares the results of a run against a baseline, returning a list of (size, operation, baseline
+seconds, new seconds) for every operation more than 'threshold' times slower than its baseline.
+Operations which only take a few milliseconds are not reported, since their timings vary too much.
+'''
+def regressions(baseline, report, threshold, minimum=0.005):
+    slower = []
+    for size, results in report['results'].items():
+        for operation, seconds in results.items():
+            before = baseline['results'].get(size, {}).get(operation)
+            if before is not None and seconds > before * threshold and seconds > minimum:
+                slower.append((size, operation, before, seconds))
+    return slower
+
+
+def print_report(report, baseline=None, output=sys.stdout):
+    for size, results in report['results'].items():
+        print(size + ":", file=output)
+        for operation, seconds in results.items():
+            line = "  {:40} {:10.4f}s".format(operation, seconds)
+            before = None if baseline is None else baseline['results'].get(size, {}).get(operation)
+            if before is not None:
+                line += "  (baseline {:.4f}s, {:+.0%})".format(before, seconds / before - 1 if before > 0 else 0)
+            print(line, file=output)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Times the Energy Monitor on generated data sets.')
+    parser.add_argument('--sizes', default='1k,10k,100k,1M', help='comma separated sizes to run, from ' +
+                        ', '.join(SIZES.keys()) + ' (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='times to run each operation, keeping the fastest (default: %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the generated data (default: %(default)s)')
+    parser.add_argument('--output', help='file to save the results to, as JSON')
+    parser.add_argument('--compare', help='baseline results to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown counted as a regression (default: %(default)s)')
+    args = parser.parse_args(arguments)
+
+    sizes = [size.strip() for size in args.sizes.split(',') if size.strip() != '']
+    for size in sizes:
+        if size not in SIZES:
+            parser.error("Unknown size: " + size)
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    report = run(sizes, args.repeat, args.seed)
+    print_report(report, baseline)
+    if args.output is not None:
+        with open(args.output, 'w') as output:
+            json.dump(report, output, indent=2)
+    if baseline is not None:
+        slower = regressions(baseline, report, args.threshold)
+        for (size, operation, before, seconds) in slower:
+            print("Regression: " + operation + " at " + size + " took {:.4f}s, baseline {:.4f}s".format(seconds, before))
+        return 1 if len(slower) > 0 else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
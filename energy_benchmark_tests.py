@@ -0,0 +1,23 @@
+import unittest
+from energy_benchmark import regressions, time_call
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_regressions(self):
+        print("Testing that operations slower than the baseline by more than the threshold are flagged")
+        baseline = {'results': {'1k': {'load': 0.10, 'plot': 0.10, 'tiny': 0.001}}}
+        report = {'results': {'1k': {'load': 0.20, 'plot': 0.11, 'tiny': 0.004, 'new': 1.0},
+                              '10k': {'load': 5.0}}}
+        self.assertEqual(regressions(baseline, report, 1.25), [('1k', 'load', 0.10, 0.20)])
+
+    def test_time_call(self):
+        print("Testing that setup is run before every timed call")
+        calls = []
+        seconds = time_call(lambda: calls.append('call'), 3, lambda: calls.append('setup'))
+        self.assertEqual(calls, ['setup', 'call'] * 3)
+        self.assertGreaterEqual(seconds, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
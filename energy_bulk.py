@@ -0,0 +1,165 @@
+import argparse
+import glob
+import re
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from ntpath import basename
+from os import path
+
+from energy_cache import CACHE_DIR, load_cached
+from energy_dataset import EnergyDataset
+from energy_loader import select_columns
+
+'''
+This file loads a whole directory (or glob pattern) of single house files, each holding the
+electricity and gas usage of one house ({house-id}_both_daily.csv), and puts one fuel of every
+house into one dataset with a column per house, keyed by house id. This is the same layout as a
+multiple house file ({fuel-type}_daily.csv), so the Energy Monitor (see load_file) and the
+metrics, costs and graphs treat a folder of houses just like one.
+
+The files are parsed in a pool of worker processes, so thousands of files are read on every core
+at once. Each worker loads its file through the cache (see energy_cache.py), and sends back the
+dates and the fuel's column as arrays, which are cheap to pass between processes. A multiple house
+file has a value for every house on every day, so only the days found in every file are kept, and
+the number of days left out is returned.
+
+A file which can't be loaded doesn't stop the others: its error is returned along with the file
+name, and the rest of the files are loaded as normal.
+
+For example:
+    python energy_bulk.py resources --fuel gas --jobs 4
+'''
+
+FUELS = ('electricity', 'gas')
+RE_HOUSE_FILE = re.compile('^(.*?)_both_daily')
+
+
+'''
+Returns the files to load from a directory (every *_both_daily*.csv file in it) or a glob pattern.
+If 'select' is given, only the files of the houses it picks are returned (see select_columns).
+'''
+def find_files(source, select=None):
+    if path.isdir(source):
+        source = path.join(source, '*_both_daily*.csv')
+    files = sorted(glob.glob(source))
+    if select is None:
+        return files
+    houses = ['date'] + [house_id(file) or '' for file in files]
+    return [files[i - 1] for i in select_columns(houses, select)]
+
+
+# Returns the house id in a file's name, or None if it isn't a {house-id}_both_daily.csv file
+def house_id(file):
+    match = RE_HOUSE_FILE.search(basename(file).split('.')[0])
+    return None if match is None else match.group(1)
+
+
+def check_header(header):
+    if len(header) != 3 or header[0].lower() != 'date' or header[1].lower() != FUELS[0] or header[2].lower() != FUELS[1]:
+        raise ValueError('File is not in correct format. First column must be electricity, second must be gas.')
+
+
+'''
+Loads one fuel from a single house file. This runs in a worker process, so rather than raising an
+error it returns (file, house id, ordinals, column, error), with ordinals and column set to None
+and a message in 'error' if the file couldn't be loaded.
+'''
+def read_house_file(file, fuel=FUELS[0], cache_dir=CACHE_DIR):
+    house = house_id(file)
+    if house is None:
+        return file, None, None, None, "File name must be in the format {house-id}_both_daily.csv"
+    dataset = EnergyDataset()
+    try:
+        load_cached(file, dataset, check_header, FUELS, cache_dir=cache_dir)
+    except (OSError, ValueError) as error:
+        return file, house, None, None, str(error)
+    # Columns mapped from the cache are copied, so they can be sent back to the main process
+    return file, house, array('l', dataset.ordinals), array('d', dataset.column(fuel)), None
+
+
+'''
+Returns a file's values on the dates of the shared date index, which are all in the file. If the
+index is one unbroken run of the file's dates (which it nearly always is) the values are copied
+as one slice, otherwise one at a time.
+'''
+def align(index, ordinals, column):
+    if ordinals == index:
+        return column
+    start = bisect_left(ordinals, index[0]) if len(index) > 0 else 0
+    if ordinals[start:start + len(index)] == index:
+        return column[start:start + len(index)]
+    return array('d', [column[bisect_left(ordinals, ordinal)] for ordinal in index])
+
+
+'''
+Loads 'fuel' from every house file found by find_files(source, select) into 'dataset', using 'jobs'
+worker processes (one per core if not given, or no workers at all if jobs is 1). on_file, if given,
+is called as on_file(file, error) as each file finishes, with error set to None if it loaded, and
+can stop the load by raising an exception. Returns an OrderedDict of file name -> error message
+for the files which couldn't be loaded, and the number of days left out because they weren't in
+every file. If no file could be loaded, a ValueError is raised.
+'''
+def load_houses(source, dataset, fuel=FUELS[0], jobs=None, cache_dir=CACHE_DIR, on_file=None, select=None):
+    if fuel not in FUELS:
+        raise ValueError("Unknown fuel: " + str(fuel))
+    files = find_files(source, select)
+    if len(files) == 0:
+        raise ValueError("No house files found in " + source)
+    if jobs == 1 or len(files) == 1:
+        results = map(read_house_file, files, repeat(fuel), repeat(cache_dir))
+        pool = None
+    else:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(read_house_file, files, repeat(fuel), repeat(cache_dir),
+                           chunksize=max(1, len(files) // 64))
+
+    errors = OrderedDict()
+    loaded = OrderedDict()
+    try:
+        for (file, house, ordinals, column, error) in results:
+            if error is None and house in loaded:
+                error = "House " + house + " has already been loaded from " + loaded[house][0]
+            if error is None:
+                loaded[house] = (file, ordinals, column)
+            else:
+                errors[file] = error
+            if on_file is not None:
+                on_file(file, error)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    if len(loaded) == 0:
+        raise ValueError("None of the house files could be loaded, first error: " + next(iter(errors.values())))
+
+    # Every file usually covers the same dates, in which case the first file's dates are used as they are
+    files_ordinals = [ordinals for (file, ordinals, column) in loaded.values()]
+    if all(ordinals == files_ordinals[0] for ordinals in files_ordinals):
+        index = files_ordinals[0]
+        dropped = 0
+    else:
+        index = array('l', sorted(set(files_ordinals[0]).intersection(*files_ordinals[1:])))
+        dropped = len(set().union(*files_ordinals)) - len(index)
+        if len(index) == 0:
+            raise ValueError("The house files have no days in common")
+    columns = [align(index, ordinals, column) for (file, ordinals, column) in loaded.values()]
+    dataset.set_data(list(loaded.keys()), index, columns)
+    return errors, dropped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Loads a directory of {house-id}_both_daily.csv files.')
+    parser.add_argument('source', help='directory or glob pattern of files to load')
+    parser.add_argument('--fuel', choices=FUELS, default=FUELS[0], help='fuel to load (default: %(default)s)')
+    parser.add_argument('--jobs', type=int, help='number of worker processes (default: one per core)')
+    args = parser.parse_args()
+    combined = EnergyDataset()
+    failures, left_out = load_houses(args.source, combined, args.fuel, args.jobs)
+    print("Loaded " + args.fuel + " for " + str(len(combined.keys())) + " houses from " +
+          "{:%Y/%m/%d}".format(combined.first_date()) + " to " + "{:%Y/%m/%d}".format(combined.last_date()))
+    if left_out > 0:
+        print(str(left_out) + " days were left out because not every house has them")
+    for name, message in failures.items():
+        print("Could not load " + name + ": " + message)
@@ -0,0 +1,65 @@
+import unittest
+import datetime
+import tempfile
+from os import path
+from energy_bulk import load_houses
+from energy_dataset import EnergyDataset
+from energy_metrics import usage_metrics
+from energy_rollup import Rollup
+
+
+class TestBulkLoader(unittest.TestCase):
+
+    def test_directory(self):
+        print("Testing that one fuel from a directory of house files is loaded like a multiple house file")
+        self.write_file('houseA_both_daily.csv', "Date,Electricity,Gas\n20160101,1,2\n20160102,3,4\n20160103,5,6\n")
+        self.write_file('houseB_both_daily.csv', "Date,Electricity,Gas\n20160102,5,6\n20160103,7,8\n")
+        self.write_file('houseC_both_daily.csv', "Date,Gas,Electricity\n20160101,1,2\n")
+        (errors, dropped) = load_houses(self.temp_dir.name, self.dataset, 'gas', jobs=2, cache_dir=self.cache_dir)
+
+        self.assertEqual(list(errors.keys()), [path.join(self.temp_dir.name, 'houseC_both_daily.csv')])
+        self.assertEqual(self.dataset.keys(), ['houseA', 'houseB'])
+        # Only the days in both files are kept
+        self.assertEqual(dropped, 1)
+        self.assertEqual(self.dataset.dates(), [datetime.date(2016, 1, day) for day in (2, 3)])
+        self.assertEqual(list(self.dataset.column('houseA')), [4.0, 6.0])
+        self.assertEqual(list(self.dataset.column('houseB')), [6.0, 8.0])
+
+        metrics = usage_metrics(self.dataset, Rollup(self.dataset, 'monthly'), self.dataset.keys(), True)
+        self.assertEqual(metrics['all']['Maximum used by: '], 'houseB')
+
+    def test_glob(self):
+        print("Testing that files can be picked with a glob pattern or by house, without worker processes")
+        self.write_file('houseA_both_daily.csv', "Date,Electricity,Gas\n20160101,1,2\n")
+        self.write_file('houseB_both_daily.csv', "Date,Electricity,Gas\n20160101,3,4\n")
+        self.write_file('flatC_both_daily.csv', "Date,Electricity,Gas\n20160101,5,6\n")
+        files = []
+        (errors, dropped) = load_houses(path.join(self.temp_dir.name, 'house*.csv'), self.dataset, jobs=1,
+                                        cache_dir=self.cache_dir, on_file=lambda file, error: files.append(file),
+                                        select=['houseB'])
+
+        self.assertEqual((len(errors), dropped), (0, 0))
+        self.assertEqual(len(files), 1)
+        self.assertEqual(self.dataset.row(0), {'houseB': 3.0})
+        with self.assertRaises(ValueError):
+            load_houses(path.join(self.temp_dir.name, 'missing_*.csv'), self.dataset, cache_dir=self.cache_dir)
+        with self.assertRaises(ValueError):
+            load_houses(self.temp_dir.name, self.dataset, 'water', cache_dir=self.cache_dir)
+
+    def write_file(self, name, text):
+        with open(path.join(self.temp_dir.name, name), 'w') as output:
+            output.write(text)
+
+    def setUp(self):
+        self.dataset = EnergyDataset()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_temp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.cache_temp.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+        self.cache_temp.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,283 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+from os import path
+
+from energy_dataset import EnergyDataset
+from energy_loader import CsvLoader, select_columns
+from energy_validation import Problem
+
+'''
+This file keeps a binary copy of each usage CSV file once it has been parsed, so that opening an
+unchanged file again does not need the CSV to be read at all.
+
+Each cache entry is a single file in the cache directory, named after a hash of the CSV's full path.
+It starts with a small JSON header recording where the data came from (the CSV's path, size,
+modification time and a fingerprint of its contents), the file's header row and which of its
+columns were loaded, followed by the date index as 32-bit day ordinals and then each column as
+64-bit floats. When an entry is reopened, the file is memory-mapped and the dataset's arrays point
+straight into it, so nothing is copied until it is used, and columns which are not asked for are
+never read.
+
+Entries can be removed by age or total size with:
+    python energy_cache.py --max-age 30 --max-size 500
+'''
+
+CACHE_DIR = path.join(path.expanduser('~'), '.energy_monitor', 'cache')
+MAGIC = b'EMCACHE2'
+# Number of bytes read from each end of a CSV file for its fingerprint
+FINGERPRINT_BYTES = 1 << 20
+# Age in seconds after which a temporary file is taken to be left over from a write that never finished
+TEMPORARY_AGE = 3600
+
+
+def cache_file(file, cache_dir=CACHE_DIR):
+    name = hashlib.sha256(path.abspath(file).encode('utf-8')).hexdigest()[:32]
+    return path.join(cache_dir, name + '.emc')
+
+
+'''
+Identifies the current contents of a CSV file: its size, modification time and a hash of its
+first and last megabyte. Hashing the ends rather than the whole file keeps reopening fast, while
+still noticing files that have been replaced by others of the same size.
+'''
+def source_stamp(file):
+    info = os.stat(file)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file, 'rb') as contents:
+        digest.update(contents.read(FINGERPRINT_BYTES))
+        if info.st_size > FINGERPRINT_BYTES:
+            contents.seek(max(FINGERPRINT_BYTES, info.st_size - FINGERPRINT_BYTES))
+            digest.update(contents.read(FINGERPRINT_BYTES))
+    return {'path': path.abspath(file), 'size': info.st_size, 'mtime': info.st_mtime_ns,
+            'fingerprint': digest.hexdigest()}
+
+
+'''
+Writes the dataset loaded from 'file' to the cache. 'columns' are the names in the file's header
+of the dataset's columns, if only some of them were loaded. The entry is written to a temporary
+file and then renamed, so a half-written entry is never read.
+'''
+def write_cache(file, header, dataset, cache_dir=CACHE_DIR, stamp=None, columns=None, problems=None):
+    os.makedirs(cache_dir, exist_ok=True)
+    info = dict(stamp or source_stamp(file))
+    info['header'] = header
+    info['columns'] = header[1:] if columns is None else list(columns)
+    info['rows'] = len(dataset)
+    info['byteorder'] = sys.byteorder
+    # Warnings found while the CSV was parsed, so they can be reported again without reading it
+    info['problems'] = [problem.as_dict() for problem in problems or []]
+    text = json.dumps(info).encode('utf-8')
+    # The arrays start on an 8 byte boundary, so the floats can be mapped directly
+    padding = -(len(MAGIC) + 4 + len(text)) % 8
+    target = cache_file(file, cache_dir)
+    temporary = target + '.' + str(os.getpid()) + '.tmp'
+    with open(temporary, 'wb') as output:
+        output.write(MAGIC)
+        output.write(len(text + b' ' * padding).to_bytes(4, 'little'))
+        output.write(text + b' ' * padding)
+        ordinals = array('i', dataset.ordinals)
+        if len(ordinals) % 2 == 1:
+            ordinals.append(0)
+        ordinals.tofile(output)
+        for column in dataset.columns.values():
+            output.write(memoryview(column).cast('B'))
+    os.replace(temporary, target)
+    return target
+
+
+'''
+Opens the cache entry for 'file', if there is one which was written from the file's current
+contents ('stamp', see source_stamp) on a machine with the same byte order. Returns the entry's
+JSON header, with 'start' added as the offset of the date index, and the entry mapped into
+memory, or None if there is no entry which can be used.
+'''
+def open_entry(file, cache_dir=CACHE_DIR, stamp=None):
+    target = cache_file(file, cache_dir)
+    if not path.isfile(target):
+        return None
+    with open(target, 'rb') as contents:
+        if contents.read(len(MAGIC)) != MAGIC:
+            return None
+        length = int.from_bytes(contents.read(4), 'little')
+        try:
+            info = json.loads(contents.read(length).decode('utf-8'))
+        except ValueError:
+            return None
+        for field, value in (stamp or source_stamp(file)).items():
+            if info.get(field) != value:
+                return None
+        if info['byteorder'] != sys.byteorder:
+            return None
+        info['start'] = len(MAGIC) + 4 + length
+        return (info, mmap.mmap(contents.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+# Returns the date index and the columns called 'names' from an entry opened by open_entry
+def map_columns(info, mapped, names):
+    rows = info['rows']
+    start = info['start']
+    positions = {name: i for i, name in enumerate(info['columns'])}
+    with memoryview(mapped) as data:
+        ordinals = data[start:start + 4 * rows].cast('i')
+        start += 4 * (rows + rows % 2)
+        columns = []
+        for name in names:
+            offset = start + 8 * rows * positions[name]
+            columns.append(data[offset:offset + 8 * rows].cast('d'))
+    return (ordinals, columns)
+
+
+'''
+Loads the cached copy of 'file' into the dataset if there is one, the file has not changed since
+it was written, and it holds every column picked by 'select' (all of the file's columns if select
+is None, see energy_loader.select_columns). The columns are stored under 'keys', or under the
+header names if no keys are given. The dataset's arrays point into the mapped entry, which is
+closed when the dataset's data is replaced. Returns the file's header row, or None if the cache
+can't be used.
+'''
+def read_cache(file, dataset, keys=None, cache_dir=CACHE_DIR, stamp=None, select=None, validator=None):
+    entry = open_entry(file, cache_dir, stamp)
+    if entry is None:
+        return None
+    (info, mapped) = entry
+    header = info['header']
+    positions = range(1, len(header)) if select is None else select_columns(header, select)
+    names = [header[i] for i in positions]
+    if not all(name in info['columns'] for name in names):
+        mapped.close()
+        return None
+    (ordinals, columns) = map_columns(info, mapped, names)
+    if keys is None:
+        keys = names
+    dataset.set_data(keys, ordinals, columns, mapped)
+    if validator is not None:
+        # Only the problems with the dates, or in the columns loaded, are reported
+        loaded = set(i + 1 for i in positions)
+        for problem in info.get('problems', []):
+            if problem['column'] is None or problem['column'] == 1 or problem['column'] in loaded:
+                validator.add(**problem)
+    # Marks the entry as recently used, so it is kept longest when the cache is trimmed
+    os.utime(cache_file(file, cache_dir))
+    return header
+
+
+'''
+Adds the columns held by the existing cache entry for 'file', other than those just loaded from
+the CSV ('names', in 'dataset'), to the columns to be cached, so that loading a few houses from a
+file doesn't throw away the others already cached. The old columns are copied, so the entry can
+be replaced. Returns a dataset holding every column, their names in the header, and the problems
+found in them.
+'''
+def merge_entry(file, header, dataset, names, problems, cache_dir=CACHE_DIR, stamp=None):
+    entry = open_entry(file, cache_dir, stamp)
+    if entry is None:
+        return (dataset, names, problems)
+    (info, mapped) = entry
+    kept = [name for name in info['columns'] if name not in names]
+    if info['header'] != header or info['rows'] != len(dataset) or len(kept) == 0:
+        mapped.close()
+        return (dataset, names, problems)
+    (ordinals, old_columns) = map_columns(info, mapped, kept)
+    columns = dict(zip(names, dataset.columns.values()))
+    for name, column in zip(kept, old_columns):
+        columns[name] = array('d', column)
+        column.release()
+    ordinals.release()
+    mapped.close()
+    merged = EnergyDataset()
+    order = sorted(columns, key=header.index)
+    merged.set_data(order, dataset.ordinals, [columns[name] for name in order])
+    # The problems with the dates were found again while the CSV was read
+    numbers = set(header.index(name) + 1 for name in kept)
+    problems = list(problems) + [Problem(**problem) for problem in info['problems'] if problem['column'] in numbers]
+    return (merged, order, problems)
+
+
+'''
+Loads a usage file through the cache: if the file has not changed since it was last loaded, and
+the columns wanted were loaded then, the cached copy is used. Otherwise the CSV is read with a
+CsvLoader and the result is cached, along with any other columns the cache already held for it.
+check_header, keys and select are as for CsvLoader.load, and on_chunk is passed to the CsvLoader.
+Any warnings about the data are added to 'validator', if one is given (see energy_validation.py).
+Returns the file's header row.
+'''
+def load_cached(file, dataset, check_header=None, keys=None, on_chunk=None, cache_dir=CACHE_DIR, select=None,
+                validator=None):
+    stamp = source_stamp(file)
+    header = read_cache(file, dataset, keys, cache_dir, stamp, select, validator)
+    if header is not None:
+        if check_header is not None:
+            check_header(header)
+        return header
+    loader = CsvLoader(file, on_chunk=on_chunk, validator=validator)
+    header = loader.load(dataset, check_header, keys, select)
+    try:
+        (merged, names, problems) = merge_entry(file, header, dataset, loader.names, loader.validator.problems,
+                                                cache_dir, stamp)
+        write_cache(file, header, merged, cache_dir, stamp, names, problems)
+    except OSError:
+        pass # The cache is only an optimisation, so the load still succeeds without it
+    return header
+
+
+'''
+Removes cache entries last used more than max_age days ago, then removes the least recently
+used entries until the cache is no bigger than max_size bytes. Temporary files left behind by
+writes which never finished are removed once they are TEMPORARY_AGE seconds old. Newer ones are
+left alone, as another process may still be writing them (see write_cache). Returns the number of
+files removed.
+'''
+def evict(cache_dir=CACHE_DIR, max_age=None, max_size=None):
+    if not path.isdir(cache_dir):
+        return 0
+    entries = []
+    abandoned = []
+    now = time.time()
+    for name in os.listdir(cache_dir):
+        if not (name.endswith('.emc') or name.endswith('.tmp')):
+            continue
+        try:
+            info = os.stat(path.join(cache_dir, name))
+        except OSError:
+            continue # Renamed or removed by another process since the directory was listed
+        if name.endswith('.emc'):
+            entries.append((info.st_mtime, info.st_size, path.join(cache_dir, name)))
+        elif now - info.st_mtime > TEMPORARY_AGE:
+            abandoned.append(path.join(cache_dir, name))
+    entries.sort()
+    removed = 0
+    for name in abandoned:
+        try:
+            os.remove(name)
+            removed += 1
+        except OSError:
+            pass
+    total = sum(entry[1] for entry in entries)
+    for (used, size, name) in entries:
+        too_old = max_age is not None and now - used > max_age * 86400
+        too_big = max_size is not None and total > max_size
+        if too_old or too_big:
+            try:
+                os.remove(name)
+            except OSError:
+                continue # Still open (e.g. mapped on Windows), try again next time
+            total -= size
+            removed += 1
+    return removed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Removes old entries from the Energy Monitor file cache.')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='cache directory (default: %(default)s)')
+    parser.add_argument('--max-age', type=float, help='remove entries not used for this many days')
+    parser.add_argument('--max-size', type=float, help='then trim the cache to this many megabytes')
+    args = parser.parse_args()
+    max_size = None if args.max_size is None else int(args.max_size * 1024 * 1024)
+    count = evict(args.cache_dir, args.max_age, max_size)
+    print("Removed " + str(count) + " cache entries from " + args.cache_dir)
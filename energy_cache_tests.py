@@ -0,0 +1,108 @@
+import unittest
+import os
+import tempfile
+import time
+from array import array
+from os import path
+from energy_cache import TEMPORARY_AGE, cache_file, evict, load_cached
+from energy_dataset import EnergyDataset
+
+
+class TestCache(unittest.TestCase):
+
+    def test_reopen(self):
+        print("Testing that an unchanged file is reopened from the cache")
+        file = self.write_file("date,a,b\n20160101,1.5,2.5\n20160102,3.5,4.5\n")
+        header = load_cached(file, self.dataset, cache_dir=self.cache_dir)
+        self.assertTrue(path.isfile(cache_file(file, self.cache_dir)))
+
+        cached = EnergyDataset()
+        self.assertEqual(load_cached(file, cached, keys=['x', 'y'], cache_dir=self.cache_dir), header)
+        self.assertIsInstance(cached.ordinals, memoryview)
+        self.assertEqual(list(cached.ordinals), list(self.dataset.ordinals))
+        self.assertEqual(list(cached.column('y')), [2.5, 4.5])
+        self.assertTrue(cached.contiguous)
+
+    def test_select(self):
+        print("Testing that a cache entry is used for any columns it holds")
+        file = self.write_file("date,a,b,c\n20160101,1.5,2.5,3.5\n")
+        load_cached(file, self.dataset, cache_dir=self.cache_dir, select=['a', 'b'])
+        self.assertEqual(self.dataset.keys(), ['a', 'b'])
+
+        cached = EnergyDataset()
+        load_cached(file, cached, cache_dir=self.cache_dir, select=['b'])
+        self.assertIsInstance(cached.column('b'), memoryview)
+        self.assertEqual(cached.row(0), {'b': 2.5})
+        # Column c was not cached, so the file is read again, and c is cached along with a and b
+        load_cached(file, cached, cache_dir=self.cache_dir, select=['c'])
+        self.assertIsInstance(cached.column('c'), array)
+        self.assertEqual(cached.row(0), {'c': 3.5})
+        load_cached(file, cached, cache_dir=self.cache_dir)
+        self.assertIsInstance(cached.column('a'), memoryview)
+        self.assertEqual(cached.row(0), {'a': 1.5, 'b': 2.5, 'c': 3.5})
+
+    def test_mapping(self):
+        print("Testing that the cache file is closed when the data mapped from it is replaced")
+        file = self.write_file("date,a\n20160101,1.5\n20160102,2.5\n")
+        load_cached(file, self.dataset, cache_dir=self.cache_dir)
+        load_cached(file, self.dataset, cache_dir=self.cache_dir)
+        mapping = self.dataset.mapping
+        self.assertFalse(mapping.closed)
+        load_cached(file, self.dataset, cache_dir=self.cache_dir)
+        self.assertTrue(mapping.closed)
+
+        # Adding rows copies the data out of the cache file, so it is no longer needed
+        mapping = self.dataset.mapping
+        self.dataset.extend(array('l', [735966]), [array('d', [3.5])])
+        self.assertTrue(mapping.closed)
+        self.assertEqual(list(self.dataset.column('a')), [1.5, 2.5, 3.5])
+
+    def test_changed(self):
+        print("Testing that a changed file is read again rather than taken from the cache")
+        file = self.write_file("date,a\n20160101,1.5\n")
+        load_cached(file, self.dataset, cache_dir=self.cache_dir)
+        file = self.write_file("date,a\n20160101,2.5\n")
+        os.utime(file, ns=(0, 0))
+        load_cached(file, self.dataset, cache_dir=self.cache_dir)
+        self.assertEqual(list(self.dataset.column('a')), [2.5])
+
+    def test_evict(self):
+        print("Testing that old entries are removed from the cache")
+        for name in ('electricity_daily.csv', 'gas_daily.csv'):
+            file = self.write_file("date,a\n20160101,1.5\n", name)
+            load_cached(file, self.dataset, cache_dir=self.cache_dir)
+        old_entry = cache_file(path.join(self.temp_dir.name, 'electricity_daily.csv'), self.cache_dir)
+        os.utime(old_entry, (time.time() - 10 * 86400, time.time() - 10 * 86400))
+
+        self.assertEqual(evict(self.cache_dir, max_age=5), 1)
+        self.assertFalse(path.isfile(old_entry))
+        self.assertEqual(evict(self.cache_dir, max_size=0), 1)
+        self.assertEqual(os.listdir(self.cache_dir), [])
+
+        print("Testing that temporary files are only removed once they are too old to still be being written")
+        writing = path.join(self.cache_dir, 'entry.emc.123.tmp')
+        abandoned = path.join(self.cache_dir, 'entry.emc.456.tmp')
+        for name in (writing, abandoned):
+            with open(name, 'wb') as output:
+                output.write(b'EMCACHE2')
+        os.utime(abandoned, (time.time() - 2 * TEMPORARY_AGE, time.time() - 2 * TEMPORARY_AGE))
+        self.assertEqual(evict(self.cache_dir, max_age=0, max_size=0), 1)
+        self.assertEqual(os.listdir(self.cache_dir), ['entry.emc.123.tmp'])
+
+    def write_file(self, text, name='electricity_daily.csv'):
+        file = path.join(self.temp_dir.name, name)
+        with open(file, 'w') as output:
+            output.write(text)
+        return file
+
+    def setUp(self):
+        self.dataset = EnergyDataset()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = path.join(self.temp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import csv
+from array import array
+from collections import OrderedDict
+from itertools import repeat
+from operator import add, mul, truediv
+
+'''
+This file works out what the loaded usage cost each day, from the usage rate (pence per kWh) and
+standing charge (pence per day) in a supplier file. Like energy_dataset.py, it does not depend on
+tkinter or plotly.
+
+The rates for every house are looked up in the supplier data once, giving one rate and one standing
+charge per column, and each column is then costed in a single pass of map() calls, which run in C.
+Each day's cost is rounded to a whole number of pence and kept as an integer, so that totals over
+weeks, months or years (see energy_rollup.py) are exact sums of pence rather than sums of rounded
+pounds, which can pick up floating point error.
+'''
+
+
+'''
+Reads a supplier file: a 'Data Type' column naming each row, then one column per house. The first
+row holds each house's supplier name, and the other four hold its usage rates and standing
+charges. Returns an OrderedDict of house id -> {row name: value}, with the rates as floats.
+Raises a ValueError describing the first problem found in the file.
+'''
+def read_supplier_file(file):
+    supplier_data = OrderedDict()
+    with open(file, 'r') as file_contents:
+        reader = csv.reader(file_contents)
+        header = next(reader, None)
+        if header is None or header[0].lower() != "data type":
+            raise ValueError("First heading should be 'Data Type'")
+        for h in header:
+            if h != "Data Type":
+                supplier_data[h] = {}
+        ids = list(supplier_data.keys())
+        count = 0
+        for row in reader:
+            count += 1
+            if len(row) - 1 != len(ids):
+                raise ValueError("Row contains wrong number of values")
+            for i, value in zip(ids, row[1:]):
+                if count == 1:
+                    supplier_data[i][row[0]] = value
+                else:
+                    digits = value.replace(".", "")
+                    if digits != "" and not digits.isnumeric():
+                        raise ValueError("Data not numeric")
+                    supplier_data[i][row[0]] = float(value)
+        if count != 5:
+            raise ValueError("File should contain header plus 5 rows of data")
+    return supplier_data
+
+
+'''
+Returns the usage rates and standing charges for a fuel ('Electricity' or 'Gas') of each of the
+given houses, as two arrays in the same order as the ids.
+'''
+def supplier_rates(supplier_data, ids, fuel_name):
+    rates = array('d', [supplier_data[i][fuel_name + ' Usage Rate'] for i in ids])
+    standing = array('d', [supplier_data[i][fuel_name + ' Standing Charge'] for i in ids])
+    return rates, standing
+
+
+'''
+Returns the cost in whole pence of each day of a column of usage, i.e. usage * rate + standing
+rounded to the nearest penny (halves are rounded to even, as round() does).
+'''
+def daily_pence(usage, rate, standing):
+    return array('q', map(round, map(add, map(mul, usage, repeat(rate)), repeat(standing))))
+
+
+'''
+Costs every column of usage at once. 'rates' and 'standing' give the usage rate and standing
+charge for each column, in the same order. Returns one array of daily costs in pence per column.
+'''
+def cost_columns(columns, rates, standing):
+    if not len(columns) == len(rates) == len(standing):
+        raise ValueError("Expected a usage rate and standing charge for each of the " + str(len(columns)) + " columns")
+    return [daily_pence(usage, rate, charge) for usage, rate, charge in zip(columns, rates, standing)]
+
+
+def to_pounds(pence):
+    return array('d', map(truediv, pence, repeat(100)))
@@ -0,0 +1,43 @@
+import unittest
+from array import array
+from os import path
+from energy_costs import cost_columns, daily_pence, read_supplier_file, supplier_rates, to_pounds
+
+
+class TestEnergyCosts(unittest.TestCase):
+
+    def test_daily_pence(self):
+        print("Testing that daily costs are rounded to whole pence")
+        pence = daily_pence(array('d', [1.0, 2.5, 0.1]), 10.0, 11.5)
+        self.assertEqual(list(pence), [22, 36, 12])
+        self.assertEqual(list(to_pounds(pence)), [0.22, 0.36, 0.12])
+
+    def test_supplier_rates(self):
+        print("Testing that rates are looked up once per house")
+        supplier_data = {'HouseC': {'Gas Usage Rate': 5.66, 'Gas Standing Charge': 11.5},
+                         'HouseD': {'Gas Usage Rate': 12.11, 'Gas Standing Charge': 12.5}}
+        rates, standing = supplier_rates(supplier_data, ['HouseD', 'HouseC'], 'Gas')
+        self.assertEqual(list(rates), [12.11, 5.66])
+        self.assertEqual(list(standing), [12.5, 11.5])
+
+    def test_read_supplier_file(self):
+        print("Testing that supplier files are parsed and checked")
+        working_dir = path.dirname(path.abspath(__file__))
+        supplier_data = read_supplier_file(path.join(working_dir, 'resources', 'suppliers.csv'))
+        self.assertEqual(list(supplier_data.keys()), ['HouseC', 'HouseD', 'HouseE', 'HouseF'])
+        self.assertEqual(supplier_data['HouseD']['Name'], 'Sunshine Power')
+        self.assertEqual(supplier_data['HouseD']['Gas Usage Rate'], 12.11)
+        with self.assertRaisesRegex(ValueError, "Data not numeric"):
+            read_supplier_file(path.join(working_dir, 'resources', 'suppliers_baddata.csv'))
+
+    def test_cost_columns(self):
+        print("Testing that every column is costed with its own rates")
+        columns = [array('d', [1.0, 2.0]), array('d', [1.0, 2.0])]
+        pence = cost_columns(columns, [10.0, 20.0], [1.0, 2.0])
+        self.assertEqual([list(column) for column in pence], [[11, 21], [22, 42]])
+        with self.assertRaises(ValueError):
+            cost_columns(columns, [10.0], [1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
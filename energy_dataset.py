@@ -0,0 +1,229 @@
+import datetime
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping
+
+'''
+This file holds the data structures used to store loaded usage data. It deliberately does not
+import tkinter or plotly, so it can be used from scripts and tests without opening a window.
+
+Rather than storing one dictionary per date (which creates a lot of small Python objects when
+thousands of houses are loaded), an EnergyDataset stores one sorted index of dates and one array
+of float values per column. A column is either a house id (for multiple house files) or a FuelType
+(for single house files). The value for a given date and column is found at the same position
+in the date index and the column array.
+'''
+
+
+class EnergyDataset:
+
+    def __init__(self):
+        # Dates are stored as day ordinals (see datetime.date.toordinal) in an array of
+        # integers, which is far smaller than a list of date objects.
+        self.ordinals = array('l')
+        self.columns = OrderedDict()
+        # True when there is exactly one row for every day from the first date to the last, so
+        # the position of a date is simply its offset from the first date.
+        self.contiguous = True
+        # Increased every time the data changes, so that results worked out from the data
+        # (such as rollups) can tell whether they are out of date. base_version is the version
+        # at which existing rows last changed: adding rows to the end doesn't change it, so a
+        # result from a version at or after base_version only needs the new rows adding to it.
+        self.version = 0
+        self.base_version = 0
+        # The cache file the arrays point into, if they were mapped by energy_cache.read_cache
+        self.mapping = None
+
+    def clear(self):
+        # Mapped arrays are released first, so that the cache file they point into can be closed
+        for values in [self.ordinals] + list(self.columns.values()):
+            if isinstance(values, memoryview):
+                values.release()
+        self.close_mapping()
+        self.ordinals = array('l')
+        self.columns.clear()
+        self.contiguous = True
+        self.version += 1
+        self.base_version = self.version
+
+    '''
+    Removes any existing data and creates one empty float64 ('d') array for each key.
+    '''
+    def set_columns(self, keys):
+        self.clear()
+        for key in keys:
+            if key in self.columns:
+                raise ValueError("Duplicate column: " + str(key))
+            self.columns[key] = array('d')
+
+    '''
+    Closes the cache file the arrays were mapped from, if there is one. If other views of the
+    file are still in use (such as a slice of a column), it is closed when they are freed instead.
+    '''
+    def close_mapping(self):
+        if self.mapping is None:
+            return
+        try:
+            self.mapping.close()
+        except BufferError:
+            pass
+        self.mapping = None
+
+    '''
+    Replaces the contents of the dataset with already built arrays, without copying them.
+    The ordinals must be in strictly ascending order, and each column must be the same length
+    as the ordinals. 'mapping' is the mmap the arrays point into, if they were read from the
+    cache, which is closed when the data is next replaced.
+    '''
+    def set_data(self, keys, ordinals, columns, mapping=None):
+        keys = list(keys)
+        if len(keys) != len(columns):
+            raise ValueError("Expected " + str(len(keys)) + " columns, found " + str(len(columns)))
+        for column in columns:
+            if len(column) != len(ordinals):
+                raise ValueError("Columns must be the same length as the date index")
+        self.set_columns(keys)
+        self.ordinals = ordinals
+        # Since the dates are strictly ascending, they can only have no gaps if the span
+        # from the first to the last date is one day less than the number of dates.
+        self.contiguous = len(ordinals) == 0 or ordinals[-1] - ordinals[0] == len(ordinals) - 1
+        for key, column in zip(keys, columns):
+            self.columns[key] = column
+        self.mapping = mapping
+
+    '''
+    Adds a row of values to the end of the dataset. The values must be given in the same
+    order as the columns, and dates must be added in ascending order.
+    '''
+    def append(self, date, values):
+        ordinal = date.toordinal()
+        if len(self.ordinals) > 0 and ordinal <= self.ordinals[-1]:
+            raise ValueError("Dates must be in ascending order: " + str(date))
+        if len(values) != len(self.columns):
+            raise ValueError("Row contains wrong number of values")
+        if len(self.ordinals) > 0 and ordinal != self.ordinals[-1] + 1:
+            self.contiguous = False
+        self.ordinals.append(ordinal)
+        for column, value in zip(self.columns.values(), values):
+            column.append(value)
+        self.version += 1
+
+    '''
+    Adds rows to the end of the dataset from an array of ordinals and one array of values per
+    column, in the same order as the columns. The new dates must be in ascending order and after
+    the last date already held. Columns mapped read-only from the cache are copied into arrays
+    the first time rows are added to them.
+    '''
+    def extend(self, ordinals, columns):
+        if len(columns) != len(self.columns):
+            raise ValueError("Expected " + str(len(self.columns)) + " columns, found " + str(len(columns)))
+        for column in columns:
+            if len(column) != len(ordinals):
+                raise ValueError("Columns must be the same length as the date index")
+        if len(ordinals) == 0:
+            return
+        if len(self.ordinals) > 0 and ordinals[0] <= self.ordinals[-1]:
+            raise ValueError("Dates must be in ascending order: " + str(datetime.date.fromordinal(ordinals[0])))
+        follows_on = len(self.ordinals) == 0 or ordinals[0] == self.ordinals[-1] + 1
+        self.contiguous = self.contiguous and follows_on and ordinals[-1] - ordinals[0] == len(ordinals) - 1
+        if not isinstance(self.ordinals, array):
+            self.ordinals = array('l', self.ordinals)
+        self.ordinals.extend(ordinals)
+        for key, values in zip(self.keys(), columns):
+            if not isinstance(self.columns[key], array):
+                self.columns[key] = array('d', self.columns[key])
+            self.columns[key].extend(values)
+        # Nothing points into the cache file any more
+        self.close_mapping()
+        self.version += 1
+
+    def __len__(self):
+        return len(self.ordinals)
+
+    def keys(self):
+        return list(self.columns.keys())
+
+    def column(self, key):
+        return self.columns[key]
+
+    def date_at(self, position):
+        return datetime.date.fromordinal(self.ordinals[position])
+
+    # Returns the dates of rows start..end-1 (all rows by default) as date objects
+    def dates(self, start=0, end=None):
+        if end is None:
+            end = len(self.ordinals)
+        return [datetime.date.fromordinal(o) for o in self.ordinals[start:end]]
+
+    def first_date(self):
+        return self.date_at(0)
+
+    def last_date(self):
+        return self.date_at(len(self.ordinals) - 1)
+
+    '''
+    Returns the position of the given date in the date index, raising a KeyError if the
+    date has not been loaded. If the dates are contiguous the position is the number of days
+    since the first date, otherwise the sorted index is binary searched.
+    '''
+    def position(self, date):
+        ordinal = date.toordinal()
+        if self.contiguous and len(self.ordinals) > 0:
+            position = ordinal - self.ordinals[0]
+            if position < 0 or position >= len(self.ordinals):
+                raise KeyError(date)
+            return position
+        position = bisect_left(self.ordinals, ordinal)
+        if position == len(self.ordinals) or self.ordinals[position] != ordinal:
+            raise KeyError(date)
+        return position
+
+    '''
+    Returns the position of the first row on or after the given date, or the length of the
+    dataset if every row is before it.
+    '''
+    def find(self, date):
+        ordinal = date.toordinal()
+        if self.contiguous and len(self.ordinals) > 0:
+            return min(max(ordinal - self.ordinals[0], 0), len(self.ordinals))
+        return bisect_left(self.ordinals, ordinal)
+
+    '''
+    Returns the positions (start, end) of the rows from the first date to the last date inclusive,
+    so that rows start..end-1 are the ones in the range. Like find(), this is arithmetic for
+    contiguous dates and a binary search otherwise, so it doesn't depend on the size of the dataset.
+    '''
+    def range_positions(self, first, last):
+        start = self.find(first)
+        end = self.find(last + datetime.timedelta(days=1))
+        return start, max(start, end)
+
+    def row(self, position):
+        return {key: column[position] for key, column in self.columns.items()}
+
+    def view(self):
+        return DatasetView(self)
+
+
+'''
+A read-only, dictionary-like view of a dataset, so that code which expects the old
+'data_container[date][house]' layout keeps working. Each lookup builds the row dictionary on
+demand, so no per-date objects are kept in memory.
+'''
+class DatasetView(Mapping):
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    def __getitem__(self, date):
+        if not isinstance(date, datetime.date):
+            raise KeyError(date)
+        return self.dataset.row(self.dataset.position(date))
+
+    def __iter__(self):
+        return iter(self.dataset.dates())
+
+    def __len__(self):
+        return len(self.dataset)
+
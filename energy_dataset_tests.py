@@ -0,0 +1,67 @@
+import unittest
+import datetime
+from energy_dataset import EnergyDataset
+
+
+class TestEnergyDataset(unittest.TestCase):
+
+    def test_columns(self):
+        print("Testing that rows are stored as one array per column")
+        self.dataset.set_columns(['house_a', 'house_b'])
+        self.dataset.append(datetime.date(2016, 1, 1), [1.5, 2.5])
+        self.dataset.append(datetime.date(2016, 1, 2), [3.5, 4.5])
+
+        self.assertEqual(len(self.dataset), 2)
+        self.assertEqual(self.dataset.keys(), ['house_a', 'house_b'])
+        self.assertEqual(list(self.dataset.column('house_b')), [2.5, 4.5])
+        self.assertEqual(self.dataset.first_date(), datetime.date(2016, 1, 1))
+        self.assertEqual(self.dataset.last_date(), datetime.date(2016, 1, 2))
+
+    def test_view(self):
+        print("Testing that the dataset can still be looked up by date")
+        self.dataset.set_columns(['house_a'])
+        self.dataset.append(datetime.date(2016, 1, 1), [1.5])
+        view = self.dataset.view()
+
+        self.assertEqual(list(view.keys()), [datetime.date(2016, 1, 1)])
+        self.assertEqual(view[datetime.date(2016, 1, 1)], {'house_a': 1.5})
+        with self.assertRaises(KeyError):
+            view[datetime.date(2016, 1, 2)]
+
+    def test_bad_rows(self):
+        print("Testing that out of order dates and short rows raise an error")
+        self.dataset.set_columns(['house_a', 'house_b'])
+        self.dataset.append(datetime.date(2016, 1, 2), [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            self.dataset.append(datetime.date(2016, 1, 1), [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            self.dataset.append(datetime.date(2016, 1, 3), [1.0])
+
+    def test_find(self):
+        print("Testing that find returns the first row on or after a date")
+        self.dataset.set_columns(['house_a'])
+        for day in (1, 2, 5):
+            self.dataset.append(datetime.date(2016, 1, day), [1.0])
+
+        self.assertEqual(self.dataset.find(datetime.date(2015, 12, 1)), 0)
+        self.assertEqual(self.dataset.find(datetime.date(2016, 1, 3)), 2)
+        self.assertEqual(self.dataset.find(datetime.date(2016, 1, 5)), 2)
+        self.assertEqual(self.dataset.find(datetime.date(2016, 2, 1)), 3)
+
+    def test_range_positions(self):
+        print("Testing that range_positions returns the rows between two dates")
+        self.dataset.set_columns(['house_a'])
+        for day in (1, 2, 5, 6):
+            self.dataset.append(datetime.date(2016, 1, day), [float(day)])
+
+        self.assertEqual(self.dataset.range_positions(datetime.date(2016, 1, 2), datetime.date(2016, 1, 5)), (1, 3))
+        self.assertEqual(self.dataset.range_positions(datetime.date(2016, 1, 3), datetime.date(2016, 1, 4)), (2, 2))
+        self.assertEqual(self.dataset.range_positions(datetime.date(2015, 1, 1), datetime.date(2017, 1, 1)), (0, 4))
+        self.assertEqual(self.dataset.dates(1, 3), [datetime.date(2016, 1, 2), datetime.date(2016, 1, 5)])
+
+    def setUp(self):
+        self.dataset = EnergyDataset()
+
+
+if __name__ == '__main__':
+    unittest.main()
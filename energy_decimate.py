@@ -0,0 +1,81 @@
+import math
+from itertools import repeat
+from operator import add, mul
+
+'''
+This file reduces long series of values to a fixed number of points before they are plotted, so
+that graphs of many houses over several years stay small enough for the browser to draw. Like
+energy_dataset.py, it does not depend on tkinter or plotly.
+
+Two methods are offered, and both return the positions of the points to keep, so the same points
+can be picked out of the dates and the values:
+- 'lttb' (Largest Triangle Three Buckets) splits the series into buckets and keeps the point from
+  each bucket which makes the largest triangle with the point kept from the bucket before and the
+  average of the bucket after. This keeps the shape of the line, including its peaks.
+- 'minmax' keeps the lowest and highest point of each bucket, so every peak and trough is kept
+  exactly, at the cost of a more jagged line.
+Both treat the points as evenly spaced, which daily data is.
+'''
+
+METHODS = ('lttb', 'minmax')
+
+
+'''
+Largest Triangle Three Buckets: returns the positions of 'target' points of 'values' which keep
+its shape. The first and last points are always kept. The triangle areas for each bucket are
+worked out with map() calls, which run in C.
+'''
+def lttb(values, target):
+    size = len(values)
+    if target >= size or target < 3:
+        return list(range(size))
+    every = (size - 2) / (target - 2)
+    picked = [0]
+    a = 0
+    for i in range(target - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        following = min(int((i + 2) * every) + 1, size)
+        next_x = (end + following - 1) / 2
+        next_y = math.fsum(values[end:following]) / (following - end)
+        # Twice the area of the triangle (a, j, next) is |dx * y[j] + dy * j + c|
+        dx = a - next_x
+        dy = next_y - values[a]
+        c = -dx * values[a] - a * dy
+        areas = list(map(abs, map(add, map(add, map(mul, values[start:end], repeat(dx)),
+                                           map(mul, range(start, end), repeat(dy))), repeat(c))))
+        a = start + areas.index(max(areas))
+        picked.append(a)
+    picked.append(size - 1)
+    return picked
+
+
+'''
+Returns the positions of the lowest and highest value in each of target / 2 buckets of 'values'
+(so no more than 'target' points, plus the first and last), in order.
+'''
+def min_max(values, target):
+    size = len(values)
+    if target >= size or target < 4:
+        return list(range(size))
+    buckets = target // 2
+    picked = {0, size - 1}
+    for i in range(buckets):
+        start = i * size // buckets
+        end = (i + 1) * size // buckets
+        bucket = values[start:end]
+        picked.add(start + bucket.index(min(bucket)))
+        picked.add(start + bucket.index(max(bucket)))
+    return sorted(picked)
+
+
+'''
+Returns the positions of the points of 'values' to plot with the given method ('lttb' or
+'minmax'), keeping no more than about 'target' points.
+'''
+def decimate(values, target, method):
+    if method == 'lttb':
+        return lttb(values, target)
+    if method == 'minmax':
+        return min_max(values, target)
+    raise ValueError("Unknown decimation method: " + str(method))
@@ -0,0 +1,36 @@
+import unittest
+from energy_decimate import decimate, lttb, min_max
+
+
+class TestDecimate(unittest.TestCase):
+
+    def test_lttb(self):
+        print("Testing that LTTB keeps the requested number of points, including the ends and peaks")
+        values = [float(i % 10) for i in range(1000)]
+        values[503] = 100.0
+        positions = lttb(values, 50)
+        self.assertEqual(len(positions), 50)
+        self.assertEqual((positions[0], positions[-1]), (0, 999))
+        self.assertIn(503, positions)
+        self.assertEqual(positions, sorted(positions))
+
+    def test_min_max(self):
+        print("Testing that min/max decimation keeps the lowest and highest point of every bucket")
+        values = [float(i % 7) for i in range(1000)]
+        values[250] = -5.0
+        values[900] = 50.0
+        positions = min_max(values, 100)
+        self.assertLessEqual(len(positions), 102)
+        self.assertIn(250, positions)
+        self.assertIn(900, positions)
+
+    def test_short(self):
+        print("Testing that series already short enough are left alone")
+        self.assertEqual(decimate([1.0, 2.0, 3.0], 10, 'lttb'), [0, 1, 2])
+        self.assertEqual(decimate([1.0, 2.0, 3.0], 10, 'minmax'), [0, 1, 2])
+        with self.assertRaises(ValueError):
+            decimate([1.0], 10, 'every_other')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import datetime
+import itertools
+import os
+import re
+import time
+from os import path
+
+from energy_profile import Profiler
+from energy_worker import WorkerPool
+
+'''
+This file writes out the Energy Monitor's graphs on background threads. Building a plotly figure
+(which checks every value of every trace) and writing it out as HTML takes a long time for large
+data sets, and used to leave the window frozen until it was done. Like energy_dataset.py, it
+does not depend on tkinter or plotly: the function which builds and writes each figure is given to
+the FigureRenderer (see write_figure in energy_monitor.py).
+
+Several graphs can be written at once, each to its own HTML file in the output directory. The
+window collects the graphs which are ready with poll() and opens them, so a graph is never opened
+before its file has been written in full. Each graph is timed as a 'write graph' span on its
+worker thread (see energy_profile.py). Files shared by every graph in a directory, such as
+plotly.js, are written before the first graph is handed to a worker, so no worker reads them
+half-written.
+'''
+
+# Directory graphs are written to, unless another one is picked
+FIGURES_DIR = path.join(path.expanduser('~'), '.energy_monitor', 'figures')
+# Number of graphs which can be written at once
+FIGURE_WORKERS = 4
+
+
+class FigureRenderer:
+
+    '''
+    'render' is called on a worker thread with the arguments given to submit(), followed by the
+    name of the file to write the graph to. 'prepare', if given, is called with the output directory
+    before the first graph is written to it, on the thread calling submit().
+    '''
+    def __init__(self, render, output_dir=FIGURES_DIR, workers=FIGURE_WORKERS, profiler=None, prepare=None):
+        self.render = render
+        self.prepare = prepare
+        self.output_dir = output_dir
+        # The directories which have been prepared, since output_dir can be changed at any time
+        self.prepared = set()
+        self.profiler = Profiler() if profiler is None else profiler
+        self.pool = WorkerPool(workers)
+        self.count = itertools.count(1)
+
+    '''
+    Starts writing a graph, and returns the name of the file it will be written to. The file is
+    named after the graph's title, the time and a count, so graphs never overwrite one another.
+    Raises an OSError if the output directory can't be prepared.
+    '''
+    def submit(self, title, *args):
+        if self.output_dir not in self.prepared:
+            os.makedirs(self.output_dir, exist_ok=True)
+            if self.prepare is not None:
+                self.prepare(self.output_dir)
+            self.prepared.add(self.output_dir)
+        file = path.join(self.output_dir, figure_name(title, next(self.count)))
+        self.pool.submit(file, self.run, file, args)
+        return file
+
+    # Writes one graph, and returns the time it took
+    def run(self, file, args):
+        start = time.perf_counter()
+        with self.profiler.span('write graph'):
+            os.makedirs(path.dirname(file), exist_ok=True)
+            self.render(*args, file)
+        return time.perf_counter() - start
+
+    '''
+    Returns the graphs which have finished since the last call, without waiting, as a list of
+    (file, seconds, error) tuples, where 'error' is None if the graph was written.
+    '''
+    def poll(self):
+        return [finished(*message) for message in self.pool.poll()]
+
+    # Waits for every graph to be written (for scripts and tests), then returns them as poll() does
+    def wait(self, timeout=None):
+        return [finished(*message) for message in self.pool.wait(timeout)]
+
+    # Number of graphs still being written
+    def pending(self):
+        return self.pool.pending
+
+
+def finished(file, kind, value):
+    if kind == 'done':
+        return file, value, None
+    return file, None, value
+
+
+# Returns a file name made from a graph's title, e.g. 'house_a_both_fuels_daily-20160101-120000-1.html'
+def figure_name(title, number):
+    name = re.sub('[^a-z0-9]+', '_', title.lower()).strip('_') or 'graph'
+    return name[:60] + '-' + '{:%Y%m%d-%H%M%S}'.format(datetime.datetime.now()) + '-' + str(number) + '.html'
@@ -0,0 +1,91 @@
+import shutil
+import tempfile
+import unittest
+from os import path
+from energy_figures import FigureRenderer, figure_name
+from energy_profile import Profiler
+
+
+def render(text, file):
+    if text is None:
+        raise ValueError("Nothing to draw")
+    with open(file, 'w') as output:
+        output.write(text)
+
+
+class TestFigureRenderer(unittest.TestCase):
+
+    def test_render(self):
+        print("Testing that each graph is written to its own file in the output directory")
+        renderer = FigureRenderer(render, path.join(self.directory, 'graphs'), workers=2)
+        files = [renderer.submit('House A Both Fuels daily', 'graph ' + str(i)) for i in range(3)]
+        self.assertEqual(len(set(files)), 3)
+        finished = renderer.wait(5)
+        self.assertEqual(sorted(file for file, seconds, error in finished), sorted(files))
+        self.assertEqual(renderer.pending(), 0)
+        for i, file in enumerate(files):
+            self.assertEqual(path.dirname(file), path.join(self.directory, 'graphs'))
+            self.assertTrue(path.basename(file).startswith('house_a_both_fuels_daily-'))
+            with open(file) as written:
+                self.assertEqual(written.read(), 'graph ' + str(i))
+
+        print("Testing that a graph which can't be drawn is handed back with its error")
+        file = renderer.submit('Distribution graph', None)
+        [(finished_file, seconds, error)] = renderer.wait(5)
+        self.assertEqual(finished_file, file)
+        self.assertIsNone(seconds)
+        self.assertIsInstance(error, ValueError)
+        self.assertFalse(path.exists(file))
+        renderer.pool.shutdown()
+
+    def test_profiled(self):
+        print("Testing that each graph is timed on its worker thread, and handed over to the profiler's thread")
+        finished = []
+        profiler = Profiler(True, on_finish=finished.append)
+        renderer = FigureRenderer(render, self.directory, workers=2, profiler=profiler)
+        for i in range(3):
+            renderer.submit('Graph', 'graph ' + str(i))
+        renderer.wait(5)
+        spans = profiler.poll()
+        self.assertEqual([span.name for span in spans], ['write graph'] * 3)
+        self.assertEqual(finished, [])
+        renderer.pool.shutdown()
+
+    def test_prepare(self):
+        print("Testing that each output directory is prepared once, before any graph is written to it")
+        prepared = []
+
+        def prepare(directory):
+            prepared.append(directory)
+            with open(path.join(directory, 'shared.js'), 'w') as output:
+                output.write('shared')
+
+        def render_shared(text, file):
+            with open(path.join(path.dirname(file), 'shared.js')) as shared:
+                render(shared.read() + ' ' + text, file)
+
+        renderer = FigureRenderer(render_shared, path.join(self.directory, 'first'), workers=2, prepare=prepare)
+        files = [renderer.submit('Graph', 'graph ' + str(i)) for i in range(3)]
+        renderer.output_dir = path.join(self.directory, 'second')
+        files.append(renderer.submit('Graph', 'graph 3'))
+        self.assertEqual([error for file, seconds, error in renderer.wait(5)], [None] * 4)
+        self.assertEqual(prepared, [path.join(self.directory, 'first'), path.join(self.directory, 'second')])
+        with open(files[3]) as written:
+            self.assertEqual(written.read(), 'shared graph 3')
+        renderer.pool.shutdown()
+
+    def test_figure_name(self):
+        print("Testing that file names are made from graph titles")
+        self.assertTrue(figure_name('Total electricity usage (kWh)', 4).startswith('total_electricity_usage_kwh-'))
+        self.assertTrue(figure_name('Total electricity usage (kWh)', 4).endswith('-4.html'))
+        self.assertTrue(figure_name('£', 1).startswith('graph-'))
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,330 @@
+import calendar
+import csv
+import datetime
+import re
+from array import array
+from fnmatch import fnmatchcase
+from itertools import islice, repeat
+from operator import add, floordiv, ge, gt, itemgetter, mod
+from os import path
+
+from energy_validation import Validator, first_non_finite, non_finite_message
+
+'''
+This file reads usage CSV files (a date column followed by one numeric column per house or fuel)
+into an EnergyDataset. It does not depend on tkinter, so the GUI, scripts and tests can all share it.
+
+Instead of converting and storing one cell at a time, the file is read in chunks of rows. Each
+chunk is turned around into columns, and every column is converted to floats in one go and copied
+into arrays which were sized up front from the length of the file. Only one chunk of text is held
+in memory at a time, and the loader's progress (rows read, and the dates covered so far) can be
+checked after every chunk while the file is still loading.
+
+If only some of the columns are wanted (for example a few houses out of thousands), the other
+columns are never converted or stored, so memory use grows with the number of columns picked
+rather than the width of the file.
+
+Every chunk is checked as it is loaded (see energy_validation.py). Problems which stop the file
+loading are raised as a ValidationError, a kind of ValueError, which lists every error found in
+the chunk, and other problems are kept in the loader's validator.
+'''
+
+CHUNK_ROWS = 8192
+# Upper limit on the number of cells held in one chunk, so that very wide files use fewer rows
+# per chunk and the memory used by a chunk stays about the same.
+CHUNK_CELLS = 1 << 20
+
+
+'''
+Returns the positions in the header row (so 1 is the first column after the date) of the columns
+picked by a list of selections. Each selection is either an exact column name, a glob pattern such
+as 'house_*', or a regular expression starting with 're:'. Columns are kept in the order of the file.
+'''
+def select_columns(header, selections):
+    picked = set()
+    for selection in selections:
+        if selection.startswith('re:'):
+            pattern = re.compile(selection[3:])
+            matches = [i for i in range(1, len(header)) if pattern.fullmatch(header[i])]
+        elif any(c in selection for c in '*?['):
+            matches = [i for i in range(1, len(header)) if fnmatchcase(header[i], selection)]
+        else:
+            matches = [i for i in range(1, len(header)) if header[i] == selection]
+        if len(matches) == 0:
+            raise ValueError("No columns in the file match '" + selection + "'")
+        picked.update(matches)
+    return sorted(picked)
+
+
+'''
+Returns the ordinal of the day before the first day of a month (given as the number yyyymm),
+and the number of days in that month.
+'''
+def month_bounds(year_month):
+    year, month = divmod(year_month, 100)
+    if year < 1 or year > 9999 or month < 1 or month > 12:
+        raise ValueError("Invalid month: " + str(year_month))
+    return datetime.date(year, month, 1).toordinal() - 1, calendar.monthrange(year, month)[1]
+
+
+'''
+Converts a list of yyyymmdd strings into an array of day ordinals (see datetime.date.toordinal)
+without creating a date object for each one. Each string is read as an 8 digit number, split
+into its month (yyyymm) and day with integer arithmetic, and the ordinal is the start of its month
+plus the day. Month starts are only worked out once for each month in the list.
+first_row is the row number of the first string, used in error messages.
+'''
+def decode_dates(strings, first_row=1):
+    def bad_date(i):
+        raise ValueError("Row " + str(first_row + i) + ": '" + strings[i] + "' is not a valid yyyymmdd date")
+
+    if len(strings) == 0:
+        return array('l')
+    if set(map(len, strings)) != {8} or not all(map(str.isdigit, strings)):
+        bad_date(next(i for i, s in enumerate(strings) if len(s) != 8 or not s.isdigit()))
+    values = list(map(int, strings))
+    months = list(map(floordiv, values, repeat(100)))
+    days = list(map(mod, values, repeat(100)))
+    starts = {}
+    lengths = {}
+    for year_month in set(months):
+        try:
+            starts[year_month], lengths[year_month] = month_bounds(year_month)
+        except ValueError:
+            bad_date(months.index(year_month))
+    if min(days) < 1 or any(map(gt, days, map(lengths.__getitem__, months))):
+        bad_date(next(i for i, day in enumerate(days) if day < 1 or day > lengths[months[i]]))
+    return array('l', map(add, map(starts.__getitem__, months), days))
+
+
+'''
+Converts a chunk of rows into an array of day ordinals and one array of floats for each of the
+'selected' header positions, checking that every row has 'width' values, that the dates are in
+ascending order (after 'previous', the ordinal of the row before the chunk, if there is one) and
+that the values are finite numbers. first_row is the row number of the first row, used in error messages.
+If a validator is given, the converted values are checked for warnings, and if the chunk can't be
+converted, every row is checked and a ValidationError listing all of the errors is raised.
+'''
+def parse_chunk(chunk, width, selected, first_row=1, previous=None, validator=None):
+    try:
+        ordinals, columns = convert_chunk(chunk, width, selected, first_row, previous)
+    except ValueError:
+        if validator is None:
+            raise
+        validator.check_rows(chunk, width, selected, first_row, previous)
+        raise validator.error()
+    if validator is not None:
+        validator.check_values(ordinals, columns, selected, first_row, previous)
+    return ordinals, columns
+
+
+# Converts a chunk of rows in one go, raising a ValueError for the first problem found
+def convert_chunk(chunk, width, selected, first_row=1, previous=None):
+    for offset, row in enumerate(chunk):
+        if len(row) != width:
+            raise ValueError("Row " + str(first_row + offset) + " contains wrong number of values")
+    if len(selected) == width - 1:
+        cells = list(zip(*chunk))
+    else:
+        # Only the date and the selected columns are taken out of the rows
+        cells = {i: list(map(itemgetter(i), chunk)) for i in [0] + selected}
+    ordinals = decode_dates(cells[0], first_row)
+    # Compares every date with the one before it, including the last date before the chunk
+    before = array('l') if previous is None else array('l', [previous])
+    sequence = before + ordinals
+    if any(map(ge, sequence, sequence[1:])):
+        i = next(i for i in range(len(sequence) - 1) if sequence[i] >= sequence[i + 1])
+        raise ValueError("Row " + str(first_row + i + 1 - len(before)) + " is not in date order")
+    columns = []
+    for i in selected:
+        try:
+            columns.append(array('d', map(float, cells[i])))
+        except ValueError:
+            raise_bad_value(cells[i], first_row, i)
+        offset = first_non_finite(columns[-1])
+        if offset is not None:
+            raise ValueError(non_finite_message(first_row + offset, i, columns[-1][offset]))
+    return ordinals, columns
+
+
+def raise_bad_value(values, first_row, column):
+    for offset, value in enumerate(values):
+        try:
+            float(value)
+        except ValueError:
+            raise ValueError("Row " + str(first_row + offset) + ", column " + str(column + 1) +
+                             ": '" + value + "' is not a number")
+
+
+class CsvLoader:
+
+    def __init__(self, file, chunk_rows=None, on_chunk=None, validator=None):
+        self.file = file
+        # If no chunk size is given, one is picked from the width of the file
+        self.chunk_rows = chunk_rows
+        # Called as on_chunk(loader, start, end) after rows start..end-1 have been loaded
+        self.on_chunk = on_chunk
+        # Collects the problems found in the file (see energy_validation.py)
+        self.validator = Validator() if validator is None else validator
+        self.header = None
+        # The positions in the header of the columns being loaded, and their names
+        self.selected = []
+        self.names = []
+        self.rows = 0
+        self.bytes_read = 0
+        self.total_bytes = path.getsize(file)
+        self.ordinals = array('l')
+        self.columns = []
+
+    def first_date(self):
+        if self.rows == 0:
+            return None
+        return datetime.date.fromordinal(self.ordinals[0])
+
+    def last_date(self):
+        if self.rows == 0:
+            return None
+        return datetime.date.fromordinal(self.ordinals[self.rows - 1])
+
+    '''
+    Reads the whole file into the given dataset. check_header, if given, is called with the
+    header row before any data is read and should raise an error if it is wrong. If 'select' is
+    given, only the columns it picks are loaded (see select_columns). The columns are stored
+    under 'keys', or under the header names if no keys are given.
+    Returns the header row.
+    '''
+    def load(self, dataset, check_header=None, keys=None, select=None):
+        with open(self.file, 'r', newline='') as file_contents:
+            reader = csv.reader(file_contents)
+            self.header = next(reader, None)
+            if self.header is None:
+                raise ValueError("File is empty")
+            if check_header is not None:
+                check_header(self.header)
+            width = len(self.header)
+            if select is None:
+                self.selected = list(range(1, width))
+            else:
+                self.selected = select_columns(self.header, select)
+            self.names = [self.header[i] for i in self.selected]
+            if keys is None:
+                keys = self.names
+            chunk_rows = self.chunk_rows or max(16, min(CHUNK_ROWS, CHUNK_CELLS // width))
+
+            while True:
+                rows = list(islice(reader, chunk_rows))
+                if len(rows) == 0:
+                    break
+                self.bytes_read = file_contents.buffer.tell()
+                # Blank lines are skipped, and a chunk of nothing but blank lines doesn't end the file
+                chunk = [row for row in rows if len(row) > 0]
+                if len(chunk) > 0:
+                    self.add_chunk(chunk, width)
+
+        for buffer in [self.ordinals] + self.columns:
+            del buffer[self.rows:]
+        dataset.set_data(keys, self.ordinals, self.columns)
+        self.bytes_read = self.total_bytes
+        return self.header
+
+    def add_chunk(self, chunk, width):
+        start = self.rows
+        previous = self.ordinals[start - 1] if start > 0 else None
+        ordinals, columns = parse_chunk(chunk, width, self.selected, start + 1, previous, self.validator)
+        if start == 0:
+            self.allocate(chunk, width)
+        end = start + len(chunk)
+        if end > len(self.ordinals):
+            self.grow(end)
+        self.ordinals[start:end] = ordinals
+        for column, values in zip(self.columns, columns):
+            column[start:end] = values
+        self.rows = end
+
+        if self.on_chunk is not None:
+            self.on_chunk(self, start, end)
+
+    '''
+    Sizes the buffers from the first chunk, assuming the rest of the file has rows of about
+    the same length.
+    '''
+    def allocate(self, chunk, width):
+        chunk_bytes = sum(len(cell) + 1 for row in chunk for cell in row)
+        estimate = max(len(chunk), int(self.total_bytes * len(chunk) / chunk_bytes * 1.05))
+        self.ordinals = array('l', bytes(self.ordinals.itemsize * estimate))
+        self.columns = [array('d', bytes(8 * estimate)) for i in self.selected]
+
+    def grow(self, needed):
+        extra = max(needed, 2 * len(self.ordinals)) - len(self.ordinals)
+        self.ordinals.frombytes(bytes(self.ordinals.itemsize * extra))
+        for column in self.columns:
+            column.frombytes(bytes(8 * extra))
+
+
+'''
+Follows a usage file which grows by having rows added to the end, such as a meter export which
+gains one row per day. It remembers the byte offset of the end of the last row loaded and that
+row's date, so each call to read() only parses the rows added since, however long the file is.
+'''
+class TailReader:
+
+    '''
+    'dataset' must hold the rows already loaded from the file, with the columns at the 'selected'
+    positions of the header (see select_columns). The end of the row holding the dataset's last
+    date is found by searching back from the end of the file, so it doesn't matter whether the
+    dataset was read from the CSV or from the cache.
+    '''
+    def __init__(self, file, header, selected, dataset, validator=None):
+        self.file = file
+        self.width = len(header)
+        self.selected = list(selected)
+        self.validator = validator
+        self.last_ordinal = dataset.ordinals[-1] if len(dataset) > 0 else None
+        self.offset = self.locate()
+
+    # Returns the byte offset just after the last row already loaded
+    def locate(self):
+        size = path.getsize(self.file)
+        if self.last_ordinal is None:
+            marker = None
+        else:
+            marker = b'\n' + "{:%Y%m%d},".format(datetime.date.fromordinal(self.last_ordinal)).encode('ascii')
+        block = 1 << 16
+        with open(self.file, 'rb') as contents:
+            while True:
+                start = max(0, size - block) if marker is not None else 0
+                contents.seek(start)
+                data = contents.read(size - start)
+                found = data.rfind(marker) if marker is not None else 0
+                if found >= 0:
+                    end = data.find(b'\n', found + 1)
+                    return size if end < 0 else start + end + 1
+                if start == 0:
+                    raise ValueError("The last date loaded is no longer in the file, it must be loaded again")
+                block *= 4
+
+    '''
+    Adds any complete rows written to the end of the file since the last read to the dataset,
+    and returns the number of rows added. A row which is still being written (with no line
+    ending yet) is left for the next read.
+    '''
+    def read(self, dataset):
+        size = path.getsize(self.file)
+        if size < self.offset:
+            raise ValueError("The file is shorter than when it was loaded, it must be loaded again")
+        if size == self.offset:
+            return 0
+        with open(self.file, 'rb') as contents:
+            contents.seek(self.offset)
+            data = contents.read(size - self.offset)
+        end = data.rfind(b'\n') + 1
+        if end == 0:
+            return 0
+        rows = [row for row in csv.reader(data[:end].decode('utf-8').splitlines()) if len(row) > 0]
+        if len(rows) > 0:
+            ordinals, columns = parse_chunk(rows, self.width, self.selected, len(dataset) + 1, self.last_ordinal,
+                                            self.validator)
+            dataset.extend(ordinals, columns)
+            self.last_ordinal = ordinals[-1]
+        self.offset += end
+        return len(rows)
@@ -0,0 +1,143 @@
+import unittest
+import datetime
+import tempfile
+from os import path
+from energy_dataset import EnergyDataset
+from energy_loader import CsvLoader, TailReader, decode_dates, select_columns
+
+
+class TestCsvLoader(unittest.TestCase):
+
+    def test_multiple(self):
+        print("Testing that a multiple house file is loaded in chunks")
+        chunks = []
+        loader = CsvLoader(path.join(self.working_dir, 'resources', 'electricity_daily_test.csv'), chunk_rows=3,
+                           on_chunk=lambda l, start, end: chunks.append((start, end, l.last_date())))
+        header = loader.load(self.dataset)
+
+        self.assertEqual(header[1], 'house_a')
+        self.assertEqual(self.dataset.keys(), ['house_a', 'house_b', 'house_c', 'house_d'])
+        self.assertEqual(len(self.dataset), 4)
+        self.assertEqual(chunks, [(0, 3, datetime.date(2016, 1, 3)), (3, 4, datetime.date(2016, 1, 4))])
+        self.assertEqual(self.dataset.row(0), {'house_a': 5.778333712, 'house_b': 9.80291645,
+                                               'house_c': 5.44345916, 'house_d': 8.46050336})
+
+    def test_growing(self):
+        print("Testing that a file with more rows than estimated is loaded fully")
+        rows = ["2016%02d%02d,%d\n" % (1 + i // 28, 1 + i % 28, i) for i in range(300)]
+        file = self.write_file("date,a\n" + "".join(rows))
+        loader = CsvLoader(file, chunk_rows=7)
+        loader.total_bytes = 10 # Makes the first chunk's size estimate far too small
+        loader.load(self.dataset)
+
+        self.assertEqual(len(self.dataset), 300)
+        self.assertEqual(list(self.dataset.column('a')), [float(i) for i in range(300)])
+
+    def test_blank_lines(self):
+        print("Testing that a run of blank lines as long as a chunk doesn't end the file early")
+        file = self.write_file("date,a\n20160101,1\n\n\n\n20160102,2\n20160103,3\n")
+        CsvLoader(file, chunk_rows=2).load(self.dataset)
+
+        self.assertEqual(len(self.dataset), 3)
+        self.assertEqual(list(self.dataset.column('a')), [1.0, 2.0, 3.0])
+
+    def test_bad_rows(self):
+        print("Testing that bad rows are reported with their position")
+        file = self.write_file("date,a,b\n20160101,1,2\n20160102,1\n")
+        with self.assertRaisesRegex(ValueError, "Row 2 contains wrong number of values"):
+            CsvLoader(file).load(self.dataset)
+        file = self.write_file("date,a,b\n20160101,1,2\n20160102,1,x\n")
+        with self.assertRaisesRegex(ValueError, "Row 2, column 3: 'x' is not a number"):
+            CsvLoader(file).load(self.dataset)
+        file = self.write_file("date,a\n20160102,1\n20160101,1\n")
+        with self.assertRaisesRegex(ValueError, "Row 2 is not in date order"):
+            CsvLoader(file).load(self.dataset)
+
+    def test_select(self):
+        print("Testing that only the selected houses are loaded")
+        loader = CsvLoader(path.join(self.working_dir, 'resources', 'electricity_daily_test.csv'))
+        header = loader.load(self.dataset, select=['house_d', 're:house_[ab]'])
+
+        self.assertEqual(len(header), 5)
+        self.assertEqual(self.dataset.keys(), ['house_a', 'house_b', 'house_d'])
+        self.assertEqual(self.dataset.row(0), {'house_a': 5.778333712, 'house_b': 9.80291645, 'house_d': 8.46050336})
+
+    def test_contiguous(self):
+        print("Testing that a file with a row for every day is marked as contiguous")
+        CsvLoader(path.join(self.working_dir, 'resources', 'electricity_daily.csv')).load(self.dataset)
+        self.assertTrue(self.dataset.contiguous)
+        self.assertEqual(self.dataset.position(datetime.date(2016, 3, 1)), 60)
+        file = self.write_file("date,a\n20160101,1\n20160103,1\n")
+        CsvLoader(file).load(self.dataset)
+        self.assertFalse(self.dataset.contiguous)
+        self.assertEqual(self.dataset.position(datetime.date(2016, 1, 3)), 1)
+
+    def test_tail(self):
+        print("Testing that only rows added to the end of a file are read")
+        file = self.write_file("date,a,b\n20160101,1,10\n20160102,2,20\n")
+        header = CsvLoader(file, chunk_rows=1).load(self.dataset, select=['b'])
+        tail = TailReader(file, header, [2], self.dataset)
+        self.assertEqual(tail.read(self.dataset), 0)
+
+        with open(file, 'a') as output:
+            output.write("20160103,3,30\n20160104,4")
+        self.assertEqual(tail.read(self.dataset), 1)
+        with open(file, 'a') as output:
+            output.write(",40\n")
+        self.assertEqual(tail.read(self.dataset), 1)
+        self.assertEqual(list(self.dataset.column('b')), [10.0, 20.0, 30.0, 40.0])
+        self.assertEqual(self.dataset.last_date(), datetime.date(2016, 1, 4))
+        self.assertTrue(self.dataset.contiguous)
+
+        with open(file, 'a') as output:
+            output.write("20160102,5,50\n")
+        with self.assertRaisesRegex(ValueError, "Row 5 is not in date order"):
+            tail.read(self.dataset)
+        self.write_file("date,a,b\n")
+        with self.assertRaises(ValueError):
+            tail.read(self.dataset)
+
+    def write_file(self, text):
+        file = path.join(self.temp_dir.name, 'electricity_daily.csv')
+        with open(file, 'w') as output:
+            output.write(text)
+        return file
+
+    def setUp(self):
+        self.dataset = EnergyDataset()
+        self.working_dir = path.dirname(path.abspath(__file__))
+        self.temp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+class TestSelectColumns(unittest.TestCase):
+
+    def test_patterns(self):
+        print("Testing that columns can be picked by name, glob or regular expression")
+        header = ['date', 'house_a', 'house_b', 'flat_1', 'flat_12']
+        self.assertEqual(select_columns(header, ['flat_1']), [3])
+        self.assertEqual(select_columns(header, ['flat_*', 'house_a']), [1, 3, 4])
+        self.assertEqual(select_columns(header, ['re:flat_\\d']), [3])
+        with self.assertRaises(ValueError):
+            select_columns(header, ['house_c'])
+
+
+class TestDecodeDates(unittest.TestCase):
+
+    def test_decode(self):
+        print("Testing that yyyymmdd strings are turned into day ordinals")
+        strings = ['19000228', '19000301', '20000229', '20161231', '99991231']
+        expected = [datetime.datetime.strptime(s, '%Y%m%d').toordinal() for s in strings]
+        self.assertEqual(list(decode_dates(strings)), expected)
+
+    def test_bad_dates(self):
+        print("Testing that invalid dates are reported with their row")
+        for bad in ['19000229', '20161301', '20160100', '2016011', '2016o101', '00000101']:
+            with self.assertRaisesRegex(ValueError, "Row 6: '" + bad + "'"):
+                decode_dates(['20160101', bad], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,268 @@
+import sys
+from array import array
+from collections import OrderedDict
+
+from energy_ranges import RangeIndex
+from energy_rollup import period_label
+from energy_sketch import EXACT_LIMIT, QUANTILE_MODES, SKETCH_SIZE, merge_sketches, sketch_sorted
+from energy_stats import sorted_quartiles
+
+'''
+This file works out the metrics shown in the metrics panel: the smallest and largest daily and
+monthly usage, and the statistics from energy_stats.py, for each house or fuel. Like
+energy_dataset.py it does not depend on tkinter or plotly, so the same metrics can be worked
+out by the GUI and by the command line report (see energy_report.py).
+
+Metrics can be worked out over any range of dates. The smallest and largest values, mean, standard
+deviation, skewness and kurtosis of a range are looked up in constant time from a RangeIndex (see
+energy_ranges.py); only the quartiles need the values in the range sorting. The GUI keeps the
+metrics it has worked out in a MetricsCache, so switching between houses or going back to a date
+range already shown doesn't work them out again.
+
+The quartiles of every house together (the 'all' metrics) are worked out exactly by sorting every
+value of every house, up to EXACT_LIMIT values. Beyond that, a quantile sketch of each house is
+made from the values sorted for its own quartiles, and the sketches are merged (see
+energy_sketch.py), so the values of every house are never held or sorted together.
+'''
+
+# Number of sets of metrics (one per house, date range and resolution) kept by a MetricsCache, enough
+# for every house in a large file over several date ranges
+METRICS_CACHE_SIZE = 1024
+# The words used in the names of the period metrics for each resolution
+PERIOD_WORDS = {'weekly': ('weekly', 'week'), 'monthly': ('monthly', 'month'),
+                'quarterly': ('quarterly', 'quarter'), 'yearly': ('yearly', 'year')}
+# Entries of a house's metrics which hold data rather than figures to show
+DATA_FIELDS = ('rawdata', 'sketch')
+
+
+'''
+Adds the statistics from energy_stats.describe (or RangeIndex.stats with the quartiles added, see
+add_quartiles), rounded for display, to a house's metrics. The data they were worked out from is
+kept under 'rawdata', for the distribution graph.
+'''
+def calc_metrics(metrics, data, stats):
+    metrics['Mean usage: '] = round(stats['mean'], 5)
+    metrics['Lower Quartile: '] = round(stats['lower_quartile'], 5)
+    metrics['Median: '] = round(stats['median'], 5)
+    metrics['Upper quartile: '] = round(stats['upper_quartile'], 5)
+    metrics['Interquartile range: '] = round(stats['iqr'], 5)
+    metrics['Standard Deviation: '] = round(stats['std_dev'], 5)
+    metrics['Skewness: '] = round(stats['skew'], 5)
+    metrics['Kurtosis: '] = round(stats['kurtosis'], 5)
+    metrics['rawdata'] = data
+
+
+# Adds the quartiles and interquartile range of some sorted data (or a QuantileSketch) to its statistics
+def add_quartiles(stats, ordered):
+    (stats['lower_quartile'], stats['median'], stats['upper_quartile']) = sorted_quartiles(ordered)
+    stats['iqr'] = stats['upper_quartile'] - stats['lower_quartile']
+    return stats
+
+
+'''
+Returns the metrics of one column of 'dataset' over rows first..last-1 (every row by default).
+The smallest and largest period totals are taken from 'periods', a Rollup of the dataset (see
+energy_rollup.py), leaving out periods which are only partly loaded or only partly in the range.
+'ranges' is the dataset's RangeIndex, if it has one. If 'sketch_size' is given, a quantile sketch
+of the values with room for that many values is kept under 'sketch', for when the quartiles of
+every house together are worked out from sketches (see fleet_metrics).
+'''
+def column_metrics(dataset, periods, key, first=0, last=None, ranges=None, sketch_size=None):
+    if ranges is None:
+        ranges = RangeIndex(dataset)
+    if last is None:
+        last = len(dataset)
+    if last <= first:
+        raise ValueError("There is no data in the chosen date range")
+    data = dataset.column(key)
+    if first != 0 or last != len(data):
+        data = data[first:last]
+    metrics = {}
+    first_date = dataset.date_at(first)
+    metrics['Minimum usage: '] = sys.float_info.max
+    metrics['Maximum usage: '] = 0
+    metrics['Minimum used on: '] = first_date
+    metrics['Maximum used on: '] = first_date
+    # The first row holding the largest/smallest value is returned, so ties go to the earliest date as before.
+    (largest, maxpos) = ranges.maximum(key, first, last)
+    (smallest, minpos) = ranges.minimum(key, first, last)
+    if largest > metrics['Maximum usage: ']:
+        metrics['Maximum usage: '] = round(largest, 5)
+        metrics['Maximum used on: '] = dataset.date_at(maxpos)
+    if smallest < metrics['Minimum usage: ']:
+        metrics['Minimum usage: '] = round(smallest, 5)
+        metrics['Minimum used on: '] = dataset.date_at(minpos)
+
+    (adjective, noun) = PERIOD_WORDS[periods.resolution]
+    minimum = 'Minimum ' + adjective + ' usage: '
+    maximum = 'Maximum ' + adjective + ' usage: '
+    metrics[minimum] = sys.float_info.max
+    metrics[maximum] = 0
+    metrics['Minimum ' + noun + ': '] = ""
+    metrics['Maximum ' + noun + ': '] = ""
+    totals = periods.totals.column(key)
+    for position, (lo, hi) in enumerate(periods.bounds):
+        if lo < first or hi > last or not periods.is_complete(position):
+            continue
+        label = period_label(periods.totals.date_at(position), periods.resolution)
+        if totals[position] > metrics[maximum]:
+            metrics[maximum] = round(totals[position], 5)
+            metrics['Maximum ' + noun + ': '] = label
+        if totals[position] < metrics[minimum]:
+            metrics[minimum] = round(totals[position], 5)
+            metrics['Minimum ' + noun + ': '] = label
+    ordered = sorted(data)
+    calc_metrics(metrics, data, add_quartiles(ranges.stats([key], first, last), ordered))
+    if sketch_size is not None:
+        metrics['sketch'] = sketch_sorted(ordered, sketch_size)
+    return metrics
+
+
+'''
+Returns True if the quartiles of 'count' values of several houses together are worked out by
+merging a sketch of each house, rather than sorting every value, with the given quantile mode.
+'''
+def uses_sketches(count, quantiles):
+    if quantiles not in QUANTILE_MODES:
+        raise ValueError("Unknown quantile mode: " + str(quantiles))
+    return quantiles == 'sketch' or (quantiles == 'auto' and count > EXACT_LIMIT)
+
+
+'''
+Returns the metrics of every house in 'keys' together over rows first..last-1, recording which
+house used the least and the most. 'metrics' holds the metrics of each house over the same rows.
+'quantiles' is one of QUANTILE_MODES. When the quartiles are worked out exactly, every value is
+kept under 'rawdata'. When they come from the sketches of each house, 'rawdata' is None, and a
+house without a sketch in its metrics has one made with room for 'sketch_size' values.
+'''
+def fleet_metrics(dataset, keys, metrics, first=0, last=None, ranges=None, quantiles='auto', sketch_size=SKETCH_SIZE):
+    if ranges is None:
+        ranges = RangeIndex(dataset)
+    if last is None:
+        last = len(dataset)
+    exact = not uses_sketches(len(keys) * (last - first), quantiles)
+    fleet = {}
+    first_date = dataset.date_at(first)
+    fleet['Minimum usage: '] = sys.float_info.max
+    fleet['Minimum used on: '] = first_date
+    fleet['Minimum used by: '] = keys[0]
+    fleet['Maximum usage: '] = 0
+    fleet['Maximum used on: '] = first_date
+    fleet['Maximum used by: '] = keys[0]
+    alldata = array('d') if exact else None
+    for i in keys:
+        if exact:
+            data = dataset.column(i)
+            alldata.extend(data[first:last] if first != 0 or last != len(data) else data)
+        if metrics[i]['Maximum usage: '] > fleet['Maximum usage: ']:
+            fleet['Maximum usage: '] = metrics[i]['Maximum usage: ']
+            fleet['Maximum used on: '] = metrics[i]['Maximum used on: ']
+            fleet['Maximum used by: '] = i
+        if metrics[i]['Minimum usage: '] < fleet['Minimum usage: ']:
+            fleet['Minimum usage: '] = metrics[i]['Minimum usage: ']
+            fleet['Minimum used on: '] = metrics[i]['Minimum used on: ']
+            fleet['Minimum used by: '] = i
+    if exact:
+        ordered = sorted(alldata)
+    else:
+        sketches = [metrics[i]['sketch'] if 'sketch' in metrics[i]
+                    else sketch_sorted(sorted(metrics[i]['rawdata']), sketch_size) for i in keys]
+        ordered = merge_sketches(sketches, sketch_size)
+    calc_metrics(fleet, alldata, add_quartiles(ranges.stats(keys, first, last), ordered))
+    return fleet
+
+
+'''
+Returns an OrderedDict of key -> metrics for each of 'keys' (columns of 'dataset') over rows
+first..last-1, using 'periods' (a Rollup of the dataset) for the period figures. If 'fleet' is
+True (for multiple house files) an 'all' entry covering every house together comes first, with
+its quartiles worked out as set by 'quantiles' and 'sketch_size' (see fleet_metrics). Each house
+only has a sketch made if the quartiles of every house are worked out from sketches.
+'''
+def usage_metrics(dataset, periods, keys, fleet, first=0, last=None, quantiles='auto', sketch_size=SKETCH_SIZE):
+    ranges = RangeIndex(dataset)
+    if last is None:
+        last = len(dataset)
+    sketched = fleet and uses_sketches(len(keys) * (last - first), quantiles)
+    metrics = OrderedDict()
+    if fleet:
+        metrics['all'] = None
+    for i in keys:
+        metrics[i] = column_metrics(dataset, periods, i, first, last, ranges, sketch_size if sketched else None)
+    if fleet:
+        metrics['all'] = fleet_metrics(dataset, keys, metrics, first, last, ranges, quantiles, sketch_size)
+    return metrics
+
+
+'''
+Keeps the metrics worked out from a dataset, so they are only worked out once for each house (or
+fuel), date range and resolution of period totals. Each set of metrics is stored under the
+dataset's version number along with those, so once rows are added to the dataset (or it is
+reloaded) they are no longer used, and are dropped the next time metrics are asked for. Only the
+'size' most recently used sets are kept. 'quantiles' and 'sketch_size' are as for usage_metrics.
+'''
+class MetricsCache:
+
+    def __init__(self, dataset, rollups, ranges=None, size=METRICS_CACHE_SIZE, quantiles='auto',
+                 sketch_size=SKETCH_SIZE):
+        self.dataset = dataset
+        # The RollupCache and RangeIndex of the dataset, which the metrics are worked out from
+        self.rollups = rollups
+        self.ranges = RangeIndex(dataset) if ranges is None else ranges
+        self.size = size
+        self.quantiles = quantiles
+        self.sketch_size = sketch_size
+        self.entries = OrderedDict()
+        self.version = dataset.version
+        self.hits = 0
+        self.misses = 0
+
+    '''
+    Returns the metrics of one column over rows first..last-1 (every row by default). If 'sketched'
+    is True and the metrics aren't already cached, they are worked out with a quantile sketch.
+    '''
+    def column(self, key, first=0, last=None, resolution='monthly', sketched=False):
+        return self.lookup(key, first, last, resolution,
+                           lambda last: column_metrics(self.dataset, self.rollups.get(resolution), key, first, last,
+                                                       self.ranges, self.sketch_size if sketched else None))
+
+    # Returns the metrics of every house in 'keys' together, as the 'all' entry of usage_metrics
+    def fleet(self, keys, first=0, last=None, resolution='monthly'):
+        keys = list(keys)
+
+        def work(last):
+            sketched = uses_sketches(len(keys) * (last - first), self.quantiles)
+            metrics = {i: self.column(i, first, last, resolution, sketched) for i in keys}
+            return fleet_metrics(self.dataset, keys, metrics, first, last, self.ranges, self.quantiles,
+                                 self.sketch_size)
+        return self.lookup(('all',) + tuple(keys), first, last, resolution, work)
+
+    # Returns the same metrics as usage_metrics, taking each set from the cache if it is there
+    def metrics(self, keys, fleet, first=0, last=None, resolution='monthly'):
+        metrics = OrderedDict()
+        if fleet:
+            metrics['all'] = self.fleet(keys, first, last, resolution)
+        for i in keys:
+            metrics[i] = self.column(i, first, last, resolution)
+        return metrics
+
+    def lookup(self, key, first, last, resolution, work):
+        if self.dataset.version != self.version:
+            self.entries.clear()
+            self.version = self.dataset.version
+        if last is None:
+            last = len(self.dataset)
+        entry = (self.version, key, first, last, resolution)
+        if entry in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(entry)
+            return self.entries[entry]
+        self.misses += 1
+        metrics = work(last)
+        self.entries[entry] = metrics
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+        return metrics
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,67 @@
+import unittest
+import datetime
+from energy_dataset import EnergyDataset
+from energy_metrics import MetricsCache, column_metrics, usage_metrics
+from energy_rollup import Rollup, RollupCache
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_range(self):
+        print("Testing that metrics only cover the chosen rows, and complete months within them")
+        (first, last) = self.dataset.range_positions(datetime.date(2016, 2, 1), datetime.date(2016, 3, 31))
+        metrics = column_metrics(self.dataset, Rollup(self.dataset, 'monthly'), 'house_a', first, last)
+        self.assertEqual(metrics['Minimum usage: '], 32)
+        self.assertEqual(metrics['Minimum used on: '], datetime.date(2016, 2, 1))
+        self.assertEqual(metrics['Maximum used on: '], datetime.date(2016, 3, 31))
+        self.assertEqual(metrics['Minimum month: '], 'Feb 2016')
+        self.assertEqual(metrics['Maximum month: '], 'Mar 2016')
+        self.assertEqual(len(metrics['rawdata']), 60)
+
+        # April is only partly loaded, so it isn't counted as a month
+        metrics = usage_metrics(self.dataset, Rollup(self.dataset, 'monthly'), ['house_a', 'house_b'], True)
+        self.assertEqual(list(metrics.keys()), ['all', 'house_a', 'house_b'])
+        self.assertEqual(metrics['house_a']['Maximum month: '], 'Mar 2016')
+        self.assertEqual(metrics['all']['Maximum used by: '], 'house_a')
+        self.assertEqual(metrics['all']['Minimum used by: '], 'house_b')
+        self.assertEqual(len(metrics['all']['rawdata']), 2 * len(self.dataset))
+
+        with self.assertRaises(ValueError):
+            column_metrics(self.dataset, Rollup(self.dataset, 'monthly'), 'house_a', 5, 5)
+
+    def test_cache(self):
+        print("Testing that cached metrics are reused until the data changes, and the least recently used are dropped")
+        cache = MetricsCache(self.dataset, RollupCache(self.dataset, 7), size=3)
+        metrics = cache.column('house_a')
+        self.assertIs(cache.column('house_a', 0, len(self.dataset)), metrics)
+        ranged = cache.column('house_a', 10, 40)
+        self.assertIsNot(ranged, metrics)
+        self.assertIsNot(cache.column('house_a', 10, 40, 'weekly'), ranged)
+        self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+        # Using the whole range again makes the range from row 10 the least recently used
+        cache.column('house_a')
+        cache.column('house_b')
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+        cache.column('house_a', 10, 40)
+        self.assertEqual(cache.misses, 5)
+
+        self.dataset.append(datetime.date(2016, 4, 11), [1.0, 1.0])
+        self.assertEqual(len(cache.column('house_a')['rawdata']), len(self.dataset))
+        self.assertEqual(len(cache.entries), 1)
+
+        fleet = cache.metrics(['house_a', 'house_b'], True)
+        self.assertIs(cache.fleet(['house_a', 'house_b']), fleet['all'])
+
+    def setUp(self):
+        # House a uses 1 more kWh each day, and house b always uses half a kWh, from Jan 1st to Apr 10th 2016
+        self.dataset = EnergyDataset()
+        self.dataset.set_columns(['house_a', 'house_b'])
+        day = datetime.date(2016, 1, 1)
+        while day <= datetime.date(2016, 4, 10):
+            self.dataset.append(day, [float(len(self.dataset) + 1), 0.5])
+            day += datetime.timedelta(days=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
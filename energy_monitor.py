@@ -1,11 +1,17 @@
 import csv
 import datetime
 import math
+import os
+import re
 import tkinter as tk
+import webbrowser
+from array import array
 from collections import OrderedDict
 from enum import Enum
+from functools import partial
 from ntpath import basename
 from os import path
+from pathlib import Path
 from tkinter import *
 from tkinter import filedialog
 from tkinter import scrolledtext
@@ -13,6 +19,21 @@ from tkinter import scrolledtext
 import plotly
 import plotly.graph_objs as go
 
+from energy_bulk import load_houses
+from energy_dataset import EnergyDataset
+from energy_decimate import decimate
+from energy_figures import FigureRenderer
+from energy_cache import load_cached
+from energy_loader import TailReader, select_columns
+from energy_metrics import DATA_FIELDS, MetricsCache
+from energy_ranges import RangeIndex
+from energy_profile import Profiler, format_seconds, profiled, summary
+from energy_validation import ValidationError, Validator
+from energy_worker import BackgroundTask, Cancelled
+from energy_costs import cost_columns, read_supplier_file, supplier_rates, to_pounds
+from energy_rollup import RESOLUTIONS, RollupCache, period_label
+from energy_stats import histogram, rolling_mean, rolling_means, silverman_bandwidth, smooth_histogram
+
 
 # We have an enum defined here so we can use it instead of the strings 'gas' and 'electricity'
 # Enums essentially reserve a few named types that are bound to fixed values. They are useful
@@ -24,89 +45,450 @@ class FuelType(Enum):
 
 MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
 DAYS = (31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+# Moving average options for daily graphs, and the number of days each one averages over
+AVERAGE_WINDOWS = OrderedDict([('No average', 0), ('7 day average', 7), ('30 day average', 30),
+                               ('90 day average', 90), ('365 day average', 365)])
+# Decimation options for graphs, and the number of points each trace is cut down to
+DECIMATION_METHODS = OrderedDict([('All points', None), ('LTTB', 'lttb'), ('Min/max', 'minmax')])
+POINT_TARGETS = OrderedDict([('1,000 points', 1000), ('2,000 points', 2000), ('5,000 points', 5000),
+                             ('10,000 points', 10000)])
+# Bin counts offered for distribution graphs
+BIN_COUNTS = OrderedDict([('50 bins', 50), ('100 bins', 100), ('200 bins', 200), ('300 bins', 300),
+                          ('400 bins', 400), ('500 bins', 500), ('600 bins', 600)])
+# How often (in milliseconds) a followed usage file is checked for new rows
+FOLLOW_INTERVAL = 5000
+# How often (in milliseconds) the progress of a file loading in the background is checked
+LOAD_CHECK_INTERVAL = 100
+# How often (in milliseconds) graphs being written in the background are checked
+FIGURE_CHECK_INTERVAL = 100
+# The copy of plotly.js shared by the graphs in a directory
+PLOTLY_JS = 'plotly.min.js'
+# Profiling options, and whether each one is on and traces memory (see energy_profile.py)
+PROFILING_MODES = OrderedDict([('Profiling off', (False, False)), ('Time stages', (True, False)),
+                               ('Time stages and memory', (True, True))])
 
 def round_1sf(number):
     return round(number, -int(math.floor(math.log10(number))))
 
+# True if the string only contains digits and decimal points
 def is_num(string):
-    for i in range(len(string)):
-        if not (string[i:i+1].isnumeric() or string[i:i+1] == "."):
-            return False
-    return True
-
-
-def merge(list1, list2):
-    i1 = 0
-    i2 = 0
-    output = []
-    while i1 < len(list1) and i2 < len(list2):
-        if list1[i1] < list2[i2]:
-            output.append(list1[i1])
-            i1 += 1
+    digits = string.replace(".", "")
+    return digits == "" or digits.isnumeric()
+
+
+'''
+Builds a plotly figure and writes it out as an HTML file, on one of the FigureRenderer's worker
+threads (see energy_figures.py). Each trace is passed in unbuilt (see make_trace), so plotly checks
+its values on the worker thread too. The graph loads plotly.js from its directory (see
+write_plotly_js), rather than a copy being put into each file. Building the figure and writing the
+HTML are timed with 'profiler'.
+'''
+def write_figure(traces, layout, profiler, file):
+    with profiler.span('figure'):
+        fig = go.Figure(data=[trace() for trace in traces], layout=layout)
+    with profiler.span('html'):
+        plotly.offline.plot(fig, filename=file, auto_open=False, include_plotlyjs=PLOTLY_JS)
+
+
+'''
+Writes plotly.js into a graph directory, before any graph is written there (see FigureRenderer).
+It is written to a temporary file and then renamed, so a graph opened while it is being written
+never loads half of it.
+'''
+def write_plotly_js(directory):
+    target = path.join(directory, PLOTLY_JS)
+    temporary = target + '.' + str(os.getpid()) + '.tmp'
+    with open(temporary, 'w', encoding='utf-8') as output:
+        output.write(plotly.offline.get_plotlyjs())
+    os.replace(temporary, target)
+
+
+'''
+DataPreview shows the loaded data in a text box a page at a time. Rather than writing every row of
+the file into the box (which takes a long time for big files, and keeps the whole file in the widget
+as text), only the rows which fit in the box are formatted, straight from the dataset's arrays,
+each time the view is moved. The scroll bar, mouse wheel, page buttons and 'Go to date' box all
+just change which row is shown first.
+'''
+class DataPreview:
+
+    def __init__(self, parent, width, height, on_error):
+        self.height = height
+        self.on_error = on_error
+        self.dataset = None
+        self.labels = []
+        self.first = 0
+
+        self.frame = tk.Frame(parent)
+        self.text = tk.Text(self.frame, width=width, height=height, wrap=tk.NONE)
+        self.scrollbar = tk.Scrollbar(self.frame, command=self.scroll)
+        self.text.bind('<MouseWheel>', lambda event: self.move_to(self.first - int(event.delta / 40)))
+        self.text.bind('<Button-4>', lambda event: self.move_to(self.first - 3))
+        self.text.bind('<Button-5>', lambda event: self.move_to(self.first + 3))
+        self.text.pack(side=tk.LEFT)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+
+        self.controls = tk.Frame(parent, background='#c6e2ff')
+        tk.Button(self.controls, text='|<', command=lambda: self.move_to(0)).pack(side=tk.LEFT)
+        tk.Button(self.controls, text='<', command=lambda: self.move_to(self.first - self.page_size())).pack(side=tk.LEFT)
+        tk.Button(self.controls, text='>', command=lambda: self.move_to(self.first + self.page_size())).pack(side=tk.LEFT)
+        tk.Button(self.controls, text='>|', command=lambda: self.move_to(len(self.dataset))).pack(side=tk.LEFT)
+        self.position_label = tk.Label(self.controls, text='', background='#c6e2ff')
+        self.position_label.pack(side=tk.LEFT, padx=10)
+        self.jump_date = StringVar(parent)
+        tk.Button(self.controls, text='Go to date', command=self.jump).pack(side=tk.RIGHT)
+        tk.Entry(self.controls, textvariable=self.jump_date, width=12).pack(side=tk.RIGHT)
+        tk.Label(self.controls, text='yyyy/mm/dd:', background='#c6e2ff').pack(side=tk.RIGHT)
+
+    def pack(self):
+        self.frame.pack()
+        self.controls.pack(fill=tk.X, padx=60)
+
+    # The first line of the box is used for the column headings
+    def page_size(self):
+        return self.height - 1
+
+    def show(self, dataset, labels):
+        self.dataset = dataset
+        self.labels = labels
+        self.first = 0
+        self.render()
+
+    def clear(self):
+        self.dataset = None
+        self.text.delete(1.0, tk.END)
+        self.position_label.configure(text='')
+
+    def move_to(self, first):
+        if self.dataset is None:
+            return
+        self.first = max(0, min(first, len(self.dataset) - self.page_size()))
+        self.render()
+
+    def render(self):
+        rows = len(self.dataset)
+        last = min(self.first + self.page_size(), rows)
+        lines = ["Date      " + "".join("{:>12}".format(label) for label in self.labels)]
+        columns = list(self.dataset.columns.values())
+        for p in range(self.first, last):
+            lines.append("{:%Y/%m/%d}".format(self.dataset.date_at(p)) + "".join("{:12.5f}".format(c[p]) for c in columns))
+        self.text.delete(1.0, tk.END)
+        self.text.insert(tk.INSERT, "\n".join(lines))
+        if rows == 0:
+            self.scrollbar.set(0, 1)
+            self.position_label.configure(text='No rows loaded')
         else:
-            output.append(list2[i2])
-            i2 += 1
-    while i1 < len(list1):
-        output.append(list1[i1])
-        i1 += 1
-    while i2 < len(list2):
-        output.append(list2[i2])
-        i2 += 1
-    return output
-
-def merge_sort(data):
-    if len(data) == 1:
-        return data
-    list1 = data[0:int(len(data)/2)]
-    list2 = data[int(len(data)/2):(len(data))]
-    return merge(merge_sort(list1), merge_sort(list2))
-
-def mean(data):
-    total = 0
-    for i in data:
-        total += i
-    return total / len(data)
-
-def quartiles(data):
-    data = merge_sort(data)
-    size = len(data)
-    indices = [(size-3)/4, (size-1)/2, (3*size-1)/4]
-    output = []
-    for i in indices:
-        lower = int(i)
-        output.append(data[lower] + (i-lower) * (data[lower + 1] - data[lower]))
-    return output
-
-def std_dev(data):
-    avg = mean(data)
-    total = 0
-    for i in data:
-        total += math.pow(i - avg, 2)
-    return math.sqrt(total / len(data))
-
-def skew(data):
-    n = len(data)
-    if n<=2:
-        return 0
-    avg = mean(data)
-    std = std_dev(data)
-    total = 0
-    for i in data:
-        total += math.pow((i - avg) / std, 3)
-    return total * n / (n - 1) / (n - 2)
-
-def kurtosis(data):
-    n = len(data)
-    if n<=3:
-        return 0
-    avg = mean(data)
-    std = std_dev(data)
-    total = 0
-    for i in data:
-        total += math.pow((i-avg)/std, 4)
-    total *= n*(n+1)/(n-1)/(n-2)/(n-3)
-    total -= 3*(n-1)*(n-1)/(n-2)/(n-3)
-    return total
+            self.scrollbar.set(self.first / rows, last / rows)
+            self.position_label.configure(text='Rows ' + str(self.first + 1) + '-' + str(last) + ' of ' + str(rows))
+
+    # Called by the scroll bar, either with ('moveto', fraction) or ('scroll', count, 'units'/'pages')
+    def scroll(self, *args):
+        if self.dataset is None:
+            return
+        if args[0] == 'moveto':
+            self.move_to(int(float(args[1]) * len(self.dataset)))
+        elif args[0] == 'scroll':
+            step = self.page_size() if args[2] == 'pages' else 1
+            self.move_to(self.first + int(args[1]) * step)
+
+    def jump(self):
+        if self.dataset is None:
+            return
+        try:
+            date = datetime.datetime.strptime(self.jump_date.get().strip(), '%Y/%m/%d').date()
+        except ValueError:
+            self.on_error("Dates to go to must be entered as yyyy/mm/dd!")
+            return
+        self.move_to(self.dataset.find(date))
+
+
+'''
+MonitorData holds the loaded data and everything worked out from it, without any widgets, and
+EnergyMonitor is a MonitorData with the widgets added. A file is loaded by reading it into a new
+MonitorData (see EnergyMonitor.load_file), which can be done on a background thread while the
+window carries on showing the data already loaded. Once the new data is ready it replaces the old
+all at once (see adopt), so the window never shows half loaded data.
+'''
+class MonitorData:
+
+    # The fields which are replaced when new data is adopted
+    FIELDS = ('dataset', 'monthly_dataset', 'cost_dataset', 'monthly_cost_dataset', 'cost_pence', 'data_container',
+              'monthly_data', 'annual_costs', 'monthly_costs', 'rollups', 'cost_rollups', 'ranges',
+              'cost_ranges', 'supplier_data', 'metrics',
+              'metrics_cache', 'loaded_ids', 'loaded_fuels', 'loaded_ids_sup', 'tail', 'validator')
+
+    def __init__(self, profiler=None):
+        '''
+        The loaded usage data is held in EnergyDataset objects (see energy_dataset.py), which store
+        one sorted date index and one array of values per house or fuel. The daily and monthly
+        usage and costs each have their own dataset. The data_container, monthly_data, annual_costs
+        and monthly_costs fields are read-only views of these, which can still be looked up by date
+        like a dictionary, e.g. self.data_container[date][house].
+        The remaining structures are a special Python type called OrderedDict. In a normal Python
+        dict, the keys accessed from this structure can be in any order, however an OrderedDict
+        remembers the order in which keys are added. These structures can be accessed from anywhere
+        within the class, similar to global variables, but without the need to declare them 'global'.
+        '''
+        self.dataset = EnergyDataset()
+        self.monthly_dataset = EnergyDataset()
+        self.cost_dataset = EnergyDataset()
+        self.monthly_cost_dataset = EnergyDataset()
+        # Daily costs in whole pence, which are totalled for the monthly (and other) cost graphs
+        self.cost_pence = EnergyDataset()
+        self.data_container = self.dataset.view()
+        self.monthly_data = self.monthly_dataset.view()
+        self.annual_costs = self.cost_dataset.view()
+        self.monthly_costs = self.monthly_cost_dataset.view()
+        # Weekly, monthly, quarterly and yearly totals are worked out from the daily data the first
+        # time they are needed, and kept until the data changes (see energy_rollup.py).
+        self.rollups = RollupCache(self.dataset, 7)
+        self.cost_rollups = RollupCache(self.cost_pence, divisor=100)
+        # Running totals and sparse tables of each column, for the totals, metrics and extremes of
+        # any date range (see energy_ranges.py)
+        self.ranges = RangeIndex(self.dataset)
+        self.cost_ranges = RangeIndex(self.cost_dataset)
+        self.supplier_data = OrderedDict()
+        self.metrics = OrderedDict()
+        # Metrics for each house (or fuel) and date range shown so far, kept until the data changes
+        self.metrics_cache = MetricsCache(self.dataset, self.rollups, self.ranges)
+        self.loaded_ids = []
+        self.loaded_fuels = []
+        self.loaded_ids_sup = []
+        # Reads rows added to the end of the loaded usage file (see refresh_file)
+        self.tail = None
+        # Problems found in the loaded usage file, such as gaps in the dates (see energy_validation.py)
+        self.validator = Validator()
+        self.profiler = Profiler() if profiler is None else profiler
+
+    '''
+    Returns a new MonitorData to load a file into. A supplier file only replaces the supplier data
+    and costs, so the new data starts with this data's usage. A usage file replaces everything
+    but the supplier data.
+    '''
+    def staging(self, suppliers):
+        staged = MonitorData(self.profiler)
+        if suppliers:
+            for name in ('dataset', 'monthly_dataset', 'data_container', 'monthly_data', 'rollups', 'ranges', 'metrics',
+                         'metrics_cache', 'loaded_ids', 'loaded_fuels', 'tail', 'validator'):
+                setattr(staged, name, getattr(self, name))
+            staged.loaded_ids_sup = list(self.loaded_ids_sup)
+        else:
+            staged.supplier_data = self.supplier_data
+            staged.loaded_ids_sup = self.loaded_ids_sup
+        return staged
+
+    # Replaces this data with 'other' all at once
+    def adopt(self, other):
+        # Old usage data is cleared, so the cache file it was mapped from is closed straight away
+        if other.dataset is not self.dataset:
+            self.dataset.clear()
+        for name in self.FIELDS:
+            setattr(self, name, getattr(other, name))
+
+    '''
+    Loads a file, then works out its monthly totals, metrics and costs. 'kind' is 'single',
+    'multiple', 'houses' (a folder of single house files) or 'suppliers', and 'name' is the house
+    id or fuel (see EnergyMonitor.load_file). 'select' picks the houses to load from a multiple
+    house file or folder (see select_columns). 'progress', if given, is called with a message after
+    each chunk of a usage file (or each file of a folder) is read, and 'check', if
+    given, is called between chunks and stages, and can stop the load by raising an exception.
+    Problems with the file are raised as a ValueError. Returns this MonitorData.
+    '''
+    def load(self, file, kind, name, select=None, progress=None, check=None):
+        if check is None:
+            check = lambda: None
+
+        def on_chunk(loader, start, end):
+            check()
+            if progress is not None:
+                progress("Loaded " + str(loader.rows) + " rows (" + "{:%Y/%m/%d}".format(loader.first_date()) +
+                         " to " + "{:%Y/%m/%d}".format(loader.last_date()) + "), " +
+                         str(int(100 * loader.bytes_read / max(loader.total_bytes, 1))) + "% of file read")
+
+        read_files = []
+
+        def on_file(house_file, error):
+            check()
+            read_files.append(house_file)
+            if progress is not None:
+                progress("Read " + str(len(read_files)) + " house files, the last was " + basename(house_file))
+
+        if kind == 'single':
+            self.read_single_file(file, name, on_chunk)
+        elif kind == 'multiple':
+            self.read_multiple_file(file, name, select, on_chunk)
+        elif kind == 'houses':
+            self.read_house_folder(file, name, select, on_file)
+        else:
+            self.read_suppliers(file)
+        check()
+        if kind != 'suppliers':
+            self.generate_monthly_data()
+            check()
+            if len(self.loaded_fuels) == 1:
+                self.calculate_metrics()
+            check()
+        # Only calculate costs for houses with both supplier and usage data
+        ids = self.cost_ids()
+        if len(ids) != 0:
+            self.calculate_costs(ids)
+        return self
+
+    # The file is checked and parsed by energy_costs.py
+    def read_suppliers(self, file):
+        with self.profiler.span('parse'):
+            supplier_data = read_supplier_file(file)
+        self.supplier_data.update(supplier_data)
+        self.loaded_ids_sup.extend(supplier_data.keys())
+
+    '''
+    This method is a specific case from the above load method, which was capable of checking for different
+    types of files. This method is specifically for dealing with one house files, which contain 
+    both gas and electricity data for one house. The output of the method is to populate the dataset
+    with the relevant data, once it has been validated. 
+    '''
+    def read_single_file(self, file, house_id, on_chunk=None):
+
+        '''
+        Here we hand the user's file to a CsvLoader (see energy_loader.py). Rather than reading one
+        row at a time, it reads a chunk of rows, converts each column of the chunk to numbers in
+        one go, and checks that every row has the right number of values and is in date order.
+        After each chunk, on_chunk is called, so the progress so far can be shown.
+        '''
+        def check_header(header):
+            # Since this method only deals with single house files, we can check for these values
+            if len(header) != 3 or header[0].lower() != 'date' or header[1].lower() != FuelType(1).name or header[2].lower() != FuelType(2).name:
+                raise ValueError('File is not in correct format. First column must be electricity, second must be gas.')
+
+        # The columns are given in the same order as the file, so electricity comes first, then gas.
+        self.read_usage_file(file, check_header, [FuelType.electricity, FuelType.gas], on_chunk=on_chunk)
+
+        # Since we have only loaded one file, set the id directly
+        self.loaded_ids.append(house_id)
+        self.loaded_fuels.extend([FuelType.electricity, FuelType.gas])
+
+    def read_multiple_file(self, file, fuel_id, select=None, on_chunk=None):
+        def check_header(header):
+            if header[0].lower() != 'date':
+                raise ValueError('File is not in correct format.')
+
+        # Each house gets its own column. Only the houses picked in the house filter box are loaded.
+        self.read_usage_file(file, check_header, select=select, on_chunk=on_chunk)
+        self.loaded_ids.extend(self.dataset.keys())
+        self.loaded_fuels.append(fuel_id)
+
+    '''
+    Loads one fuel from every {house-id}_both_daily.csv file in a folder (or matching a glob
+    pattern), as if they were one multiple house file, with a column for each house. The files are
+    read in worker processes by energy_bulk.py. Files which can't be loaded, and days which aren't
+    in every file, are kept as warnings in self.validator rather than stopping the load.
+    '''
+    @profiled('parse')
+    def read_house_folder(self, source, fuel_id, select=None, on_file=None):
+        self.tail = None
+        self.validator = Validator()
+        try:
+            (errors, dropped) = load_houses(source, self.dataset, fuel_id, on_file=on_file, select=select)
+        except ValueError:
+            self.dataset.clear()
+            raise
+        for file, message in errors.items():
+            self.validator.add(None, None, 'file', basename(file) + ": " + message)
+        if dropped > 0:
+            self.validator.add(None, None, 'dates', str(dropped) + " days left out, as not every house has them")
+        self.loaded_ids.extend(self.dataset.keys())
+        self.loaded_fuels.append(fuel_id)
+
+    '''
+    Loads a usage file into the dataset. If the file has not changed since it was last loaded, the
+    parsed copy kept by energy_cache.py is used instead of reading the CSV again. Every problem
+    found in the file is kept in self.validator, and if the file can't be loaded, a ValueError
+    listing the first few is raised. Returns the file's header row.
+    '''
+    @profiled('parse')
+    def read_usage_file(self, file, check_header, keys=None, select=None, on_chunk=None):
+        self.tail = None
+        self.validator = Validator()
+        try:
+            header = load_cached(file, self.dataset, check_header, keys, on_chunk=on_chunk, select=select,
+                                 validator=self.validator)
+        except ValidationError as error:
+            self.dataset.clear()
+            errors = [problem.message for problem in error.problems if problem.is_error()]
+            raise ValueError("; ".join(errors[:3]) + (" and " + str(len(errors) - 3) + " more errors" if len(errors) > 3 else ""))
+        except ValueError:
+            self.dataset.clear()
+            raise
+        selected = range(1, len(header)) if select is None else select_columns(header, select)
+        self.tail = TailReader(file, header, selected, self.dataset, self.validator)
+        return header
+
+    # Returns the houses which have both supplier and usage data
+    def cost_ids(self):
+        return list(set(self.loaded_ids).intersection(self.loaded_ids_sup))
+
+    '''
+    Works out the daily and monthly costs of the loaded usage with the cost engine in energy_costs.py.
+    The supplier rates are looked up once for each house (or fuel, for single house files), and
+    every column is then costed in one go. Costs are added up in whole pence and shown in pounds.
+    If 'first' is given, only the rows from that position on are new, and only they are costed.
+    '''
+    @profiled('costs')
+    def calculate_costs(self, ids, first=0):
+        if len(self.loaded_fuels) > 1 and len(ids) == 1:
+            keys = [FuelType.electricity, FuelType.gas]
+            rates = array('d')
+            standing = array('d')
+            for fuel in keys:
+                fuel_rates = supplier_rates(self.supplier_data, ids, fuel.name.capitalize())
+                rates.extend(fuel_rates[0])
+                standing.extend(fuel_rates[1])
+        else:
+            keys = ids
+            rates, standing = supplier_rates(self.supplier_data, ids, FuelType[self.loaded_fuels[0]].name.capitalize())
+        if self.cost_pence.keys() != keys or len(self.cost_pence) != first:
+            first = 0
+        pence = cost_columns([memoryview(self.dataset.column(key))[first:] for key in keys], rates, standing)
+        # The costs share the usage data's dates
+        ordinals = array('l', self.dataset.ordinals[first:])
+        if first == 0:
+            self.cost_pence.set_data(keys, ordinals, pence)
+            self.cost_dataset.set_data(keys, array('l', ordinals), [to_pounds(column) for column in pence])
+        else:
+            self.cost_pence.extend(ordinals, pence)
+            self.cost_dataset.extend(ordinals, [to_pounds(column) for column in pence])
+        self.copy_dataset(self.cost_rollups.get('monthly').complete(), self.monthly_cost_dataset)
+
+
+    # Monthly totals only include complete months, so a month cut off at either end of the file
+    # doesn't show up as a month of very low usage.
+    @profiled('monthly totals')
+    def generate_monthly_data(self):
+        self.copy_dataset(self.rollups.get('monthly').complete(), self.monthly_dataset)
+
+    # Points 'target' at the same arrays as 'source', so that the views of target show source's data
+    def copy_dataset(self, source, target):
+        target.set_data(source.keys(), source.ordinals, list(source.columns.values()))
+
+    # Returns the daily usage or cost data, or its totals over complete weeks, months, quarters or years
+    def scope_dataset(self, costs, scope):
+        if scope == 'daily':
+            return self.cost_dataset if costs else self.dataset
+        rollups = self.cost_rollups if costs else self.rollups
+        return rollups.get(scope).complete()
+
+    '''
+    Works out the metrics over the whole of the data. The metrics themselves are worked out in
+    energy_metrics.py, so they can be shared with energy_report.py, and are kept in the metrics
+    cache, so showing them in the metrics panel doesn't work them out again.
+    '''
+    @profiled('metrics')
+    def calculate_metrics(self):
+        if len(self.loaded_fuels) == 1:
+            self.metrics = self.metrics_cache.metrics(self.loaded_ids, True)
+        else:
+            self.metrics = self.metrics_cache.metrics(self.loaded_fuels, False)
+
 
 '''
 This file is written as a class, meaning it is defined using the 'class' keyword. Practically, 
@@ -119,7 +501,7 @@ when called inside other methods in the class.
 
 
 # noinspection PyTypeChecker,PyUnusedLocal
-class EnergyMonitor:
+class EnergyMonitor(MonitorData):
 
     """
     The init method is called when a class is instantiated. In this case the init method
@@ -129,23 +511,15 @@ class EnergyMonitor:
     def __init__(self, parent):
         self.parent = parent
 
-        '''
-        These two data structures are a special Python type called OrderedDict. In a normal Python
-        dict, the keys accessed from this structure can be in any order, however an OrderedDict
-        remembers the order in which keys are added. This will be important later on, since these
-        two structures may hold keys that are dates in order, meaning that the order needs to be
-        maintained. These structures can be accessed from anywhere within the class, similar to
-        global variables, but without the need to declare them 'global'.
-        '''
-        self.data_container = OrderedDict()
-        self.monthly_data = OrderedDict()
-        self.supplier_data = OrderedDict()
-        self.metrics = OrderedDict()
-        self.annual_costs = OrderedDict()
-        self.monthly_costs = OrderedDict()
-        self.loaded_ids = []
-        self.loaded_fuels = []
-        self.loaded_ids_sup = []
+        MonitorData.__init__(self)
+        # The file being loaded in the background, if there is one
+        self.load_task = None
+        self.poll_job = None
+        # Times the stages of loading files and plotting graphs, when switched on
+        self.profiler.on_finish = self.show_profile
+        # Writes graphs out as HTML in the background, then they are opened once they are ready
+        self.figures = FigureRenderer(write_figure, profiler=self.profiler, prepare=write_plotly_js)
+        self.figure_job = None
 
         self.welcome_label = tk.Label(self.parent, text='Welcome to the Energy Monitor!', font=('Calibri', 32))
         self.welcome_label.configure(background='#c6e2ff')
@@ -156,11 +530,42 @@ class EnergyMonitor:
         self.message_label.configure(background='#c6e2ff')
         self.message_label.pack(pady=5)
 
-        self.btn_file = tk.Button(self.parent, text="Load file", command=self.load_file)
-        self.btn_file.pack(pady=5)
-
-        self.scrolled_text = tk.scrolledtext.ScrolledText(self.parent, width=110, height=10)
-        self.scrolled_text.pack()
+        # For multiple house files, the houses to load can be picked by id, glob pattern or regular
+        # expression, separated by commas. Leaving the box empty loads every house in the file.
+        self.file_frame = tk.Frame(self.parent, background='#c6e2ff')
+        self.btn_file = tk.Button(self.file_frame, text="Load file", command=self.load_file)
+        self.btn_file.pack(side=tk.LEFT)
+        # A folder of single house files can be loaded as if it were one multiple house file, for one fuel
+        self.btn_folder = tk.Button(self.file_frame, text="Load folder", command=self.load_folder)
+        self.btn_folder.pack(side=tk.LEFT, padx=5)
+        self.folder_fuel = StringVar(self.parent)
+        self.folder_fuel.set(FuelType.electricity.name)
+        self.folder_fuel_menu = OptionMenu(self.file_frame, self.folder_fuel, FuelType.electricity.name, FuelType.gas.name)
+        self.folder_fuel_menu.pack(side=tk.LEFT)
+        # Files picked with 'Load file' load in the background, and can be cancelled while they load
+        self.btn_cancel = tk.Button(self.file_frame, text="Cancel", command=self.cancel_load, state=tk.DISABLED)
+        self.btn_cancel.pack(side=tk.LEFT, padx=5)
+        self.house_filter_label = tk.Label(self.file_frame, text='Houses to load (e.g. house_a, house_*, re:house_[ab]):',
+                                           background='#c6e2ff')
+        self.house_filter_label.pack(side=tk.LEFT, padx=5)
+        self.house_filter = StringVar(self.parent)
+        self.house_filter_text = tk.Entry(self.file_frame, textvariable=self.house_filter, width=30)
+        self.house_filter_text.pack(side=tk.LEFT)
+        # Usage files which have rows added to them (e.g. daily meter exports) can be refreshed,
+        # or followed so new rows are picked up as they are written.
+        self.btn_refresh = tk.Button(self.file_frame, text="Refresh", command=self.refresh_file)
+        self.btn_refresh.pack(side=tk.LEFT, padx=5)
+        self.follow = IntVar(self.parent)
+        self.follow_check = tk.Checkbutton(self.file_frame, text='Follow file', variable=self.follow,
+                                           command=self.poll_file, background='#c6e2ff')
+        self.follow_check.pack(side=tk.LEFT)
+        self.file_frame.pack(pady=5)
+
+        # The preview shows the loaded usage data a page at a time. Supplier files are written
+        # straight into its text box (scrolled_text), since they only have a few rows.
+        self.preview = DataPreview(self.parent, width=110, height=9, on_error=self.display_error)
+        self.preview.pack()
+        self.scrolled_text = self.preview.text
 
         self.metric_text = tk.scrolledtext.ScrolledText(self.parent, width = 110, height = 7)
 
@@ -171,7 +576,18 @@ class EnergyMonitor:
         self.chart_menu = OptionMenu(self.parent, self.chart_type, 'bar', 'scatter')
         self.chart_scope = StringVar(self.parent)
         self.chart_scope.set('daily')
-        self.scope_menu = OptionMenu(self.parent, self.chart_scope, 'daily', 'monthly')
+        self.scope_menu = OptionMenu(self.parent, self.chart_scope, 'daily', *RESOLUTIONS)
+        self.average_window = StringVar(self.parent)
+        self.average_window.set('30 day average')
+        self.average_menu = OptionMenu(self.parent, self.average_window, *list(AVERAGE_WINDOWS.keys()))
+        # Long traces can be cut down to a number of points before plotting (see energy_decimate.py)
+        self.decimation = StringVar(self.parent)
+        self.decimation.set('LTTB')
+        self.decimation_menu = OptionMenu(self.parent, self.decimation, *list(DECIMATION_METHODS.keys()))
+        self.point_target = StringVar(self.parent)
+        self.point_target.set('2,000 points')
+        self.point_target_menu = OptionMenu(self.parent, self.point_target, *list(POINT_TARGETS.keys()))
+        self.decimated = False
         self.house_selected = StringVar(self.parent)
         self.house_selected.set('one')
         self.metric_label = tk.Label(self.parent, text='Select a data set to view metrics for:', font=('Calibri', 10), wraplength=540)
@@ -184,10 +600,14 @@ class EnergyMonitor:
         self.costs_menu.forget()
         self.btn_distr_graph = tk.Button(self.parent, text='Distribution Graph',
                                           command=self.distribution_graph_multi)
-        self.graph_size = StringVar(self.parent)
-        self.graph_size.set('10,000 points')
-        self.graph_size_menu = OptionMenu(self.parent, self.graph_size, '1,000 points', '10,000 points', '50,000 points', '100,000 points', '200,000 points', '500,000 points', '1,000,000 points')
-        self.graph_size_menu.forget()
+        self.bin_count = StringVar(self.parent)
+        self.bin_count.set('100 bins')
+        self.bin_menu = OptionMenu(self.parent, self.bin_count, *list(BIN_COUNTS.keys()))
+        self.bin_menu.forget()
+        self.density_mode = StringVar(self.parent)
+        self.density_mode.set('Bins only')
+        self.density_menu = OptionMenu(self.parent, self.density_mode, 'Bins only', 'Bins and density curve')
+        self.density_menu.forget()
         self.btn_distr_graph.forget()
         self.btn_pie = tk.Button(self.parent, text='Pie Chart',
                                           command=self.pie_chart)
@@ -211,6 +631,18 @@ class EnergyMonitor:
         self.end_day_text = tk.Entry(self.parent, textvariable=self.end_day)
         self.date_label = tk.Label(self.parent, text="Enter start and end dates for graphs(dd/mm/yyyy):")
 
+        # The time taken by the last operation is shown under the status message while profiling is on
+        self.profile_label = tk.Label(self.parent, text="", font=('Calibri', 8), background='#c6e2ff')
+        self.profiling = StringVar(self.parent)
+        self.profiling.set('Profiling off')
+        self.profiling_menu = OptionMenu(self.parent, self.profiling, *list(PROFILING_MODES.keys()),
+                                         command=self.set_profiling)
+        self.profiling_menu.place(x=720, y=700, width=160, height=30)
+        self.btn_export_profile = tk.Button(self.parent, text='Export profile', command=self.export_profile)
+        self.btn_export_profile.place(x=890, y=700, width=90, height=30)
+        self.btn_figure_dir = tk.Button(self.parent, text='Graph folder', command=self.pick_figure_dir)
+        self.btn_figure_dir.place(x=890, y=665, width=90, height=30)
+
 # Displays an error message in the GUI to notify the user.
     def display_error(self, error_message):
         self.status_label.place_forget()
@@ -227,6 +659,7 @@ class EnergyMonitor:
         self.status_label.place(x=100, y=700)
 
 # Sets the text to be displayed in the scroll window
+    @profiled('scroll_text')
     def scroll_text(self, scrtext):
         self.scrolled_text.insert(tk.INSERT, scrtext)
         self.scrolled_text.pack()
@@ -244,13 +677,21 @@ class EnergyMonitor:
     houses. This means that the value stored into the 'data_container' dictionary for each date
     will most likely be another dictionary. This will store, for each date, the usage data 
     for every house in the file, or the type of fuel (if only loading a 1ouse file)
+    The file is read into a new MonitorData, which only replaces the data shown once it has all
+    been worked out (see finish_load). Files picked with the dialog are loaded on a background
+    thread, so the window keeps responding and the load can be cancelled; files passed in by
+    name (e.g. from tests and scripts) are loaded before this method returns, unless
+    background=True is given.
     '''
 
     # noinspection PyTypeChecker
-    def load_file(self, file=None):
+    def load_file(self, file=None, background=False):
         if file is None:
             file = filedialog.askopenfilename(initialdir=path.dirname(__file__))
-        elif not path.isfile(file):
+            if not file:
+                return # The dialog was closed without picking a file
+            background = True
+        elif not path.isfile(file) and not path.isdir(file):
             # Here we are raising an Error. Within Python this means that the application
             # cannot recover the state of the application, and it should not continue processing.
             # Since this application runs in a HUI loop, the program will not actually close,
@@ -273,22 +714,79 @@ class EnergyMonitor:
         '''
         Here we are checking whether or not the file is a single or multiple house file. 
         '''
-        data = {}
-        if single_match is not None:
-            self.process_single_file(file, single_match.group(1))
+        select = None
+        if path.isdir(file):
+            (kind, name) = ('houses', self.folder_fuel.get())
+            select = self.house_selection()
+        elif single_match is not None:
+            (kind, name) = ('single', single_match.group(1))
         elif multiple_match is not None:
-            self.process_multiple_file(file, FuelType[multiple_match.group(1)].name)
+            (kind, name) = ('multiple', FuelType[multiple_match.group(1)].name)
+            select = self.house_selection()
         elif supplier_match is not None:
-            self.process_supplier_file(file)
+            (kind, name) = ('suppliers', None)
         else:
             self.display_error("File format is not correct, must be one of {fuel-type}_daily.csv, {house-id}_both_daily.csv or suppliers.csv")
-        if single_match is not None or multiple_match is not None:
-            self.generate_monthly_data()
+        staged = self.staging(kind == 'suppliers')
+        if background:
+            self.start_load(staged, file, kind, name, select)
+            return
+        with self.profiler.span('load_file'):
+            try:
+                staged.load(file, kind, name, select, self.show_progress)
+            except ValueError as error:
+                self.display_error(str(error))
+            self.finish_load(staged, file, kind, name)
+
+    # Picks a folder of {house-id}_both_daily.csv files, and loads the fuel chosen next to the button from every house in it
+    def load_folder(self):
+        folder = filedialog.askdirectory(initialdir=path.dirname(__file__))
+        if not folder:
+            return
+        self.load_file(folder, background=True)
+
+    '''
+    Shows newly loaded data. The new data replaces the old all at once, then the preview, status
+    message, metrics and graph controls are updated to match it. This always runs on the main
+    thread, even when the file was loaded in the background.
+    '''
+    def finish_load(self, staged, file, kind, name):
+        self.adopt(staged)
+        self.preview.clear()
+        if kind == 'suppliers':
+            # Supplier files are shown as they are in the text box
+            with open(file, 'r') as file_contents:
+                for count, row in enumerate(csv.reader(file_contents)):
+                    self.scroll_text(("\n" if count > 0 else "") + "".join("{:22.20}".format(cell) for cell in row))
+        elif kind == 'single':
+            with self.profiler.span('preview'):
+                self.preview.show(self.dataset, ['Electricity', 'Gas'])
+            self.display_status("House loaded: " + name + ". Fuels loaded: " + FuelType.electricity.name + ", " + FuelType.gas.name + "." +
+                                self.problem_note())
+            self.btn_pie.place_forget()
+            self.metric_label.place_forget()
+            self.dropdown.place_forget()
+            self.metric_text.place_forget()
+            self.bin_menu.place_forget()
+            self.density_menu.place_forget()
+            self.btn_distr_graph.place_forget()
+            self.total_menu.place(x=720, y=400, width=150, height=30)
+        else:
+            houses = self.dataset.keys()
+            with self.profiler.span('preview'):
+                self.preview.show(self.dataset, houses)
+            self.display_status("Houses loaded: " + ", ".join(houses) + ". Fuel loaded: %s." % name + self.problem_note())
+            self.btn_pie.place(x=300, y=430, width=80, heigh=30)
+            self.total_menu.place_forget()
+        if kind != 'suppliers':
             self.btn_graph.place(x=300, y=400, width=80, height=30)
             self.chart_menu.place(x=400, y=400, width=80, height=30)
             self.scope_menu.place(x=500, y=400, width=80, height=30)
-            start = list(self.data_container.keys())[0]
-            end = list(self.data_container.keys())[len(list(self.data_container.keys())) - 1]
+            self.average_menu.place(x=400, y=430, width=120, height=30)
+            self.decimation_menu.place(x=530, y=430, width=90, height=30)
+            self.point_target_menu.place(x=630, y=430, width=110, height=30)
+            start = self.dataset.first_date()
+            end = self.dataset.last_date()
             self.start_year.set(start.year)
             self.start_month.set(start.month)
             self.start_day.set(start.day)
@@ -304,20 +802,74 @@ class EnergyMonitor:
             self.end_month_text.place(x=490, y=330, width=20)
             self.end_day_text.place(x=470, y=330, width=20)
         if len(self.loaded_fuels) == 1:
-            self.generate_metrics()
-        intersection = list(set(self.loaded_ids).intersection(self.loaded_ids_sup)) # Only calculate costs for houses with both supplier and usage data
-        if len(intersection) != 0:
-            self.calculate_costs(intersection)
+            self.show_metrics_menu()
+        if len(self.cost_ids()) != 0:
             self.costs_menu.place(x=600, y=400, width=100, height=30)
         else:
             self.costs_menu.place_forget()
 
+    '''
+    Loads a file into 'staged' on a background thread. Its progress is shown in the status bar by
+    check_load, which hands the data over to finish_load once it is ready. Loading another file
+    cancels the one already loading. The load is timed on the background thread, and its timings
+    are shown once it has finished.
+    '''
+    def start_load(self, staged, file, kind, name, select):
+        if self.load_task is not None:
+            self.load_task.cancel()
+
+        def load(task):
+            with staged.profiler.span('load_file'):
+                return staged.load(file, kind, name, select, task.report, task.check)
+
+        task = BackgroundTask(load, 'load ' + basename(file))
+        self.load_task = task
+        self.btn_cancel.configure(state=tk.NORMAL)
+        self.display_status("Loading " + basename(file) + "...")
+        task.start()
+        self.parent.after(LOAD_CHECK_INTERVAL, self.check_load, task, file, kind, name)
+
+    # Shows the progress of a background load every LOAD_CHECK_INTERVAL milliseconds until it finishes
+    def check_load(self, task, file, kind, name):
+        for message, value in task.poll():
+            if task is not self.load_task:
+                continue # The load has been cancelled, or replaced by a newer one
+            if message == 'progress':
+                self.display_status(value)
+                continue
+            self.load_task = None
+            self.btn_cancel.configure(state=tk.DISABLED)
+            if message == 'done':
+                self.finish_load(value, file, kind, name)
+            elif not isinstance(value, Cancelled):
+                try:
+                    self.display_error(str(value) if isinstance(value, ValueError) else "Could not load file: " + str(value))
+                except ValueError:
+                    pass # The error is shown, and the data already loaded is kept
+        self.show_background_profiles()
+        if not task.finished:
+            self.parent.after(LOAD_CHECK_INTERVAL, self.check_load, task, file, kind, name)
+
+    # Stops the file being loaded in the background. The data already loaded stays as it was.
+    def cancel_load(self):
+        if self.load_task is None:
+            return
+        self.load_task.cancel()
+        self.load_task = None
+        self.btn_cancel.configure(state=tk.DISABLED)
+        self.display_status("Loading cancelled.")
+
+    # Shows the progress of a load which isn't in the background, while the window is waiting for it
+    def show_progress(self, message):
+        self.display_status(message)
+        self.parent.update_idletasks()
+
     def get_start(self):
         day = self.start_day.get()
         month = self.start_month.get()
         year = self.start_year.get()
         date = self.validate_date(day, month, year, "start")
-        if date < list(self.data_container.keys())[0]:
+        if date < self.dataset.first_date():
             self.display_error("Start date is before the start of the data set!")
         return date
 
@@ -326,7 +878,7 @@ class EnergyMonitor:
         month = self.end_month.get()
         year = self.end_year.get()
         date = self.validate_date(day, month, year, "end")
-        if date > list(self.data_container.keys())[len(list(self.data_container.keys()))-1]:
+        if date > self.dataset.last_date():
             self.display_error("End date is after the end of the data set!")
         if date < self.get_start():
             self.display_error("End date is before start date!")
@@ -348,282 +900,99 @@ class EnergyMonitor:
         return datetime.date(year, month, day)
 
 
-    def calculate_costs(self, ids):
-        self.annual_costs.clear()
-        self.monthly_costs.clear()
-        if len(self.loaded_fuels) > 1 and len(ids) == 1:
-            i = ids[0]
-            for d in list(self.data_container.keys()):
-                self.annual_costs[d] = {}
-                self.monthly_costs[d] = {}
-                base = self.supplier_data[i]['Electricity Standing Charge']
-                var = self.supplier_data[i]['Electricity Usage Rate']
-                self.annual_costs[d][FuelType.electricity] = round(self.data_container[d][FuelType.electricity] * var + base, 0) / 100
-                base = self.supplier_data[i]['Gas Standing Charge']
-                var = self.supplier_data[i]['Gas Usage Rate']
-                self.annual_costs[d][FuelType.gas] = round(self.data_container[d][FuelType.gas] * var + base, 0) / 100
-                monthstart = datetime.date(d.year, d.month, 1)
-                if d.day == 1:
-                    self.monthly_costs[monthstart][FuelType.electricity] = self.annual_costs[d][FuelType.electricity]
-                    self.monthly_costs[monthstart][FuelType.gas] = self.annual_costs[d][FuelType.gas]
-                else:
-                    self.monthly_costs[monthstart][FuelType.electricity] += self.annual_costs[d][FuelType.electricity]
-                    self.monthly_costs[monthstart][FuelType.gas] += self.annual_costs[d][FuelType.gas]
-        else:
-            for d in list(self.data_container.keys()):
-                self.annual_costs[d] = {}
-                self.monthly_costs[d] = {}
-                for i in ids:
-                    base = 0
-                    var = 0
-                    if self.loaded_fuels[0] == 'electricity':
-                        base = self.supplier_data[i]['Electricity Standing Charge']
-                        var = self.supplier_data[i]['Electricity Usage Rate']
-                    else:
-                        base = self.supplier_data[i]['Gas Standing Charge']
-                        var = self.supplier_data[i]['Gas Usage Rate']
-                    self.annual_costs[d][i] = round(self.data_container[d][i] * var + base, 0) / 100
-                    monthstart = datetime.date(d.year, d.month, 1)
-                    if d.day == 1:
-                        self.monthly_costs[monthstart][i] = self.annual_costs[d][i]
-                    else:
-                        self.monthly_costs[monthstart][i] += self.annual_costs[d][i]
-
-
-    def process_supplier_file(self, file):
-        self.scrolled_text.delete(1.0, tk.END)
-        self.supplier_data.clear()
-        with open(file, 'r') as file_contents:
-            reader = csv.reader(file_contents)
-            header = next(reader, None)
-            if header[0].lower() != "data type":
-                self.display_error("First heading should be 'Data Type'")
-            for h in header:
-                if h != "Data Type":
-                    self.supplier_data[h] = {}
-                    self.loaded_ids_sup.append(h)
-                self.scroll_text("{:22.20}".format(h))
-            count = 0
-            for row in reader:
-                count += 1
-                self.scroll_text("\n" + "{:22.20}".format(row[0]))
-                if len(row) - 1 != len(list(self.supplier_data.keys())):
-                    self.display_error("Row contains wrong number of values")
-                for i in range(0, len(list(self.supplier_data.keys()))):
-                    if count == 1:
-                        self.supplier_data[list(self.supplier_data.keys())[i]][row[0]] = row[i+1]
-                    else:
-                        if not is_num(row[i+1]):
-                            self.display_error("Data not numeric")
-                        self.supplier_data[list(self.supplier_data.keys())[i]][row[0]] = float(row[i+1])
-                    self.scroll_text("{:22.20}".format(row[i+1]))
-            if count != 5:
-                self.display_error("File should contain header plus 5 rows of data")
+    # Describes any warnings about the loaded file, to be added to the status message
+    def problem_note(self):
+        note = self.validator.summary()
+        return " " + note + "." if note != "" else ""
+
     '''
-    This method is a specific case from the above load method, which was capable of checking for different
-    types of files. This method is specifically for dealing with one house files, which contain 
-    both gas and electricity data for one house. The output of the method is to populate data_container
-    with the relevant data, once it has been validated. 
+    Loads any rows added to the end of the usage file since it was loaded (or last refreshed).
+    Only the new rows are read from the file, and the monthly totals and costs are only worked out
+    again for the months the new rows fall in. Returns the number of rows added.
     '''
-    def process_single_file(self, file, house_id):
-
-        '''
-        Since this is a GUI application, the user can click the 'Load File' button as many
-        times as they wish. So, when processing a new file, we need a way to clear out the data
-        from any previous files.
-        '''
-        self.data_container.clear()
-        self.loaded_ids.clear()
-        self.loaded_fuels.clear()
-        self.scrolled_text.delete(1.0, tk.END)
-
-        with open(file, 'r') as file_contents:
-            '''
-            Here we open the user's file, then use it to create a CSV Reader object, which will
-            be able to access rows in the file as if they were standard Python arrays. This 
-            reduces the complexity of parsing the file significantly, and also allows checking for 
-            invalid files, by easily checking the number of elements in each row, for example. 
-            '''
-            reader = csv.reader(file_contents)
-            header = next(reader, None)
-
-            # Since this method only deals with single house files, we can check for these values
-            # But - could we use the enum defined at the top of this file somehow?
-            if header[0].lower() != 'date' or header[1].lower() != FuelType(1).name or header[2].lower() != FuelType(2).name:
-                self.display_error('File is not in correct format. First column must be electricity, second must be gas.')
-
-            self.scroll_text("Date       Electricity         Gas\n")
-            for row in reader:
-
-                # This line creates a datetime object, which is a Python object containing
-                # a valid date. It allows us to make date-aware calculations, such as evaluating
-                # whether some dates are higher or lower than each other. It should also allow
-                # us to use date arithemtic, if we need to.
-                this_date = datetime.datetime.strptime(row[0], '%Y%m%d').date()
-
-                # Here, we are inserting data into the data_container structure for the current
-                # row. What this line is actually doing, using the '{}' notations, is creating
-                # a 3-level dictionary. The first level is the data_container dictionary,
-                # which uses a date as its key. The next level is a dictionary with a single key:
-                # the house_id. This might seem more complex than needed, could this code be simplified?
-                # What else would need to change? The 3rd level dictionary is the FuelType names.
-                # These are used so that the different fuel types can be easily fetched, given a
-                # date and a house_id.
-                self.data_container[this_date] = {FuelType.electricity: float(row[1]),
-                                                             FuelType.gas: float(row[2])}
-                self.scroll_text("{:%Y/%m/%d}".format(this_date) + "{:12.5f}".format(float(row[1]))
-                                                                 + "{:12.5f}".format(float(row[2])) + "\n")
-
-            # Since we have only loaded one file, set the id directly
-            self.loaded_ids.append(house_id)
-            self.loaded_fuels.extend([FuelType.electricity, FuelType.gas])
-            self.display_status("House loaded: " + house_id + ". Fuels loaded: " + FuelType.electricity.name + ", " + FuelType.gas.name + ".")
-            self.btn_pie.place_forget()
-            self.metric_label.place_forget()
-            self.dropdown.place_forget()
-            self.metric_text.place_forget()
-            self.graph_size_menu.place_forget()
-            self.btn_distr_graph.place_forget()
-            self.total_menu.place(x=720, y=400, width=150, height=30)
-
-    def process_multiple_file(self, file, fuel_id):
-        self.data_container.clear()
-        self.loaded_ids.clear()
-        self.loaded_fuels.clear()
-        self.scrolled_text.delete(1.0, tk.END)
-
-        with open(file, 'r') as file_contents:
-            reader = csv.reader(file_contents)
-            header = next(reader, None)
-
-            if header[0].lower() != 'date':
-                self.display_error('File is not in correct format.')
-
-            message = "Houses loaded: "
-            self.scroll_text("Date      ")
-            for i in range(1, len(header)):
-                self.loaded_ids.append(header[i])
-                if i > 1:
-                    message += ", "
-                message += header[i]
-                self.scroll_text("{:>12}".format(header[i]))
-            self.loaded_fuels.append(fuel_id)
-            self.scroll_text("\n")
-
-            for row in reader:
-                this_date = datetime.datetime.strptime(row[0], '%Y%m%d').date()
-                self.data_container[this_date] = {}
-                self.scroll_text("{:%Y/%m/%d}".format(this_date))
-                for i in range(1, len(header)): # The second index of the dictionary is the house
-                    self.data_container[this_date][header[i]] = float(row[i])
-                    self.scroll_text("{:12.5f}".format(float(row[i])))
-                self.scroll_text("\n")
-
-            self.display_status(message + ". Fuel loaded: %s." % fuel_id)
-            self.btn_pie.place(x=300, y=430, width=80, heigh=30)
-            self.total_menu.place_forget()
-
-    def generate_monthly_data(self):
-        self.monthly_data.clear()
-        month_total = {}
-        for date in list(self.data_container.keys()):
-            if len(self.loaded_ids) == 1:
-                for fuel in self.loaded_fuels:
-                    if date.day == 1:
-                        month_total[fuel] = self.data_container[date][fuel]
-                    else:
-                        month_total[fuel] = round(month_total[fuel] + self.data_container[date][fuel], 7)
-            else:
-                for house in self.loaded_ids:
-                    if date.day == 1:
-                        month_total[house] = self.data_container[date][house]
-                    else:
-                        month_total[house] = round(month_total[house] + self.data_container[date][house], 7)
-            if date.month != (date + datetime.timedelta(days=1)).month:  # Last day of month
-                self.monthly_data[datetime.date(date.year, date.month, 1)] = month_total
-                month_total = {}
-
-    def calc_metrics(self, data, key):
-        self.metrics[key]['Mean usage: '] = round(mean(data), 5)
-        qs = quartiles(data)
-        self.metrics[key]['Lower Quartile: '] = round(qs[0], 5)
-        self.metrics[key]['Median: '] = round(qs[1], 5)
-        self.metrics[key]['Upper quartile: '] = round(qs[2], 5)
-        self.metrics[key]['Interquartile range: '] = round(qs[2] - qs[0], 5)
-        self.metrics[key]['Standard Deviation: '] = round(std_dev(data), 5)
-        self.metrics[key]['Skewness: '] = round(skew(data), 5)
-        self.metrics[key]['Kurtosis: '] = round(kurtosis(data), 5)
-        self.metrics[key]['rawdata'] = data
+    @profiled('refresh_file')
+    def refresh_file(self):
+        # While a file is loading in the background, the data being shown is about to be replaced
+        if self.tail is None or self.load_task is not None:
+            return 0
+        first = len(self.dataset)
+        try:
+            added = self.tail.read(self.dataset)
+        except ValueError as error:
+            self.tail = None
+            self.display_error(str(error))
+        if added == 0:
+            return 0
+        self.generate_monthly_data()
+        end = self.dataset.last_date()
+        self.end_year.set(end.year)
+        self.end_month.set(end.month)
+        self.end_day.set(end.day)
+        if len(self.loaded_fuels) == 1:
+            self.generate_metrics()
+        ids = self.cost_ids()
+        if len(ids) != 0:
+            self.calculate_costs(ids, first)
+        self.preview.move_to(self.preview.first)
+        self.display_status("Added " + str(added) + " new rows. Data now runs to " + "{:%Y/%m/%d}".format(end) + ".")
+        return added
+
+    # While 'Follow file' is ticked, checks the usage file for new rows every FOLLOW_INTERVAL milliseconds
+    def poll_file(self):
+        if self.poll_job is not None:
+            self.parent.after_cancel(self.poll_job)
+            self.poll_job = None
+        if self.follow.get() != 1 or self.tail is None:
+            return
+        try:
+            self.refresh_file()
+        except ValueError:
+            return # The error has been shown, and the file is no longer followed
+        self.poll_job = self.parent.after(FOLLOW_INTERVAL, self.poll_file)
+
+    # Returns the list of house ids or patterns entered in the house filter box, or None to load every house
+    def house_selection(self):
+        selection = [h.strip() for h in self.house_filter.get().split(',') if h.strip() != '']
+        if len(selection) == 0:
+            return None
+        return selection
 
     def generate_metrics(self):
-        self.metrics.clear()
-        keys = []
-        alldata = []
-        if len(self.loaded_fuels) == 1:
-            keys = self.loaded_ids
-            self.metrics['all'] = {}
-            self.metrics['all']['Minimum usage: '] = sys.float_info.max
-            self.metrics['all']['Minimum used on: '] = list(self.data_container.keys())[0]
-            self.metrics['all']['Minimum used by: '] = self.loaded_ids[0]
-            self.metrics['all']['Maximum usage: '] = 0
-            self.metrics['all']['Maximum used on: '] = list(self.data_container.keys())[0]
-            self.metrics['all']['Maximum used by: '] = self.loaded_ids[0]
-        else:
-            keys = self.loaded_fuels
-        for i in keys:
-            self.metrics[i] = {}
-            data=[]
-            self.metrics[i]['Minimum usage: '] = sys.float_info.max
-            self.metrics[i]['Maximum usage: '] = 0
-            self.metrics[i]['Minimum used on: '] = list(self.data_container.keys())[0]
-            self.metrics[i]['Maximum used on: '] = list(self.data_container.keys())[0]
-            for date in list(self.data_container.keys()):
-                data.append(self.data_container[date][i])
-                if self.data_container[date][i] > self.metrics[i]['Maximum usage: ']:
-                    self.metrics[i]['Maximum usage: '] = round(self.data_container[date][i], 5)
-                    self.metrics[i]['Maximum used on: '] = date
-                if self.data_container[date][i] < self.metrics[i]['Minimum usage: ']:
-                    self.metrics[i]['Minimum usage: '] = round(self.data_container[date][i], 5)
-                    self.metrics[i]['Minimum used on: '] = date
-                if len(self.loaded_fuels) == 1:
-                    alldata.append(self.data_container[date][i])
-                    if self.data_container[date][i] > self.metrics['all']['Maximum usage: ']:
-                        self.metrics['all']['Maximum usage: '] = round(self.data_container[date][i], 5)
-                        self.metrics['all']['Maximum used on: '] = date
-                        self.metrics['all']['Maximum used by: '] = i
-                    if self.data_container[date][i] < self.metrics['all']['Minimum usage: ']:
-                        self.metrics['all']['Minimum usage: '] = round(self.data_container[date][i], 5)
-                        self.metrics['all']['Minimum used on: '] = date
-                        self.metrics['all']['Minimum used by: '] = i
-            self.metrics[i]['Minimum monthly usage: '] = sys.float_info.max
-            self.metrics[i]['Maximum monthly usage: '] = 0
-            self.metrics[i]['Minimum month: '] = ""
-            self.metrics[i]['Maximum month: '] = ""
-            for month in list(self.monthly_data.keys()):
-                if self.monthly_data[month][i] > self.metrics[i]['Maximum monthly usage: ']:
-                    self.metrics[i]['Maximum monthly usage: '] = round(self.monthly_data[month][i], 5)
-                    self.metrics[i]['Maximum month: '] = MONTHS[month.month - 1] + " " + str(month.year)
-                if self.monthly_data[month][i] < self.metrics[i]['Minimum monthly usage: ']:
-                    self.metrics[i]['Minimum monthly usage: '] = round(self.monthly_data[month][i], 5)
-                    self.metrics[i]['Minimum month: '] = MONTHS[month.month - 1] + " " + str(month.year)
-            self.calc_metrics(data, i)
-        if len(self.loaded_fuels) == 1:
-            self.calc_metrics(alldata, 'all')
+        self.calculate_metrics()
+        self.show_metrics_menu()
+
+    # Offers the metrics of each house (and of all of them) in the dropdown, and shows the distribution graph controls
+    def show_metrics_menu(self):
         self.dropdown.place_forget()
         self.metric_label.place(x=300, y=460)
         self.dropdown = OptionMenu(self.parent, self.house_selected, *list(self.metrics.keys()), command=self.display_metrics)
         self.house_selected.set(list(self.metrics.keys())[0])
         self.dropdown.place(x=400, y=480)
         self.btn_distr_graph.place(x=300, y=650, width=120)
-        self.graph_size_menu.place(x=450, y=650, width=120)
+        self.bin_menu.place(x=450, y=650, width=120)
+        self.density_menu.place(x=600, y=650, width=180)
 
+    '''
+    Shows the metrics of the house picked in the dropdown (or of all of them) over the dates entered
+    for graphs. The period figures are for the graph's scope (months when graphing days). Metrics
+    already worked out for the same house, dates and scope are taken from the metrics cache.
+    '''
     def display_metrics(self, event):
         self.metric_text.delete(1.0, tk.END)
         key = self.house_selected.get()
+        (first, last) = self.dataset.range_positions(self.get_start(), self.get_end())
+        resolution = self.chart_scope.get() if self.chart_scope.get() != 'daily' else 'monthly'
+        try:
+            if key == 'all':
+                metrics = self.metrics_cache.fleet(self.loaded_ids, first, last, resolution)
+            else:
+                metrics = self.metrics_cache.column(key, first, last, resolution)
+        except ValueError as error:
+            self.display_error(str(error))
         lines = []
-        for m in list(self.metrics[key].keys()):
-            if m != "rawdata":
-                lines.append("{:35.35}".format(m + str(self.metrics[key][m])))
+        for m in list(metrics.keys()):
+            if m not in DATA_FIELDS:
+                lines.append("{:35.35}".format(m + str(metrics[m])))
         rows = int(math.ceil(len(lines) / 3))
         for i in range(rows):
             line = lines[i] + lines[i+rows]
@@ -632,216 +1001,279 @@ class EnergyMonitor:
             self.metric_text.insert(tk.INSERT, line + "\n")
         self.metric_text.place(x=50, y=520)
 
+    '''
+    Returns a plotly trace, first cutting it down to the chosen number of points if it is longer and
+    decimation is switched on. Peaks are kept by both methods, so they still show on the graph.
+    If 'positions' is given (see shared_positions), those points are kept instead of picking them
+    from this trace's own values.
+    The trace is only built when it is called, which happens on a worker thread (see write_figure).
+    '''
+    @profiled('trace')
+    def make_trace(self, trace_type, x, y, positions=None, **options):
+        method = DECIMATION_METHODS[self.decimation.get()]
+        target = POINT_TARGETS[self.point_target.get()]
+        if positions is None and method is not None and len(y) > target:
+            positions = decimate(y, target, method)
+        if positions is not None:
+            x = [x[p] for p in positions]
+            y = [y[p] for p in positions]
+            self.decimated = True
+        return partial(trace_type, x=x, y=y, **options)
+
+    '''
+    Returns the points to keep from every trace of a graph whose traces are stacked or drawn
+    against each other, such as gas and electricity for one house, or None if they aren't being
+    decimated. The points are picked from the total of the series, so every trace keeps the same
+    dates and stacked bars add up to totals which are in the data.
+    '''
+    def shared_positions(self, series):
+        method = DECIMATION_METHODS[self.decimation.get()]
+        target = POINT_TARGETS[self.point_target.get()]
+        if method is None or len(series[0]) <= target:
+            return None
+        return decimate(list(map(sum, zip(*series))), target, method)
+
+    # Added to graph titles when any of the traces have been decimated
+    def decimation_note(self):
+        if not self.decimated:
+            return ""
+        return " (" + self.decimation.get() + ", up to " + self.point_target.get() + " per trace)"
+
+    @profiled('plot_graph')
     def plot_graph(self):
-        data = {}
+        data = None
+        self.decimated = False
         ids = []
         fuels = self.loaded_fuels
         traces = []
         title = ""
         start = self.get_start()
         end = self.get_end()
+        window = AVERAGE_WINDOWS[self.average_window.get()]
+        scope = self.chart_scope.get()
         if self.costs_checked.get() == 'Show costs':
             ids = list(set(self.loaded_ids).intersection(self.loaded_ids_sup))
             title = " Costs (£)"
-            if self.chart_scope.get() == 'monthly':
-                data = self.monthly_costs
-            else:
-                data = self.annual_costs
         else:
             ids = self.loaded_ids
             title = " Usage (kWh)"
-            if self.chart_scope.get() == 'monthly':
-                data = self.monthly_data
-            else:
-                data = self.data_container
-        date_range = []
-        for d in list(data.keys()):
-            if d >= start and d <= end:
-                date_range.append(d)
+        with self.profiler.span('select data'):
+            data = self.scope_dataset(self.costs_checked.get() == 'Show costs', scope)
+            # The rows in the date range are found with a search of the sorted date index
+            (first, last) = data.range_positions(start, end)
+            date_range = data.dates(first, last)
         if len(fuels) == 1: # Multiple houses
             graph_data = {}
             for house in ids:
-                graph_data[house] = []
-            if self.chart_scope.get() == 'monthly':
-                x_axis = []
-                for date in date_range:
-                    if date.day == 1:
-                        for house in ids:
-                            graph_data[house].append(data[date][house])
-                        x_axis.append(MONTHS[date.month - 1] + " " + str(date.year))
-
+                graph_data[house] = list(data.column(house)[first:last])
+            if scope != 'daily':
+                x_axis = [period_label(date, scope) for date in date_range]
             else:
                 x_axis = date_range
-                for date in date_range:
-                    for house in ids:
-                        graph_data[house].append(data[date][house])
 
+            trace_type = go.Scatter if self.chart_type.get() == 'scatter' else go.Bar
             for house in ids:
-                if self.chart_type.get() == 'scatter':
-                    traces.append(go.Scatter(x=x_axis,y=graph_data[house],name=house))
-                else:
-                    traces.append(go.Bar(x=x_axis,y=graph_data[house],name=house))
+                traces.append(self.make_trace(trace_type, x_axis, graph_data[house],name=house))
+            if scope == 'daily' and window > 0:
+                for house, average in rolling_means(graph_data, window).items():
+                    traces.append(self.make_trace(trace_type, x_axis, average,name=house + ' (' + str(window) + ' day moving average)'))
 
-            layout = go.Layout(title='Multiple Houses ' + fuels[0] + ' only ' + self.chart_scope.get(), yaxis=dict(title=title))
+            name = 'Multiple Houses ' + fuels[0] + ' only ' + self.chart_scope.get()
+            layout = go.Layout(title=name + self.decimation_note(), yaxis=dict(title=title))
 
         else: # Single house
-            if self.chart_scope.get() == 'monthly':
-                graph_data = {FuelType.gas: [], FuelType.electricity: []}
-                x_axis = []
-                totals = []
-                for date in date_range:
-                    if date.day == 1:
-                        graph_data[FuelType.gas].append(data[date][FuelType.gas])
-                        graph_data[FuelType.electricity].append(data[date][FuelType.electricity])
-                        x_axis.append(MONTHS[date.month - 1] + " " + str(date.year))
-                        if self.total_mode.get() == 'Show totals':
-                            totals.append(data[date][FuelType.gas]+data[date][FuelType.electricity])
+            graph_data = {}
+            for fuel in (FuelType.gas, FuelType.electricity):
+                graph_data[fuel] = list(data.column(fuel)[first:last])
+            # Gas and electricity are stacked or drawn over each other, so both keep the same dates
+            positions = self.shared_positions([graph_data[FuelType.gas], graph_data[FuelType.electricity]])
+            trace = partial(self.make_trace, positions=positions)
+            if scope != 'daily':
+                x_axis = [period_label(date, scope) for date in date_range]
                 if self.total_mode.get() == 'Show totals':
+                    totals = [g + e for g, e in zip(graph_data[FuelType.gas], graph_data[FuelType.electricity])]
                     if self.chart_type.get() == 'scatter':
-                        gas_trace = go.Scatter(x=x_axis,y=graph_data[FuelType.gas],name='gas trace')
-                        electricity_trace = go.Scatter(x=x_axis,y=graph_data[FuelType.electricity],name='electricity trace')
-                        total_trace = go.Scatter(x=x_axis,y=totals,name='total trace')
+                        gas_trace = trace(go.Scatter, x_axis, graph_data[FuelType.gas],name='gas trace')
+                        electricity_trace = trace(go.Scatter, x_axis, graph_data[FuelType.electricity],name='electricity trace')
+                        total_trace = trace(go.Scatter, x_axis, totals,name='total trace')
                         traces = [gas_trace, electricity_trace, total_trace]
                     else:
-                        gas_trace = go.Bar(x=x_axis,y=graph_data[FuelType.gas],name='gas trace')
-                        electricity_trace = go.Bar(x=x_axis,y=graph_data[FuelType.electricity],name='electricity trace')
+                        gas_trace = trace(go.Bar, x_axis, graph_data[FuelType.gas],name='gas trace')
+                        electricity_trace = trace(go.Bar, x_axis, graph_data[FuelType.electricity],name='electricity trace')
                         traces = [gas_trace, electricity_trace]
                 else:
                     if self.chart_type.get() == 'scatter':
-                        gas_trace = go.Scatter(x=x_axis,y=graph_data[FuelType.gas],name='gas trace')
-                        electricity_trace = go.Scatter(x=x_axis,y=graph_data[FuelType.electricity],name='electricity trace',yaxis='y2')
+                        gas_trace = trace(go.Scatter, x_axis, graph_data[FuelType.gas],name='gas trace')
+                        electricity_trace = trace(go.Scatter, x_axis, graph_data[FuelType.electricity],name='electricity trace',yaxis='y2')
                     else:
-                        gas_trace = go.Bar(x=x_axis,y=graph_data[FuelType.gas],name='gas trace', width=0.4)
-                        electricity_trace = go.Bar(x=x_axis,y=graph_data[FuelType.electricity],name='electricity trace',yaxis='y2', offset=0.2, width=0.4)
+                        gas_trace = trace(go.Bar, x_axis, graph_data[FuelType.gas],name='gas trace', width=0.4)
+                        electricity_trace = trace(go.Bar, x_axis, graph_data[FuelType.electricity],name='electricity trace',yaxis='y2', offset=0.2, width=0.4)
                     traces = [gas_trace, electricity_trace]
 
             else:
-                (gas_values, electricity_values, gas_average, electricity_average, total, total_average) = ([], [], [], [], [], [])
-                datapoint = 0
-                for date in date_range:
-                    gas_values.append(data[date][FuelType.gas])
-                    electricity_values.append(data[date][FuelType.electricity])
-                    if self.total_mode.get() == 'Show totals':
-                        total.append(data[date][FuelType.electricity] + data[date][FuelType.gas])
-                    if datapoint < 29:
-                        total_gas = 0
-                        total_electricity = 0
-                        for i in range(0, datapoint + 1):
-                            total_gas += gas_values[i]
-                            total_electricity += electricity_values[i]
-                        gas_average.append(total_gas / (datapoint + 1))
-                        electricity_average.append(total_electricity / (datapoint + 1))
-                        if self.total_mode.get() == 'Show totals':
-                            total_average.append((total_gas + total_electricity) / (datapoint + 1))
-                    else:
-                        total_gas = 0
-                        total_electricity = 0
-                        for i in range(0, 29):
-                            total_gas += gas_values[datapoint - i]
-                            total_electricity += electricity_values[datapoint - i]
-                        gas_average.append(total_gas / 30)
-                        electricity_average.append(total_electricity / 30)
-                        if self.total_mode.get() == 'Show totals':
-                            total_average.append((total_gas + total_electricity) / 30)
-                    datapoint += 1
+                gas_values = graph_data[FuelType.gas]
+                electricity_values = graph_data[FuelType.electricity]
+                average_name = ' (' + str(window) + ' day moving average)'
                 if self.total_mode.get() == 'Show totals':
+                    total = [e + g for e, g in zip(electricity_values, gas_values)]
                     if self.chart_type.get() == 'scatter':
-                        gas_trace = go.Scatter(x=date_range,y=gas_values,name='gas trace')
-                        electricity_trace = go.Scatter(x=date_range,y=electricity_values,name='electricity trace')
-                        gas_average_trace = go.Scatter(x=date_range,y=gas_average,name='gas (30 day moving average)')
-                        electricity_average_trace = go.Scatter(x=date_range,y=electricity_average,name='electricity (30 day moving average)')
-                        total_trace = go.Scatter(x=date_range,y=total,name='total trace')
-                        total_average = go.Scatter(x=date_range,y=total_average,name='total (30 day moving average)')
-                        traces = [gas_trace, electricity_trace, gas_average_trace, electricity_average_trace, total_trace, total_average]
+                        traces = [trace(go.Scatter, date_range, gas_values,name='gas trace'),
+                                  trace(go.Scatter, date_range, electricity_values,name='electricity trace')]
+                        if window > 0:
+                            traces.append(trace(go.Scatter, date_range, rolling_mean(gas_values, window),name='gas' + average_name))
+                            traces.append(trace(go.Scatter, date_range, rolling_mean(electricity_values, window),name='electricity' + average_name))
+                        traces.append(trace(go.Scatter, date_range, total,name='total trace'))
+                        if window > 0:
+                            traces.append(trace(go.Scatter, date_range, rolling_mean(total, window),name='total' + average_name))
                     else:
-                        gas_trace = go.Bar(x=date_range,y=gas_values,name='gas trace')
-                        electricity_trace = go.Bar(x=date_range,y=electricity_values,name='electricity trace')
+                        gas_trace = trace(go.Bar, date_range, gas_values,name='gas trace')
+                        electricity_trace = trace(go.Bar, date_range, electricity_values,name='electricity trace')
                         traces = [gas_trace, electricity_trace]
                 else:
-                    if self.chart_type.get() == 'scatter':
-                        gas_trace = go.Scatter(x=date_range,y=gas_values,name='gas trace')
-                        electricity_trace = go.Scatter(x=date_range,y=electricity_values,name='electricity trace',yaxis='y2')
-                        gas_average_trace = go.Scatter(x=date_range,y=gas_average,name='gas (30 day moving average)')
-                        electricity_average_trace = go.Scatter(x=date_range,y=electricity_average,name='electricity (30 day moving average)',yaxis='y2')
-                    else:
-                        gas_trace = go.Bar(x=date_range,y=gas_values,name='gas trace')
-                        electricity_trace = go.Bar(x=date_range,y=electricity_values,name='electricity trace',yaxis='y2')
-                        gas_average_trace = go.Bar(x=date_range,y=gas_average,name='gas (30 day moving average)')
-                        electricity_average_trace = go.Bar(x=date_range,y=electricity_average,name='electricity (30 day moving average)',yaxis='y2')
-                    traces = [gas_trace, electricity_trace, gas_average_trace, electricity_average_trace]
+                    trace_type = go.Scatter if self.chart_type.get() == 'scatter' else go.Bar
+                    traces = [trace(trace_type, date_range, gas_values,name='gas trace'),
+                              trace(trace_type, date_range, electricity_values,name='electricity trace',yaxis='y2')]
+                    if window > 0:
+                        traces.append(trace(trace_type, date_range, rolling_mean(gas_values, window),name='gas' + average_name))
+                        traces.append(trace(trace_type, date_range, rolling_mean(electricity_values, window),name='electricity' + average_name,yaxis='y2'))
+            name = ids[0] + ' Both Fuels ' + self.chart_scope.get()
             if self.total_mode.get() == 'Show totals':
-                layout = go.Layout(title=ids[0] + ' Both Fuels ' + self.chart_scope.get(),yaxis=dict(title=title),
+                layout = go.Layout(title=name + self.decimation_note(),yaxis=dict(title=title),
                     barmode='stack')
             else:
-                layout = go.Layout(title=ids[0] + ' Both Fuels ' + self.chart_scope.get(),yaxis=dict(title='Gas ' + title),
+                layout = go.Layout(title=name + self.decimation_note(),yaxis=dict(title='Gas ' + title),
                     yaxis2=dict(title='Electricity ' + title,overlaying='y',side='right'))
 
-        fig = go.Figure(data=traces, layout=layout)
-        plotly.offline.plot(fig, auto_open=True)
+        self.show_figure(traces, layout, name)
 
+    @profiled('pie_chart')
     def pie_chart(self):
         values = []
         start = self.get_start()
         end = self.get_end()
         if self.costs_checked.get() == 'Show costs':
-            data = self.annual_costs
+            (data, ranges) = (self.cost_dataset, self.cost_ranges)
             ids = list(set(self.loaded_ids).intersection(self.loaded_ids_sup))
         else:
-            data = self.data_container
+            (data, ranges) = (self.dataset, self.ranges)
             ids = self.loaded_ids
-        for i in ids:
-            value = 0
-            for d in list(data.keys()):
-                if d >= start and d <= end:
-                    value += data[d][i]
-            values.append(value)
-        trace = go.Pie(labels=ids, values=values)
+        # Each total is looked up from the running totals, rather than adding up every day again
+        with self.profiler.span('totals'):
+            (first, last) = data.range_positions(start, end)
+            for i in ids:
+                values.append(ranges.total(i, first, last))
+        trace = partial(go.Pie, labels=ids, values=values)
         if self.costs_checked.get() == 1:
             layout = go.Layout(title='Total ' + self.loaded_fuels[0] + ' costs (£)')
         else:
             layout = go.Layout(title='Total ' + self.loaded_fuels[0] + ' usage (kWh)')
-        fig = go.Figure(data=[trace], layout=layout)
-        plotly.offline.plot(fig, auto_open=True)
+        self.show_figure([trace], layout, 'Total ' + self.loaded_fuels[0])
 
+    '''
+    Plots the distribution of each house's usage. The bins are counted straight from the loaded
+    data by the stats engine (see energy_stats.py), so only the bin heights are passed to plotly,
+    and the time taken doesn't depend on how many values there are. The density curve is a kernel
+    density estimate worked out from the bins.
+    '''
+    @profiled('distribution_graph_multi')
     def distribution_graph_multi(self):
         traces = []
         minval = self.metrics["all"]['Minimum usage: ']
         maxval = self.metrics["all"]['Maximum usage: ']
-        sizes = [1000,10000,50000,100000,200000,500000,1000000]
-        columns = [50,100,200,300,400,500,600]
-        options = ['1,000 points', '10,000 points', '50,000 points', '100,000 points', '200,000 points', '500,000 points', '1,000,000 points']
-        size = 1000
-        columnc = 50
-        for i in range(len(options)):
-            if self.graph_size.get() == options[i]:
-                size = sizes[i]
-                columnc = columns[i]
+        columnc = BIN_COUNTS[self.bin_count.get()]
         if minval != 0:
             if abs(maxval / minval > 5): #Start from zero if sensible
                 minval = 0
             else:
                 minval = round_1sf(minval)
         interval = round_1sf((maxval - minval) / columnc)
+        # Enough bins of the rounded width to reach the largest value
+        bins = int(math.floor((maxval - minval) / interval)) + 1
+        centres = [minval + (i + 0.5) * interval for i in range(bins)]
         for key in list(self.metrics.keys()):
             if key != "all":
-                data = self.metrics[key]["rawdata"]
-                currsize = len(data)
-                while len(data) < size: # Expand data set to at least the minimum size
-                    data = merge_sort(data)
-                    for i in range(currsize - 1):
-                        data.append((data[i] + data[i+1])/2)
-                    currsize = len(data)
-                traces.append(go.Histogram(
-                    x=data,
-                    opacity = 0.7,
-                    name=key,
-                    histnorm='probability',
-                    xbins=dict(start=minval, end=maxval, size=interval),
-                    autobinx = False
-                ))
-        layout = go.Layout(title='Distribution graph', xaxis=dict(title='Consumption (kWh)'), barmode='overlay')
-        fig = go.Figure(data=traces, layout=layout)
-        plotly.offline.plot(fig, auto_open=True)
+                with self.profiler.span('bins'):
+                    data = self.metrics[key]["rawdata"]
+                    probabilities = [count / len(data) for count in histogram(data, minval, interval, bins)]
+                    traces.append(partial(go.Bar, x=centres, y=probabilities, width=interval, opacity=0.7, name=key))
+                    if self.density_mode.get() == 'Bins and density curve':
+                        bandwidth = silverman_bandwidth(self.metrics[key]['Standard Deviation: '],
+                                                        self.metrics[key]['Interquartile range: '], len(data))
+                        traces.append(partial(go.Scatter, x=centres, y=smooth_histogram(probabilities, bandwidth / interval),
+                                              mode='lines', name=key + ' (density)'))
+        layout = go.Layout(title='Distribution graph', xaxis=dict(title='Consumption (kWh)'),
+                           yaxis=dict(title='Probability'), barmode='overlay', bargap=0)
+        self.show_figure(traces, layout, 'Distribution graph')
+
+    '''
+    Starts writing a graph out as HTML in the background. The window carries on responding while
+    it is written, and several graphs can be written at once. Each one is opened by check_figures
+    once its file is ready. 'name' is used to name the file.
+    '''
+    def show_figure(self, traces, layout, name):
+        try:
+            file = self.figures.submit(name, traces, layout, self.profiler)
+        except OSError as error:
+            self.display_error("Could not write graphs to " + self.figures.output_dir + ": " + str(error))
+        self.display_status("Drawing graph " + basename(file) + "...")
+        if self.figure_job is None:
+            self.figure_job = self.parent.after(FIGURE_CHECK_INTERVAL, self.check_figures)
+
+    # Opens each graph once it has been written, checking every FIGURE_CHECK_INTERVAL milliseconds until they all have
+    def check_figures(self):
+        self.figure_job = None
+        for file, seconds, error in self.figures.poll():
+            if error is not None:
+                try:
+                    self.display_error("Could not draw graph: " + str(error))
+                except ValueError:
+                    pass # The error is shown, and any other graphs carry on being written
+                continue
+            self.display_status("Graph written to " + file + " in " + format_seconds(seconds) + ".")
+            webbrowser.open(Path(path.abspath(file)).as_uri())
+        self.show_background_profiles()
+        if self.figures.pending() > 0:
+            self.figure_job = self.parent.after(FIGURE_CHECK_INTERVAL, self.check_figures)
+
+    # Picks the directory graphs are written to
+    def pick_figure_dir(self):
+        directory = filedialog.askdirectory(initialdir=self.figures.output_dir)
+        if not directory:
+            return
+        self.figures.output_dir = directory
+        self.display_status("Graphs will be written to " + directory)
+
+    def set_profiling(self, mode):
+        (enabled, memory) = PROFILING_MODES[mode]
+        self.profiler.set_mode(enabled, memory)
+        if not enabled:
+            self.profile_label.place_forget()
+
+    # Shows how long the last operation took, and how long each stage of it took
+    def show_profile(self, span):
+        self.profile_label.configure(text=summary(span))
+        self.profile_label.place(x=100, y=725)
+
+    # Shows the timings of the operations which have finished on background threads
+    def show_background_profiles(self):
+        for span in self.profiler.poll():
+            self.show_profile(span)
+
+    '''
+    Saves the timings of every operation since profiling was switched on. Files saved with a
+    .trace.json extension are written in the Chrome trace format (for chrome://tracing or Perfetto),
+    and any other file as plain JSON.
+    '''
+    def export_profile(self):
+        file = filedialog.asksaveasfilename(defaultextension='.json', filetypes=[('Chrome trace', '*.trace.json'),
+                                                                                  ('JSON', '*.json')])
+        if not file:
+            return
+        if file.endswith('.trace.json'):
+            self.profiler.write_chrome_trace(file)
+        else:
+            self.profiler.write_json(file)
+        self.display_status("Profile saved to " + file)
 
 
 '''
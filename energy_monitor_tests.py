@@ -1,7 +1,9 @@
 import unittest
+from energy_decimate import decimate
 from energy_monitor import EnergyMonitor, FuelType
 import tkinter as tk
 import datetime
+import tempfile
 from os import path
 
 class TestBasicLoading(unittest.TestCase):
@@ -11,8 +13,8 @@ class TestBasicLoading(unittest.TestCase):
 
         self.assertIsNotNone(self.gui)
         self.assertIsInstance(self.gui, EnergyMonitor)
-        self.assertDictEqual(self.gui.data_container, {})
-        self.assertDictEqual(self.gui.monthly_data, {})
+        self.assertDictEqual(dict(self.gui.data_container), {})
+        self.assertDictEqual(dict(self.gui.monthly_data), {})
         self.assertListEqual(self.gui.loaded_fuels, [])
         self.assertListEqual(self.gui.loaded_ids, [])
 
@@ -43,6 +45,18 @@ class TestBasicLoading(unittest.TestCase):
         self.assertEqual(self.gui.data_container[first_date], {FuelType.gas: 4.063200168,
                                                                          FuelType.electricity: 20.93194302})
 
+    def test_nan(self):
+        print("Testing that a file with a NaN value is not loaded, so loading suppliers afterwards still works")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            file = path.join(temp_dir, 'electricity_daily.csv')
+            with open(file, 'w') as usage:
+                usage.write("Date,house_a\n20160101,1.5\n20160102,nan\n20160103,2.5\n")
+            with self.assertRaises(ValueError):
+                self.gui.load_file(file)
+        self.gui.load_file(self.working_dir + '\\resources\\suppliers.csv')
+        self.assertEqual(self.gui.loaded_ids, [])
+        self.assertEqual(self.gui.supplier_data['HouseC']['Electricity Usage Rate'], 30.55)
+
     def test_badcolumn(self):
         print("Testing a file with a bad column")
         with self.assertRaises(ValueError):
@@ -65,26 +79,37 @@ class TestBasicLoading(unittest.TestCase):
         self.assertEqual(self.gui.data_container[first_date], {'house_a': 5.778333712,
             'house_b': 9.80291645, 'house_c': 5.44345916, 'house_d': 8.46050336})
 
+    def test_preview(self):
+        print("Testing that the preview only shows one page of rows, and can jump to a date")
+        self.gui.load_file(self.working_dir + '\\resources\\electricity_daily.csv')
+        self.assertEqual(self.gui.preview.first, 0)
+        self.assertEqual(len(self.gui.scrolled_text.get(1.0, tk.END).strip().split("\n")), self.gui.preview.height)
+
+        self.gui.preview.jump_date.set("2016/06/01")
+        self.gui.preview.jump()
+        self.assertEqual(self.gui.preview.first, 152)
+        self.assertTrue(self.gui.scrolled_text.get(2.0, 3.0).startswith("2016/06/01"))
+
     def test_monthly(self):
         print("Testing that monthly data is calculated correctly")
         first_date = datetime.date(2016, 1, 1)
         self.gui.load_file(self.working_dir + '\\resources\\electricity_daily.csv')
         self.assertEqual(self.gui.monthly_data[first_date], {'house_a': 196.3179227,
-            'house_b': 280.6373267, 'house_c': 205.915899, 'house_d': 326.6051785})
+            'house_b': 280.6373267, 'house_c': 205.9158991, 'house_d': 326.6051786})
 
     def test_monthly_twoyears(self):
         print("Testing that monthly data is calculated correctly when using a file containing 2 years' worth of data")
         first_date = datetime.date(2017, 1, 1)
         self.gui.load_file(self.working_dir + '\\resources\\electricity_daily_twoyears.csv')
         self.assertEqual(self.gui.monthly_data[first_date], {'house_a': 196.3179227,
-            'house_b': 280.6373267, 'house_c': 205.915899, 'house_d': 326.6051785})
+            'house_b': 280.6373267, 'house_c': 205.9158991, 'house_d': 326.6051786})
 
     def test_monthly_partial(self):
         print("Testing that monthly data is calculated correctly when using a file containing part of a year of data")
         first_date = datetime.date(2016, 9, 1)
         self.gui.load_file(self.working_dir + '\\resources\\electricity_daily_partial.csv')
         self.assertEqual(self.gui.monthly_data[first_date], {'house_a': 206.0236047,
-            'house_b': 271.7957174, 'house_c': 190.0440967, 'house_d': 321.2686383})
+            'house_b': 271.7957171, 'house_c': 190.0440967, 'house_d': 321.2686383})
 
     def test_suppliers(self):
         print("Testing that supplier data is loaded properly")
@@ -101,6 +126,17 @@ class TestBasicLoading(unittest.TestCase):
         with self.assertRaises(ValueError):
             self.gui.load_file(self.working_dir + '\\resources\\suppliers_baddata.csv')
 
+    def test_shared_positions(self):
+        print("Testing that gas and electricity keep the same dates when decimated, picked from their totals")
+        gas = [float(i % 7) for i in range(3000)]
+        electricity = [float(i % 11) for i in range(3000)]
+        self.gui.decimation.set('LTTB')
+        self.gui.point_target.set('1,000 points')
+        positions = self.gui.shared_positions([gas, electricity])
+        self.assertEqual(positions, decimate([g + e for g, e in zip(gas, electricity)], 1000, 'lttb'))
+        self.gui.decimation.set('All points')
+        self.assertIsNone(self.gui.shared_positions([gas, electricity]))
+
     def test_date_verification(self):
         print("Testing that entering bad date info raises an error")
         self.gui.load_file(self.working_dir + '\\resources\\electricity_daily_test_big.csv')
@@ -0,0 +1,274 @@
+import functools
+import json
+import os
+import queue
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+'''
+This file times the stages of the Energy Monitor's main operations (loading a file, working out
+the monthly totals, metrics and costs, and picking the data for each graph), so that it is clear
+where the time goes. Like energy_dataset.py, it does not depend on tkinter or plotly.
+
+Each stage is a named span. Spans opened while another span is open on the same thread are kept as
+its children, so a finished operation is a tree, e.g. load_file -> parse, monthly totals, metrics,
+costs. Spans are recorded on every thread, so files loaded and graphs written in the background
+(see energy_worker.py and energy_figures.py) are timed too. Each thread has its own tree, and
+operations finished on other threads are handed to the thread which created the profiler with
+poll(), so they can be shown in the window. If memory profiling is switched on, tracemalloc is also
+run, and each span records the peak amount of memory allocated above what was in use when it
+started. tracemalloc counts the memory of the whole process, so the peak of a span includes
+anything allocated by other threads while it was open.
+
+Profiling is off by default. While it is off, span() returns a shared do-nothing span and methods
+wrapped with profiled() are called straight away, so leaving the spans in place costs next to
+nothing.
+
+Finished operations can be written out as JSON, or as a Chrome trace file which can be opened in
+chrome://tracing or https://ui.perfetto.dev.
+'''
+
+# Number of finished operations kept for exporting
+HISTORY = 1000
+
+
+class Span:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        # The thread the span was opened on
+        self.thread = threading.get_ident()
+        self.thread_name = threading.current_thread().name
+        self.start = None
+        self.end = None
+        # Memory in use when the span started, and the highest amount in use before it ended
+        self.memory = None
+        self.peak = None
+        self.children = []
+
+    def __enter__(self):
+        self.profiler.enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.profiler.exit(self)
+        return False
+
+    def duration(self):
+        return self.end - self.start
+
+    # Peak memory allocated during the span, above what was in use when it started (None if memory wasn't traced)
+    def peak_memory(self):
+        if self.peak is None:
+            return None
+        return max(self.peak - self.memory, 0)
+
+    def as_dict(self):
+        span = {'name': self.name, 'thread': self.thread_name, 'start': self.start, 'seconds': self.duration()}
+        if self.peak is not None:
+            span['peak_memory'] = self.peak_memory()
+        if len(self.children) > 0:
+            span['children'] = [child.as_dict() for child in self.children]
+        return span
+
+
+# Returned by span() while profiling is off
+class NoSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+class Profiler:
+
+    def __init__(self, enabled=False, memory=False, on_finish=None):
+        self.enabled = False
+        self.memory = False
+        # Called with each top level span once it (and everything in it) has finished
+        self.on_finish = on_finish
+        self.finished = deque(maxlen=HISTORY)
+        # The spans open on each thread, innermost last
+        self.local = threading.local()
+        # Every span open on any thread, and a lock for it, so each one keeps its peak memory when another resets it
+        self.running = []
+        self.lock = threading.Lock()
+        # Top level spans finished on other threads, waiting to be handed over by poll()
+        self.handed_over = queue.Queue()
+        self.started_tracing = False
+        # on_finish is only called on the thread which created the profiler
+        self.thread = threading.get_ident()
+        self.set_mode(enabled, memory)
+
+    '''
+    Switches profiling on or off, with or without memory tracing. tracemalloc slows everything
+    down while it runs, so it is only started for memory profiling, and stopped again afterwards.
+    '''
+    def set_mode(self, enabled, memory=False):
+        self.enabled = enabled
+        self.memory = enabled and memory
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        elif not self.memory and self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def span(self, name):
+        if not self.enabled:
+            return NO_SPAN
+        return Span(self, name)
+
+    # The spans open on the current thread
+    def open_spans(self):
+        if not hasattr(self.local, 'open'):
+            self.local.open = []
+        return self.local.open
+
+    def enter(self, span):
+        if self.memory and tracemalloc.is_tracing():
+            with self.lock:
+                (current, peak) = tracemalloc.get_traced_memory()
+                # The peak is reset for each span, so keep what every open span had reached
+                for other in self.running:
+                    other.peak = max(other.peak or 0, peak)
+                tracemalloc.reset_peak()
+                span.memory = current
+                span.peak = current
+                self.running.append(span)
+        self.open_spans().append(span)
+        span.start = time.perf_counter()
+
+    def exit(self, span):
+        span.end = time.perf_counter()
+        open_spans = self.open_spans()
+        # A span left open by an error is closed along with the span it is inside
+        while len(open_spans) > 0 and open_spans[-1] is not span:
+            self.exit(open_spans[-1])
+        if len(open_spans) > 0:
+            open_spans.pop()
+        if span.peak is not None:
+            with self.lock:
+                if tracemalloc.is_tracing():
+                    span.peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+                if span in self.running:
+                    self.running.remove(span)
+        if len(open_spans) > 0:
+            parent = open_spans[-1]
+            parent.children.append(span)
+            if span.peak is not None and parent.peak is not None:
+                parent.peak = max(parent.peak, span.peak)
+        else:
+            self.finished.append(span)
+            if span.thread != self.thread:
+                self.handed_over.put(span)
+            elif self.on_finish is not None:
+                self.on_finish(span)
+
+    '''
+    Returns the top level spans finished on other threads since the last call, without waiting, so
+    the thread which created the profiler can show them (e.g. by passing them to on_finish).
+    '''
+    def poll(self):
+        spans = []
+        while True:
+            try:
+                spans.append(self.handed_over.get_nowait())
+            except queue.Empty:
+                return spans
+
+    def clear(self):
+        self.finished.clear()
+
+    '''
+    Writes every finished operation as JSON: a list of spans, each with its name, thread, start time and
+    length in seconds, its peak memory in bytes if memory was traced, and the spans inside it.
+    '''
+    def write_json(self, file):
+        with open(file, 'w') as output:
+            json.dump([span.as_dict() for span in self.finished], output, indent=2)
+
+    '''
+    Writes every finished operation in the Chrome trace event format, with times in microseconds.
+    Each thread's spans are shown on their own row, labelled with the thread's name.
+    '''
+    def write_chrome_trace(self, file):
+        events = []
+        threads = {}
+        pid = os.getpid()
+
+        def add(span):
+            threads[span.thread] = span.thread_name
+            event = {'name': span.name, 'ph': 'X', 'ts': span.start * 1e6, 'dur': span.duration() * 1e6,
+                     'pid': pid, 'tid': span.thread}
+            if span.peak is not None:
+                event['args'] = {'peak_memory': span.peak_memory()}
+            events.append(event)
+            for child in span.children:
+                add(child)
+
+        for span in self.finished:
+            add(span)
+        for thread, name in threads.items():
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': thread, 'args': {'name': name}})
+        with open(file, 'w') as output:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, output)
+
+
+'''
+Returns a one line summary of a finished span: its length, then the total length of each of the
+spans directly inside it (added up by name, with a count if there was more than one), and the
+peak memory if it was traced.
+'''
+def summary(span):
+    totals = {}
+    for child in span.children:
+        (seconds, count) = totals.get(child.name, (0, 0))
+        totals[child.name] = (seconds + child.duration(), count + 1)
+    text = span.name + " took " + format_seconds(span.duration())
+    if span.peak is not None:
+        text += ", peak memory " + format_bytes(span.peak_memory())
+    stages = []
+    for name, (seconds, count) in totals.items():
+        stages.append(name + (" x" + str(count) if count > 1 else "") + " " + format_seconds(seconds))
+    if len(stages) > 0:
+        text += " (" + ", ".join(stages) + ")"
+    return text
+
+
+def format_seconds(seconds):
+    if seconds < 1:
+        return "{:.1f}ms".format(seconds * 1000)
+    return "{:.2f}s".format(seconds)
+
+
+def format_bytes(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return "{:.0f}{}".format(size, unit)
+        size /= 1024
+    return "{:.1f}GB".format(size)
+
+
+'''
+Decorator which runs a method inside a span of the given name, using the profiler in the object's
+'profiler' field.
+'''
+def profiled(name):
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.profiler.enabled:
+                return method(self, *args, **kwargs)
+            with self.profiler.span(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,88 @@
+import unittest
+import json
+import tempfile
+import threading
+from os import path
+from energy_profile import NO_SPAN, Profiler, profiled, summary
+
+
+class Stages:
+
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    @profiled('load')
+    def load(self):
+        with self.profiler.span('parse'):
+            data = [float(i) for i in range(10000)]
+        for i in range(2):
+            with self.profiler.span('trace'):
+                pass
+        return len(data)
+
+
+class TestProfiler(unittest.TestCase):
+
+    def test_spans(self):
+        print("Testing that spans inside a profiled method are kept as its children")
+        finished = []
+        profiler = Profiler(True, on_finish=finished.append)
+        self.assertEqual(Stages(profiler).load(), 10000)
+        self.assertEqual(len(finished), 1)
+        load = finished[0]
+        self.assertEqual([child.name for child in load.children], ['parse', 'trace', 'trace'])
+        self.assertTrue(all(load.start <= child.start and child.end <= load.end for child in load.children))
+        self.assertIsNone(load.peak_memory())
+        self.assertTrue(summary(load).startswith("load took "))
+        self.assertIn("trace x2", summary(load))
+
+    def test_off(self):
+        print("Testing that nothing is recorded while profiling is off")
+        profiler = Profiler()
+        self.assertIs(profiler.span('parse'), NO_SPAN)
+        Stages(profiler).load()
+        self.assertEqual(len(profiler.finished), 0)
+
+    def test_memory_and_export(self):
+        print("Testing peak memory tracing, and writing the spans as JSON and as a Chrome trace")
+        profiler = Profiler(True, memory=True)
+        try:
+            Stages(profiler).load()
+        finally:
+            profiler.set_mode(False)
+        load = profiler.finished[0]
+        self.assertGreater(load.children[0].peak_memory(), 10000 * 8)
+        self.assertGreaterEqual(load.peak_memory(), load.children[0].peak_memory())
+
+        with tempfile.TemporaryDirectory() as directory:
+            profiler.write_json(path.join(directory, 'profile.json'))
+            profiler.write_chrome_trace(path.join(directory, 'profile.trace.json'))
+            with open(path.join(directory, 'profile.json')) as file_contents:
+                spans = json.load(file_contents)
+            with open(path.join(directory, 'profile.trace.json')) as file_contents:
+                events = json.load(file_contents)['traceEvents']
+        self.assertEqual([child['name'] for child in spans[0]['children']], ['parse', 'trace', 'trace'])
+        spans = [event for event in events if event['ph'] == 'X']
+        self.assertEqual([event['name'] for event in spans], ['load', 'parse', 'trace', 'trace'])
+        self.assertTrue(all(event['dur'] >= 0 for event in spans))
+        self.assertEqual([event['args']['name'] for event in events if event['ph'] == 'M'], ['MainThread'])
+
+    def test_threads(self):
+        print("Testing that spans on other threads are recorded, and handed over rather than passed to on_finish")
+        finished = []
+        profiler = Profiler(True, on_finish=finished.append)
+        with profiler.span('plot'):
+            worker = threading.Thread(target=Stages(profiler).load, name='loader')
+            worker.start()
+            worker.join()
+        self.assertEqual([span.name for span in finished], ['plot'])
+        self.assertEqual(finished[0].children, [])
+        [load] = profiler.poll()
+        self.assertEqual((load.name, load.thread_name), ('load', 'loader'))
+        self.assertEqual([child.name for child in load.children], ['parse', 'trace', 'trace'])
+        self.assertEqual(profiler.poll(), [])
+        self.assertEqual(len(profiler.finished), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
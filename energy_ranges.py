@@ -0,0 +1,237 @@
+import math
+from array import array
+from itertools import accumulate, repeat
+from operator import gt, lt, mul, sub
+
+from energy_stats import moment_stats
+
+'''
+This file answers questions about any range of rows of a dataset (the total, mean, standard
+deviation, skewness and kurtosis of a column, and its smallest and largest values and the rows
+they are on) in constant time, so the metrics panel and pie chart can follow the dates picked for
+graphs without going through every value again. Like energy_dataset.py, it does not depend on
+tkinter or plotly.
+
+Each column is split into blocks of BLOCK rows, and two things are worked out for it once:
+- running totals (prefix sums) of the first, second, third and fourth powers of the values, taken
+  at the end of each block. The total of a power over whole blocks is the difference between two
+  running totals. The mean, standard deviation, skewness and kurtosis all come from these four.
+- sparse tables of the smallest and largest value of each block. Level k of a table holds the
+  smallest (or largest) value of each run of 2^k blocks, so any run of whole blocks is covered by
+  two overlapping entries from one level.
+The rows before the first whole block and after the last are added up or searched directly, so a
+range never costs more than 2 * BLOCK values plus a few lookups however long it is. Keeping one
+entry per block rather than one per row means the tables take up a small fraction of the memory
+of the data itself.
+
+To keep the running totals accurate, the powers are taken of each value's difference from the
+column's mean (worked out when the column is first indexed), rather than of the value itself. The
+running totals are worked out with itertools.accumulate and the powers with map(), which run in C.
+
+Like the rollups (see energy_rollup.py), the tables are kept until the dataset changes, and if rows
+have only been added to the end of the dataset, only the last block and any new ones are worked out.
+'''
+
+# Number of rows covered by each entry of the running totals and sparse tables
+BLOCK = 64
+
+
+class ColumnIndex:
+
+    def __init__(self, data):
+        self.shift = math.fsum(data) / len(data) if len(data) > 0 else 0.0
+        self.rows = 0
+        # sums[p - 1][b] is the total of (value - shift)^p over the rows of every block before block b
+        self.sums = [array('d', [0.0]) for power in range(4)]
+        # minima[k][b] and maxima[k][b] are the smallest and largest values of blocks b..b+2^k-1
+        self.minima = [array('d')]
+        self.maxima = [array('d')]
+        self.update(data)
+
+    '''
+    Brings the index up to date after rows have been added to the end of the column. The last
+    block already indexed (which the new rows may belong to) is worked out again, along with any
+    new blocks, then the higher levels of the sparse tables are rebuilt from the blocks.
+    '''
+    def update(self, data):
+        keep = self.rows // BLOCK
+        for sums in self.sums:
+            del sums[keep + 1:]
+        del self.minima[0][keep:]
+        del self.maxima[0][keep:]
+        values = data[keep * BLOCK:]
+        for lo in range(0, len(values), BLOCK):
+            block = values[lo:lo + BLOCK]
+            self.minima[0].append(min(block))
+            self.maxima[0].append(max(block))
+        deviations = list(map(sub, values, repeat(self.shift)))
+        squares = list(map(mul, deviations, deviations))
+        powers = (deviations, squares, map(mul, squares, deviations), map(mul, squares, squares))
+        for sums, power in zip(self.sums, powers):
+            # The running total from the start of the column, at the end of each block
+            running = list(accumulate(power, initial=sums[-1]))
+            sums.extend(running[BLOCK::BLOCK])
+            if len(values) % BLOCK != 0:
+                sums.append(running[-1])
+        self.rows = len(data)
+        self.minima[1:] = sparse_levels(self.minima[0], min)
+        self.maxima[1:] = sparse_levels(self.maxima[0], max)
+
+    '''
+    Returns the totals of the first four powers of (value - shift) over rows first..last-1 of
+    'data', the column this index was built from.
+    '''
+    def sums_between(self, data, first, last):
+        (lo, hi) = whole_blocks(first, last)
+        if lo >= hi:
+            return power_sums(data[first:last], self.shift)
+        totals = [sums[hi] - sums[lo] for sums in self.sums]
+        for start, end in ((first, lo * BLOCK), (hi * BLOCK, last)):
+            if end > start:
+                totals = list(map(sum, zip(totals, power_sums(data[start:end], self.shift))))
+        return totals
+
+    '''
+    Returns the smallest (or if 'largest' is True, the largest) value of rows first..last-1 of
+    'data', and the first row holding it.
+    '''
+    def extreme(self, data, first, last, largest=False):
+        (pick, better, levels) = (max, gt, self.maxima) if largest else (min, lt, self.minima)
+        (lo, hi) = whole_blocks(first, last)
+        if lo >= hi:
+            return first_extreme(data, first, last, pick)
+        best = first_extreme(data, first, lo * BLOCK, pick)
+        level = (hi - lo).bit_length() - 1
+        value = pick(levels[level][lo], levels[level][hi - (1 << level)])
+        if best is None or better(value, best[0]):
+            # Skips runs of blocks which don't hold the value, to find the first block which does
+            block = lo
+            for k in range(level, -1, -1):
+                if block + (1 << k) <= hi and levels[k][block] != value:
+                    block += 1 << k
+            best = first_extreme(data, block * BLOCK, (block + 1) * BLOCK, pick)
+        rest = first_extreme(data, hi * BLOCK, last, pick)
+        if rest is not None and better(rest[0], best[0]):
+            best = rest
+        return best
+
+
+'''
+Keeps a ColumnIndex for each column of a dataset, building it the first time the column is asked
+about and reusing it until the dataset changes (which is noticed from the dataset's version number).
+'''
+class RangeIndex:
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.columns = {}
+
+    def column(self, key):
+        version, index = self.columns.get(key, (None, None))
+        if version == self.dataset.version:
+            return index
+        if index is not None and version >= self.dataset.base_version:
+            index.update(self.dataset.column(key))  # Rows have only been added since it was built
+        else:
+            index = ColumnIndex(self.dataset.column(key))
+        self.columns[key] = (self.dataset.version, index)
+        return index
+
+    # Returns the total of a column over rows first..last-1
+    def total(self, key, first, last):
+        return (last - first) * self.column(key).shift + self.power_sums(key, first, last)[0]
+
+    '''
+    Returns the totals of the first four powers of the differences between a column's values and
+    'shift' over rows first..last-1. Totals taken about the same shift can be added together to
+    get those of several columns at once.
+    '''
+    def power_sums(self, key, first, last, shift=None):
+        index = self.column(key)
+        sums = index.sums_between(self.dataset.column(key), first, last)
+        if shift is None or shift == index.shift:
+            return sums
+        # Expands (x - shift)^p as ((x - index.shift) + d)^p, using the totals already worked out
+        d = index.shift - shift
+        n = last - first
+        (s1, s2, s3, s4) = sums
+        return [s1 + n * d,
+                s2 + 2 * d * s1 + n * d * d,
+                s3 + 3 * d * s2 + 3 * d * d * s1 + n * d ** 3,
+                s4 + 4 * d * s3 + 6 * d * d * s2 + 4 * d ** 3 * s1 + n * d ** 4]
+
+    '''
+    Returns the mean, standard deviation, skewness and kurtosis (see energy_stats.moment_stats) of
+    one or more columns together over rows first..last-1.
+    '''
+    def stats(self, keys, first, last):
+        keys = list(keys)
+        shift = math.fsum(self.column(key).shift for key in keys) / len(keys)
+        totals = [0.0] * 4
+        for key in keys:
+            totals = list(map(sum, zip(totals, self.power_sums(key, first, last, shift))))
+        return shifted_stats((last - first) * len(keys), shift, totals)
+
+    # Returns the smallest value of a column over rows first..last-1, and the first row holding it
+    def minimum(self, key, first, last):
+        return self.column(key).extreme(self.dataset.column(key), first, last)
+
+    # Returns the largest value of a column over rows first..last-1, and the first row holding it
+    def maximum(self, key, first, last):
+        return self.column(key).extreme(self.dataset.column(key), first, last, largest=True)
+
+    def clear(self):
+        self.columns.clear()
+
+
+'''
+Works out the statistics of n values from the totals of the first four powers of their differences
+from 'shift'. The sums of the powers of their deviations from their mean follow from the binomial
+expansion of (x - mean)^p. If the variance is lost in rounding error, the values are taken to be
+all the same.
+'''
+def shifted_stats(n, shift, totals):
+    if n == 0:
+        raise ValueError("Cannot calculate metrics for an empty data set")
+    (s1, s2, s3, s4) = totals
+    mean = s1 / n
+    m2 = s2 - s1 * mean
+    if m2 <= 1e-12 * s2:
+        (m2, m3, m4) = (0.0, 0.0, 0.0)
+    else:
+        m3 = s3 - 3 * mean * s2 + 2 * n * mean ** 3
+        m4 = s4 - 4 * mean * s3 + 6 * mean * mean * s2 - 3 * n * mean ** 4
+    return moment_stats(n, shift + mean, m2, m3, m4)
+
+
+# Returns the totals of the first four powers of (value - shift) for a sequence of values
+def power_sums(values, shift):
+    deviations = list(map(sub, values, repeat(shift)))
+    squares = list(map(mul, deviations, deviations))
+    return [math.fsum(deviations), math.fsum(squares), math.fsum(map(mul, squares, deviations)),
+            math.fsum(map(mul, squares, squares))]
+
+
+# Returns the blocks lo..hi-1 which lie wholly within rows first..last-1
+def whole_blocks(first, last):
+    return -(-first // BLOCK), last // BLOCK
+
+
+# Returns the higher levels of a sparse table, built from the values of its first level
+def sparse_levels(values, pick):
+    levels = []
+    size = 1
+    while 2 * size <= len(values):
+        below = levels[-1] if len(levels) > 0 else values
+        levels.append(array('d', map(pick, below[:len(below) - size], below[size:])))
+        size *= 2
+    return levels
+
+
+# Returns the smallest (or largest) of rows first..last-1, and the first row holding it, or None if there are none
+def first_extreme(data, first, last, pick):
+    if last <= first:
+        return None
+    values = list(data[first:last])
+    value = pick(values)
+    return value, first + values.index(value)
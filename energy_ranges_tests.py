@@ -0,0 +1,60 @@
+import unittest
+import datetime
+import math
+import random
+from array import array
+from energy_dataset import EnergyDataset
+from energy_ranges import BLOCK, RangeIndex
+from energy_stats import describe
+
+
+class TestRangeIndex(unittest.TestCase):
+
+    def test_ranges(self):
+        print("Testing range totals, statistics and extremes against working them out from the values")
+        ranges = RangeIndex(self.dataset)
+        generator = random.Random(1)
+        for i in range(300):
+            first = generator.randrange(len(self.dataset))
+            last = generator.randrange(first + 1, len(self.dataset) + 1)
+            values = list(self.dataset.column('house_a')[first:last])
+            self.assertAlmostEqual(ranges.total('house_a', first, last), math.fsum(values), places=8)
+            self.assertEqual(ranges.minimum('house_a', first, last), (min(values), first + values.index(min(values))))
+            self.assertEqual(ranges.maximum('house_a', first, last), (max(values), first + values.index(max(values))))
+            if last - first > 3:
+                expected = describe(values + list(self.dataset.column('house_b')[first:last]))
+                stats = ranges.stats(['house_a', 'house_b'], first, last)
+                for name in ('mean', 'std_dev', 'skew', 'kurtosis'):
+                    self.assertAlmostEqual(stats[name], expected[name], places=8)
+
+    def test_update(self):
+        print("Testing that the index is updated when rows are added, and rebuilt when the data is reloaded")
+        ranges = RangeIndex(self.dataset)
+        index = ranges.column('house_a')
+        size = len(self.dataset)
+        day = self.dataset.last_date()
+        for i in range(BLOCK + 5):
+            day += datetime.timedelta(days=1)
+            self.dataset.append(day, [20.0 if i == 10 else 1.0, 1.0])
+        self.assertIs(ranges.column('house_a'), index)
+        self.assertEqual(ranges.maximum('house_a', 0, len(self.dataset)), (20.0, size + 10))
+        self.assertAlmostEqual(ranges.total('house_a', size, len(self.dataset)), BLOCK + 24)
+
+        self.dataset.set_data(['house_a'], array('l', self.dataset.ordinals[:3]), [array('d', [3.0, 3.0, 3.0])])
+        self.assertIsNot(ranges.column('house_a'), index)
+        self.assertEqual(ranges.stats(['house_a'], 0, 3)['std_dev'], 0)
+        self.assertEqual(ranges.minimum('house_a', 0, 3), (3.0, 0))
+
+    def setUp(self):
+        # Ten blocks and a bit of random values with only two decimal places, so there are ties
+        generator = random.Random(0)
+        self.dataset = EnergyDataset()
+        self.dataset.set_columns(['house_a', 'house_b'])
+        day = datetime.date(2016, 1, 1)
+        for i in range(10 * BLOCK + 17):
+            self.dataset.append(day, [round(generator.random() * 10, 2), round(generator.random() * 5 + 1, 2)])
+            day += datetime.timedelta(days=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,219 @@
+import argparse
+import csv
+import datetime
+import json
+import math
+import re
+import sys
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from ntpath import basename
+
+from energy_cache import CACHE_DIR, load_cached
+from energy_costs import cost_columns, read_supplier_file, supplier_rates
+from energy_dataset import EnergyDataset
+from energy_metrics import DATA_FIELDS, usage_metrics
+from energy_rollup import RESOLUTIONS, Rollup
+from energy_sketch import QUANTILE_MODES, SKETCH_SIZE
+from energy_validation import Validator
+
+'''
+This file produces the same figures as the Energy Monitor, without opening a window, so that usage
+exports can be processed on a server or by a scheduled job. For each usage file it works out the
+metrics shown in the metrics panel, the monthly (or weekly, quarterly or yearly) totals, and, if a
+supplier file is given, the daily costs totalled over the same periods. The results are written
+as JSON, or as a CSV file with one figure per row, along with any problems found in the file (see
+energy_validation.py).
+
+Usage files are named as for the GUI: {fuel-type}_daily.csv for multiple houses and
+{house-id}_both_daily.csv for a single house. When several files are given, they are processed in
+a pool of worker processes, one file per worker at a time, so a single large file is still
+reported on by one process. Metrics which aren't finite numbers are written as null.
+
+For example:
+    python energy_report.py exports/*.csv --suppliers suppliers.csv --jobs 4 --format csv --output report.csv
+'''
+
+RE_SINGLE_HOUSE = re.compile('^(.*?)_both_daily')
+RE_MULTIPLE_HOUSES = re.compile('^(gas|electricity)_daily')
+FUELS = ('electricity', 'gas')
+
+
+def check_single_header(header):
+    if len(header) != 3 or header[0].lower() != 'date' or header[1].lower() != FUELS[0] or header[2].lower() != FUELS[1]:
+        raise ValueError('File is not in correct format. First column must be electricity, second must be gas.')
+
+
+def check_multiple_header(header):
+    if header[0].lower() != 'date':
+        raise ValueError('File is not in correct format.')
+
+
+# Turns dates in the metrics into text, and leaves out the raw data and sketches kept for graphs and the quartiles
+def report_metrics(metrics):
+    report = OrderedDict()
+    for key, values in metrics.items():
+        report[key] = OrderedDict((name.rstrip(': '), report_value(value))
+                                  for name, value in values.items() if name not in DATA_FIELDS)
+    return report
+
+
+# Returns a metric as it is written to the report: dates as text, and NaN or infinite values as null (an empty cell in CSV)
+def report_value(value):
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def report_totals(dataset):
+    report = OrderedDict()
+    dates = [date.isoformat() for date in dataset.dates()]
+    for key in dataset.keys():
+        report[key] = OrderedDict(zip(dates, dataset.column(key)))
+    return report
+
+
+'''
+Works out the report for one usage file. This runs in a worker process, so a problem with the file
+is returned as the report's 'error' rather than raised, and the other files are still reported.
+'quantiles' and 'sketch_size' set how the quartiles of every house together are worked out (see
+energy_metrics.fleet_metrics).
+'''
+def report_file(file, supplier_data=None, resolution='monthly', cache_dir=CACHE_DIR, quantiles='auto',
+                sketch_size=SKETCH_SIZE):
+    report = OrderedDict([('file', file)])
+    name = basename(file).split('.')[0]
+    single_match = RE_SINGLE_HOUSE.search(name)
+    multiple_match = RE_MULTIPLE_HOUSES.search(name)
+    dataset = EnergyDataset()
+    validator = Validator()
+    try:
+        if single_match is not None:
+            load_cached(file, dataset, check_single_header, FUELS, cache_dir=cache_dir, validator=validator)
+            ids = [single_match.group(1)]
+            fuels = list(FUELS)
+        elif multiple_match is not None:
+            load_cached(file, dataset, check_multiple_header, cache_dir=cache_dir, validator=validator)
+            ids = dataset.keys()
+            fuels = [multiple_match.group(1)]
+        else:
+            raise ValueError("File name must be one of {fuel-type}_daily.csv or {house-id}_both_daily.csv")
+        if len(dataset) == 0:
+            raise ValueError("File contains no data")
+    except (OSError, ValueError) as error:
+        report['error'] = str(error)
+        return report
+    finally:
+        if len(validator.problems) > 0:
+            report['problems'] = [problem.as_dict() for problem in validator.problems]
+
+    fleet = single_match is None
+    keys = ids if fleet else fuels
+    monthly_rollup = Rollup(dataset, 'monthly', 7)
+    monthly = monthly_rollup.complete()
+    report['houses'] = ids
+    report['fuels'] = fuels
+    report['first_date'] = dataset.first_date().isoformat()
+    report['last_date'] = dataset.last_date().isoformat()
+    report['metrics'] = report_metrics(usage_metrics(dataset, monthly_rollup, keys, fleet,
+                                                     quantiles=quantiles, sketch_size=sketch_size))
+    totals = monthly if resolution == 'monthly' else Rollup(dataset, resolution, 7).complete()
+    report[resolution + '_usage'] = report_totals(totals)
+
+    costed = [i for i in ids if supplier_data is not None and i in supplier_data]
+    if len(costed) > 0:
+        if fleet:
+            rates, standing = supplier_rates(supplier_data, costed, fuels[0].capitalize())
+            cost_keys = costed
+        else:
+            electricity = supplier_rates(supplier_data, costed, 'Electricity')
+            gas = supplier_rates(supplier_data, costed, 'Gas')
+            rates, standing = electricity[0] + gas[0], electricity[1] + gas[1]
+            cost_keys = fuels
+        pence = EnergyDataset()
+        pence.set_data(cost_keys, dataset.ordinals, cost_columns([dataset.column(key) for key in cost_keys], rates, standing))
+        report[resolution + '_costs'] = report_totals(Rollup(pence, resolution, divisor=100).complete())
+    return report
+
+
+'''
+Reports on every file, using 'jobs' worker processes (one per core if not given, or none if jobs is 1).
+Each file is reported on by one worker. Returns the reports in the same order as the files.
+'''
+def report_files(files, supplier_data=None, resolution='monthly', jobs=None, cache_dir=CACHE_DIR, quantiles='auto',
+                 sketch_size=SKETCH_SIZE):
+    if jobs == 1 or len(files) <= 1:
+        return [report_file(file, supplier_data, resolution, cache_dir, quantiles, sketch_size) for file in files]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(report_file, files, repeat(supplier_data), repeat(resolution), repeat(cache_dir),
+                             repeat(quantiles), repeat(sketch_size)))
+
+
+'''
+Writes the reports as CSV, one figure per row: the file, the section of the report (metrics, or
+the usage or cost totals), the house or fuel, the name of the figure (or the period) and its value.
+Problems found in a file are written with their column number and row number, and the message.
+'''
+def write_csv(reports, output):
+    writer = csv.writer(output)
+    writer.writerow(['file', 'section', 'column', 'name', 'value'])
+    for report in reports:
+        for problem in report.get('problems', []):
+            column = '' if problem['column'] is None else problem['column']
+            writer.writerow([report['file'], problem['kind'], column, problem['row'], problem['message']])
+        if 'error' in report:
+            writer.writerow([report['file'], 'error', '', '', report['error']])
+            continue
+        for section, values in report.items():
+            if isinstance(values, dict):
+                for column, figures in values.items():
+                    for name, value in figures.items():
+                        writer.writerow([report['file'], section, column, name, value])
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Writes usage metrics, totals and costs for usage files without the GUI.')
+    parser.add_argument('files', nargs='+', help='usage files ({fuel-type}_daily.csv or {house-id}_both_daily.csv)')
+    parser.add_argument('--suppliers', help='supplier file to work out costs from')
+    parser.add_argument('--resolution', choices=RESOLUTIONS, default='monthly', help='period to total usage and costs over (default: %(default)s)')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json', help='report format (default: %(default)s)')
+    parser.add_argument('--output', help='file to write the report to (default: standard output)')
+    parser.add_argument('--jobs', type=int, help='number of worker processes, each reporting on whole files; the houses of one file are not split between them (default: one per core)')
+    parser.add_argument('--cache-dir', default=CACHE_DIR, help='directory for the parsed file cache (default: %(default)s)')
+    parser.add_argument('--quantiles', choices=QUANTILE_MODES, default='auto', help='how to work out the quartiles of all houses together: exact sorts every value, sketch merges a sketch of each house, auto sketches only large files (default: %(default)s)')
+    parser.add_argument('--sketch-size', type=int, default=SKETCH_SIZE, help='values kept in each quartile sketch; bigger is more accurate (default: %(default)s)')
+    args = parser.parse_args(arguments)
+    if args.sketch_size < 2:
+        parser.error("--sketch-size must be at least 2")
+
+    supplier_data = None
+    if args.suppliers is not None:
+        try:
+            supplier_data = read_supplier_file(args.suppliers)
+        except (OSError, ValueError) as error:
+            parser.error(args.suppliers + ": " + str(error))
+    reports = report_files(args.files, supplier_data, args.resolution, args.jobs, args.cache_dir,
+                           args.quantiles, args.sketch_size)
+
+    output = sys.stdout if args.output is None else open(args.output, 'w', newline='')
+    try:
+        if args.format == 'json':
+            # Anything which isn't a finite number is an error, rather than invalid JSON such as NaN
+            json.dump(reports, output, indent=2, allow_nan=False)
+            output.write("\n")
+        else:
+            write_csv(reports, output)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    failed = [report for report in reports if 'error' in report]
+    for report in failed:
+        print("Could not report on " + report['file'] + ": " + report['error'], file=sys.stderr)
+    return 1 if len(failed) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import unittest
+import csv
+import json
+import tempfile
+from os import path
+from energy_costs import read_supplier_file
+from energy_report import main, report_file, report_metrics
+
+
+class TestReport(unittest.TestCase):
+
+    def test_multiple(self):
+        print("Testing that a multiple house file is reported with its metrics and monthly totals")
+        report = report_file(self.resource('electricity_daily.csv'), cache_dir=self.cache_dir)
+
+        self.assertEqual(report['houses'], ['house_a', 'house_b', 'house_c', 'house_d'])
+        self.assertEqual(list(report['metrics'].keys())[0], 'all')
+        self.assertEqual(report['monthly_usage']['house_a']['2016-01-01'], 196.3179227)
+        self.assertNotIn('monthly_costs', report)
+
+    def test_single_with_costs(self):
+        print("Testing that a single house file is costed from the supplier file")
+        supplier_data = read_supplier_file(self.resource('suppliers.csv'))
+        report = report_file(self.resource('HouseC_both_daily.csv'), supplier_data, 'quarterly', self.cache_dir)
+
+        self.assertEqual(list(report['metrics'].keys()), ['electricity', 'gas'])
+        self.assertEqual(len(report['quarterly_usage']['gas']), 4)
+        self.assertEqual(len(report['quarterly_costs']['electricity']), 4)
+
+    def test_errors(self):
+        print("Testing that a bad file is reported as an error without stopping the others")
+        output = path.join(self.cache_dir, 'report.csv')
+        status = main([self.resource('houseH_both_daily_badcolumn.csv'), self.resource('gas_daily.csv'),
+                       '--format', 'csv', '--output', output, '--jobs', '1', '--cache-dir', self.cache_dir])
+
+        self.assertEqual(status, 1)
+        with open(output, newline='') as report:
+            rows = list(csv.reader(report))
+        self.assertEqual(rows[1][1], 'error')
+        self.assertTrue(any(row[1] == 'monthly_usage' for row in rows))
+
+        output = path.join(self.cache_dir, 'report.json')
+        main([self.resource('gas_daily.csv'), '--output', output, '--cache-dir', self.cache_dir])
+        with open(output) as report:
+            self.assertEqual(json.load(report)[0]['fuels'], ['gas'])
+
+    def test_nan(self):
+        print("Testing that a file with a NaN value is reported as an error, rather than breaking the costs")
+        supplier_data = read_supplier_file(self.resource('suppliers.csv'))
+        file = path.join(self.cache_dir, 'electricity_daily.csv')
+        with open(self.resource('electricity_daily.csv')) as original, open(file, 'w') as copy:
+            lines = original.readlines()
+            lines[2] = lines[2].split(',')[0] + ',nan,' + ','.join(lines[2].split(',')[2:])
+            copy.writelines(lines)
+        report = report_file(file, supplier_data, cache_dir=self.cache_dir)
+
+        self.assertEqual(report['error'], "Row 2, column 2: value is NaN")
+        self.assertEqual(report['problems'][0]['kind'], 'nan')
+        self.assertNotIn('metrics', report)
+
+        # Metrics which aren't finite numbers are reported as null, so the JSON stays valid
+        self.assertEqual(report_metrics({'house_a': {'Skewness: ': float('nan'), 'Mean usage: ': 1.5,
+                                                     'rawdata': [1.5]}}),
+                         {'house_a': {'Skewness': None, 'Mean usage': 1.5}})
+
+    def resource(self, name):
+        return path.join(self.working_dir, 'resources', name)
+
+    def setUp(self):
+        self.working_dir = path.dirname(path.abspath(__file__))
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.temp_dir.name
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
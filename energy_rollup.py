@@ -0,0 +1,181 @@
+import datetime
+import math
+from array import array
+from bisect import bisect_left
+
+from energy_dataset import EnergyDataset
+
+'''
+This file totals daily usage (or costs) over longer periods: weeks (starting on Monday), calendar
+months, quarters and years. Like energy_dataset.py, it does not depend on tkinter or plotly.
+
+Rather than walking the data a day at a time and adding each value to a running total, the start
+of every period is looked up once in the dataset's sorted date index, which splits each column
+into one slice per period. Each slice is then totalled with math.fsum, which runs in C and is
+exact, so only one slice per period and column is handled in Python however many days it holds.
+
+Every period which has any data is kept, along with the number of days loaded for it, so periods
+at either end of the data (or around gaps) which are only partly covered can be told apart from
+complete ones, rather than being silently counted as a whole period.
+'''
+
+RESOLUTIONS = ('weekly', 'monthly', 'quarterly', 'yearly')
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+'''
+Returns the first day of the period holding the given date.
+'''
+def period_start(date, resolution):
+    if resolution == 'weekly':
+        return date - datetime.timedelta(days=date.weekday())
+    if resolution == 'monthly':
+        return datetime.date(date.year, date.month, 1)
+    if resolution == 'quarterly':
+        return datetime.date(date.year, date.month - (date.month - 1) % 3, 1)
+    if resolution == 'yearly':
+        return datetime.date(date.year, 1, 1)
+    raise ValueError("Unknown resolution: " + str(resolution))
+
+
+'''
+Returns the first day of the period after the one starting on 'start'.
+'''
+def next_period(start, resolution):
+    if resolution == 'weekly':
+        return start + datetime.timedelta(days=7)
+    if resolution == 'yearly':
+        return datetime.date(start.year + 1, 1, 1)
+    months = start.month - 1 + (1 if resolution == 'monthly' else 3)
+    return datetime.date(start.year + months // 12, months % 12 + 1, 1)
+
+
+# The label used for a period on graph axes, e.g. '2016/01/04', 'Jan 2016', 'Q1 2016' or '2016'
+def period_label(start, resolution):
+    if resolution == 'weekly':
+        return "{:%Y/%m/%d}".format(start)
+    if resolution == 'monthly':
+        return MONTHS[start.month - 1] + " " + str(start.year)
+    if resolution == 'quarterly':
+        return "Q" + str((start.month - 1) // 3 + 1) + " " + str(start.year)
+    return str(start.year)
+
+
+class Rollup:
+
+    '''
+    Totals every column of 'source' over periods of the given resolution. The totals, and the
+    mean of each column over the days loaded in each period, are kept in two EnergyDatasets
+    indexed by the first day of each period. 'counts' holds the number of days loaded for each
+    period and 'days' the number of days in it. If 'divisor' is given, totals and means are divided
+    by it after summing (e.g. 100 to total costs in pence and show them in pounds). If 'digits' is
+    given, totals are rounded to that many decimal places.
+    '''
+    def __init__(self, source, resolution, digits=None, divisor=None):
+        if resolution not in RESOLUTIONS:
+            raise ValueError("Unknown resolution: " + str(resolution))
+        self.resolution = resolution
+        self.digits = digits
+        self.divisor = divisor
+        self.totals = EnergyDataset()
+        self.means = EnergyDataset()
+        self.counts = array('l')
+        self.days = array('l')
+        self.complete_totals = None
+        # The first and last+1 row of source in each period, and the number of rows of source rolled up
+        self.bounds = []
+        self.rows = 0
+        self.starts = array('l')
+        self.total_columns = [array('d') for key in source.keys()]
+        self.mean_columns = [array('d') for key in source.keys()]
+        self.update(source)
+
+    '''
+    Brings the rollup up to date after rows have been added to the end of 'source'. Only the last
+    period already rolled up (which the new rows may belong to) and any new periods are worked out,
+    so a daily refresh only costs as much as the rows added.
+    '''
+    def update(self, source):
+        # The last period is dropped and worked out again, starting from its first row
+        keep = max(len(self.bounds) - 1, 0)
+        lo = self.bounds[keep][0] if keep < len(self.bounds) else 0
+        for values in [self.counts, self.days, self.starts, self.bounds] + self.total_columns + self.mean_columns:
+            del values[keep:]
+
+        ordinals = source.ordinals
+        bounds = []
+        if lo < len(ordinals):
+            start = period_start(source.date_at(lo), self.resolution)
+        while lo < len(ordinals):
+            following = next_period(start, self.resolution)
+            hi = bisect_left(ordinals, following.toordinal(), lo)
+            if hi > lo:  # Periods in a gap in the data are left out
+                self.starts.append(start.toordinal())
+                bounds.append((lo, hi))
+                self.counts.append(hi - lo)
+                self.days.append(following.toordinal() - start.toordinal())
+            lo = hi
+            start = following
+        counts = self.counts[keep:]
+
+        for key, total_column, mean_column in zip(source.keys(), self.total_columns, self.mean_columns):
+            column = memoryview(source.column(key))
+            sums = [math.fsum(column[lo:hi]) for (lo, hi) in bounds]
+            if self.divisor is not None:
+                sums = [total / self.divisor for total in sums]
+            mean_column.extend([total / count for total, count in zip(sums, counts)])
+            if self.digits is not None:
+                sums = [round(total, self.digits) for total in sums]
+            total_column.extend(sums)
+        self.bounds.extend(bounds)
+        self.rows = len(ordinals)
+        self.totals.set_data(source.keys(), self.starts, self.total_columns)
+        self.means.set_data(source.keys(), array('l', self.starts), self.mean_columns)
+        self.complete_totals = None
+
+    def __len__(self):
+        return len(self.counts)
+
+    # True if every day of the period at the given position has been loaded
+    def is_complete(self, position):
+        return self.counts[position] == self.days[position]
+
+    '''
+    Returns a dataset holding the totals of complete periods only, so a month which is only partly
+    covered at the start or end of the data isn't mistaken for a month of unusually low usage.
+    '''
+    def complete(self):
+        if self.complete_totals is None:
+            positions = [p for p in range(len(self)) if self.is_complete(p)]
+            self.complete_totals = EnergyDataset()
+            self.complete_totals.set_data(self.totals.keys(), array('l', [self.totals.ordinals[p] for p in positions]),
+                                          [array('d', [column[p] for p in positions]) for column in self.totals.columns.values()])
+        return self.complete_totals
+
+
+'''
+Keeps the rollups of a dataset, working each resolution out the first time it is asked for and
+reusing it until the dataset changes (which is noticed from the dataset's version number). If
+rows have only been added to the end of the dataset, the rollup is updated rather than replaced.
+'''
+class RollupCache:
+
+    def __init__(self, dataset, digits=None, divisor=None):
+        self.dataset = dataset
+        self.digits = digits
+        self.divisor = divisor
+        self.rollups = {}
+
+    def get(self, resolution):
+        version, rollup = self.rollups.get(resolution, (None, None))
+        if version == self.dataset.version:
+            return rollup
+        if rollup is not None and version >= self.dataset.base_version:
+            rollup.update(self.dataset)  # Rows have only been added since it was worked out
+        else:
+            rollup = Rollup(self.dataset, resolution, self.digits, self.divisor)
+        self.rollups[resolution] = (self.dataset.version, rollup)
+        return rollup
+
+    def clear(self):
+        self.rollups.clear()
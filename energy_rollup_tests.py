@@ -0,0 +1,75 @@
+import unittest
+import datetime
+from array import array
+from energy_dataset import EnergyDataset
+from energy_rollup import Rollup, RollupCache, period_label
+
+
+class TestEnergyRollup(unittest.TestCase):
+
+    def test_monthly(self):
+        print("Testing that monthly rollups count the days loaded in partial months")
+        rollup = Rollup(self.dataset, 'monthly')
+
+        self.assertEqual(rollup.totals.dates(), [datetime.date(2016, 1, 1), datetime.date(2016, 2, 1)])
+        self.assertEqual(list(rollup.totals.column('house_a')), [62.0, 20.0])
+        self.assertEqual(list(rollup.means.column('house_a')), [2.0, 2.0])
+        self.assertEqual(list(rollup.counts), [31, 10])
+        self.assertEqual(rollup.complete().dates(), [datetime.date(2016, 1, 1)])
+
+    def test_weekly(self):
+        print("Testing that weeks start on Monday and partial weeks are kept")
+        rollup = Rollup(self.dataset, 'weekly')
+
+        # 1st January 2016 was a Friday
+        self.assertEqual(rollup.totals.first_date(), datetime.date(2015, 12, 28))
+        self.assertEqual(list(rollup.counts[:2]), [3, 7])
+        self.assertFalse(rollup.is_complete(0))
+        self.assertEqual(sum(rollup.counts), len(self.dataset))
+
+    def test_quarterly_and_yearly(self):
+        print("Testing quarterly and yearly rollups")
+        quarterly = Rollup(self.dataset, 'quarterly')
+        yearly = Rollup(self.dataset, 'yearly')
+
+        self.assertEqual(list(quarterly.totals.column('house_b')), [41.0])
+        self.assertEqual(list(yearly.days), [366])
+        self.assertEqual(len(yearly.complete()), 0)
+        self.assertEqual(period_label(quarterly.totals.first_date(), 'quarterly'), 'Q1 2016')
+
+    def test_cache(self):
+        print("Testing that cached rollups are updated when rows are added and replaced when the data is reloaded")
+        cache = RollupCache(self.dataset)
+        rollup = cache.get('monthly')
+        self.assertIs(cache.get('monthly'), rollup)
+
+        self.dataset.append(datetime.date(2016, 2, 11), [2.0, 1.0])
+        self.assertIs(cache.get('monthly'), rollup)
+        self.assertEqual(list(rollup.counts), [31, 11])
+        self.assertEqual(list(rollup.totals.column('house_a')), [62.0, 22.0])
+
+        self.dataset.set_data(['house_a'], self.dataset.ordinals[:1], [self.dataset.column('house_a')[:1]])
+        self.assertIsNot(cache.get('monthly'), rollup)
+
+    def test_update(self):
+        print("Testing that rows added in new months are rolled up")
+        rollup = Rollup(self.dataset, 'monthly')
+        self.dataset.extend(array('l', [datetime.date(2016, 2, 11).toordinal(), datetime.date(2016, 3, 1).toordinal()]),
+                            [array('d', [1.0, 5.0]), array('d', [1.0, 5.0])])
+        rollup.update(self.dataset)
+
+        self.assertEqual(rollup.totals.dates(), Rollup(self.dataset, 'monthly').totals.dates())
+        self.assertEqual(list(rollup.totals.column('house_a')), [62.0, 21.0, 5.0])
+        self.assertEqual(list(rollup.counts), [31, 11, 1])
+
+    def setUp(self):
+        self.dataset = EnergyDataset()
+        self.dataset.set_columns(['house_a', 'house_b'])
+        day = datetime.date(2016, 1, 1)
+        while day <= datetime.date(2016, 2, 10):
+            self.dataset.append(day, [2.0, 1.0])
+            day += datetime.timedelta(days=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
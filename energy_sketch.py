@@ -0,0 +1,126 @@
+import math
+import random
+from bisect import bisect_right
+from itertools import accumulate
+
+'''
+This file works out approximate quartiles of very large amounts of data, such as every value of
+every house in a multiple house file, without holding all of the values together or sorting them.
+Like energy_dataset.py, it does not depend on tkinter or plotly.
+
+A QuantileSketch is a KLL sketch (Karnin, Lang and Liberty, "Optimal Quantile Approximation in
+Streams", 2016). It keeps a small sample of the values, in levels: each value kept at level h
+stands for 2^h of the original values. When a level holds more values than it has room for, it is
+sorted and every other value (starting from the first or second, at random) is moved up a level,
+which keeps the rank of every value correct to within 2^h. Lower levels have less room than
+higher ones, so the sketch stays around 3 * size values however many values it covers, and the
+rank of any value is correct to within about 1/size of the number of values.
+
+Sketches can be merged, so a sketch of each house is made from the values sorted for the house's
+own quartiles (see energy_metrics.py), and the sketches of every house are merged for the
+quartiles of all of them together. Sketches use their own seeded random numbers, so the same data
+always gives the same result.
+'''
+
+# Default size of a sketch: bigger sketches are more accurate, and take longer to merge
+SKETCH_SIZE = 1024
+# How the quartiles of all houses together are worked out: 'exact' sorts every value, 'sketch'
+# merges the sketches of each house, and 'auto' sorts up to EXACT_LIMIT values and sketches beyond that
+QUANTILE_MODES = ('auto', 'exact', 'sketch')
+EXACT_LIMIT = 1000000
+
+
+class QuantileSketch:
+
+    def __init__(self, size=SKETCH_SIZE, seed=0):
+        if size < 2:
+            raise ValueError("Sketch size must be at least 2")
+        self.size = size
+        self.levels = [[]]
+        # Number of values the sketch covers
+        self.count = 0
+        self.random = random.Random(seed)
+        # The kept values in order, and the running total of their weights, worked out when first needed
+        self.values = None
+        self.ranks = None
+
+    # The number of values level h has room for, which shrinks by 2/3 for each level below the top
+    def capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.size * (2 / 3) ** depth)))
+
+    '''
+    Adds a sorted sequence of values (e.g. the values of one house). If there are more than 'size',
+    they are thinned out straight away by keeping every 2^h-th value at level h, since they are
+    already sorted.
+    '''
+    def add_sorted(self, data):
+        level = 0
+        while len(data) >> level > self.size:
+            level += 1
+        while len(self.levels) <= level:
+            self.levels.append([])
+        self.levels[level].extend(data[self.random.randrange(1 << level)::1 << level])
+        self.count += len(data)
+        self.compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, values in zip(self.levels, other.levels):
+            level.extend(values)
+        self.count += other.count
+        self.compress()
+        return self
+
+    # Moves every other value of each level that is over its capacity up a level
+    def compress(self):
+        self.values = None
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self.capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append([])
+                level = sorted(self.levels[h])
+                # With an odd number of values, one is left behind so the rest pair up
+                kept = [level.pop()] if len(level) % 2 == 1 else []
+                self.levels[h + 1].extend(level[self.random.randrange(2)::2])
+                self.levels[h] = kept
+            h += 1
+
+    # The total weight of the values kept, which is within 2^h of the number of values covered
+    def __len__(self):
+        self.rank_values()
+        return int(self.ranks[-1]) if len(self.ranks) > 0 else 0
+
+    '''
+    Returns the approximate value at the given position (from 0) of the sorted values, so a sketch
+    can be used in place of sorted data, e.g. by energy_stats.sorted_quartiles.
+    '''
+    def __getitem__(self, rank):
+        self.rank_values()
+        if len(self.values) == 0:
+            raise IndexError("Sketch is empty")
+        return self.values[min(bisect_right(self.ranks, rank), len(self.values) - 1)]
+
+    def rank_values(self):
+        if self.values is not None:
+            return
+        weighted = sorted((value, 1 << h) for h, level in enumerate(self.levels) for value in level)
+        self.values = [value for value, weight in weighted]
+        self.ranks = list(accumulate(weight for value, weight in weighted))
+
+
+# Returns a sketch of a sorted sequence of values
+def sketch_sorted(data, size=SKETCH_SIZE):
+    sketch = QuantileSketch(size)
+    sketch.add_sorted(data)
+    return sketch
+
+
+# Returns one sketch covering every sketch given
+def merge_sketches(sketches, size=SKETCH_SIZE):
+    merged = QuantileSketch(size)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
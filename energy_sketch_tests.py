@@ -0,0 +1,72 @@
+import unittest
+import datetime
+import random
+from bisect import bisect_left, bisect_right
+from energy_dataset import EnergyDataset
+from energy_metrics import MetricsCache, fleet_metrics, usage_metrics
+from energy_rollup import Rollup, RollupCache
+from energy_sketch import QuantileSketch, merge_sketches, sketch_sorted
+from energy_stats import sorted_quartiles
+
+
+class TestQuantileSketch(unittest.TestCase):
+
+    def test_accuracy(self):
+        print("Testing that quartiles from merged sketches are within the expected rank error of the exact ones")
+        sketches = [sketch_sorted(sorted(column), 256) for column in self.columns]
+        merged = merge_sketches(sketches, 256)
+        ordered = sorted(value for column in self.columns for value in column)
+        self.assertEqual(merged.count, len(ordered))
+        self.assertLess(abs(len(merged) - len(ordered)), len(ordered) * 0.01)
+        for exact, estimate in zip(sorted_quartiles(ordered), sorted_quartiles(merged)):
+            # The estimate is one of the values, and its rank is close to that of the exact quartile
+            rank = bisect_left(ordered, exact)
+            self.assertLess(min(abs(bisect_left(ordered, estimate) - rank),
+                                abs(bisect_right(ordered, estimate) - rank)), len(ordered) * 0.02)
+
+        # A sketch holding no more than its size keeps every value
+        small = sketch_sorted([1.0, 2.0, 3.0, 4.0, 5.0], 8)
+        self.assertEqual([small[i] for i in range(5)], [1.0, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(sorted_quartiles(small), sorted_quartiles([1.0, 2.0, 3.0, 4.0, 5.0]))
+        with self.assertRaises(ValueError):
+            QuantileSketch(1)
+
+    def test_modes(self):
+        print("Testing that the quartiles of all houses are exact for small data sets and sketched when asked")
+        dataset = EnergyDataset()
+        keys = ['house_' + str(i) for i in range(len(self.columns))]
+        dataset.set_columns(keys)
+        day = datetime.date(2016, 1, 1)
+        for values in zip(*self.columns):
+            dataset.append(day, list(values))
+            day += datetime.timedelta(days=1)
+        rollup = Rollup(dataset, 'monthly')
+        exact = usage_metrics(dataset, rollup, keys, True)
+        self.assertEqual(len(exact['all']['rawdata']), len(dataset) * len(keys))
+        self.assertNotIn('sketch', exact['house_0'])
+        self.assertEqual(exact['all']['Median: '],
+                         round(sorted_quartiles(sorted(value for column in self.columns for value in column))[1], 5))
+
+        sketched = usage_metrics(dataset, rollup, keys, True, quantiles='sketch', sketch_size=128)
+        self.assertIsNone(sketched['all']['rawdata'])
+        self.assertEqual(sketched['house_0']['sketch'].size, 128)
+        self.assertAlmostEqual(sketched['all']['Median: '], exact['all']['Median: '], delta=0.5)
+        self.assertEqual(sketched['all']['Mean usage: '], exact['all']['Mean usage: '])
+        self.assertEqual(sketched['house_0']['Median: '], exact['house_0']['Median: '])
+        # Houses worked out without a sketch have one made when it is needed
+        self.assertEqual(fleet_metrics(dataset, keys, exact, quantiles='sketch', sketch_size=128)['Median: '],
+                         sketched['all']['Median: '])
+        cache = MetricsCache(dataset, RollupCache(dataset), quantiles='exact')
+        cache.metrics(keys, True)
+        self.assertFalse(any('sketch' in metrics for metrics in cache.entries.values()))
+        with self.assertRaises(ValueError):
+            fleet_metrics(dataset, keys, sketched, quantiles='approximate')
+
+    def setUp(self):
+        # Twenty houses using more on average one after another, with two thousand days of random usage each
+        generator = random.Random(0)
+        self.columns = [[round(generator.gauss(10 + i, 3), 2) for day in range(2000)] for i in range(20)]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import math
+from collections import Counter
+from itertools import accumulate, repeat
+from operator import sub, truediv
+
+'''
+This file contains the statistics used for the metrics panel and graphs. Like energy_dataset.py, it does
+not depend on tkinter or plotly.
+
+Rather than calling separate mean, standard deviation, skew and kurtosis functions (each of which
+walks the data again, and recalculates the mean and standard deviation), describe() makes one
+sort and two passes over a column: one for the mean, and one which builds the squared, cubed and
+fourth-power deviations together. The sort and the sums are done by Python's built-in sorted()
+and math.fsum(), which run in C rather than in a Python loop.
+'''
+
+
+'''
+Interpolated quartiles of an already sorted sequence, using the same positions as the original
+metrics: (n-3)/4, (n-1)/2 and (3n-1)/4. If a position falls on the last value, that value is
+returned rather than interpolating past the end of the data.
+'''
+def sorted_quartiles(data):
+    size = len(data)
+    output = []
+    for i in ((size - 3) / 4, (size - 1) / 2, (3 * size - 1) / 4):
+        lower = int(i)
+        if lower + 1 >= size:
+            output.append(data[lower])
+        else:
+            output.append(data[lower] + (i - lower) * (data[lower + 1] - data[lower]))
+    return output
+
+
+'''
+Returns a dictionary holding the mean, quartiles, interquartile range, (population) standard
+deviation, sample skewness and sample excess kurtosis of a sequence of numbers.
+'''
+def describe(data):
+    n = len(data)
+    if n == 0:
+        raise ValueError("Cannot calculate metrics for an empty data set")
+    avg = math.fsum(data) / n
+    deviations = [x - avg for x in data]
+    squares = [d * d for d in deviations]
+    m2 = math.fsum(squares)
+    m3 = math.fsum([d * s for d, s in zip(deviations, squares)])
+    m4 = math.fsum([s * s for s in squares])
+
+    stats = moment_stats(n, avg, m2, m3, m4)
+    qs = sorted_quartiles(sorted(data))
+    stats['lower_quartile'] = qs[0]
+    stats['median'] = qs[1]
+    stats['upper_quartile'] = qs[2]
+    stats['iqr'] = qs[2] - qs[0]
+    return stats
+
+
+'''
+Returns a dictionary holding the mean, (population) standard deviation, sample skewness and sample
+excess kurtosis of n values, given their mean and the sums of the squares, cubes and fourth powers
+of their deviations from it (m2, m3 and m4). These can come from the values themselves (see
+describe) or from running totals (see energy_ranges.py).
+'''
+def moment_stats(n, avg, m2, m3, m4):
+    std = math.sqrt(m2 / n)
+    stats = {'mean': avg, 'std_dev': std}
+
+    # The sums of standardised powers are the raw sums divided by std^3 and std^4
+    if n <= 2 or std == 0:
+        stats['skew'] = 0
+    else:
+        stats['skew'] = m3 / std ** 3 * n / (n - 1) / (n - 2)
+    if n <= 3 or std == 0:
+        stats['kurtosis'] = 0
+    else:
+        stats['kurtosis'] = (m4 / std ** 4 * n * (n + 1) / (n - 1) / (n - 2) / (n - 3)
+                             - 3 * (n - 1) * (n - 1) / (n - 2) / (n - 3))
+    return stats
+
+
+'''
+Runs describe() over every column in a mapping of key -> sequence (for example the columns of
+an EnergyDataset), returning a mapping of key -> statistics.
+'''
+def describe_columns(columns):
+    return {key: describe(data) for key, data in columns.items()}
+
+
+'''
+Returns the trailing moving average of a sequence over 'window' values. The first window-1
+points are averaged over the values seen so far. Each average is taken from a running total
+(prefix sums), so the whole series costs one pass however long the window is.
+'''
+def rolling_mean(data, window):
+    if window < 1:
+        raise ValueError("Moving average window must be at least 1")
+    sums = [0.0]
+    sums.extend(accumulate(data))
+    averages = [sums[i + 1] / (i + 1) for i in range(min(window, len(data)))]
+    averages.extend([(sums[i + 1] - sums[i + 1 - window]) / window for i in range(window, len(data))])
+    return averages
+
+
+def rolling_means(columns, window):
+    return {key: rolling_mean(data, window) for key, data in columns.items()}
+
+
+'''
+Counts how many values fall into each of 'bins' bins of equal width, the first starting at 'start'.
+Values outside the bins are not counted. Each value's bin is worked out with map() calls which run
+in C, so the data doesn't need to be sorted or copied.
+'''
+def histogram(data, start, width, bins):
+    if width <= 0 or bins < 1:
+        raise ValueError("Histograms need a positive bin width and at least one bin")
+    counts = [0] * bins
+    positions = Counter(map(math.floor, map(truediv, map(sub, data, repeat(start)), repeat(width))))
+    for position, count in positions.items():
+        if 0 <= position < bins:
+            counts[position] = count
+    return counts
+
+
+'''
+Silverman's rule of thumb for the bandwidth of a Gaussian kernel density estimate of n values
+with the given standard deviation and interquartile range.
+'''
+def silverman_bandwidth(std_dev, iqr, n):
+    spread = min(std_dev, iqr / 1.34) if iqr > 0 else std_dev
+    return 0.9 * spread * n ** -0.2
+
+
+'''
+Smooths a histogram with a Gaussian kernel whose bandwidth is given in bins, giving a kernel
+density estimate at the centre of each bin, on the same scale as the histogram. Because it works
+from the bin counts rather than the values, it takes the same time however much data there is.
+'''
+def smooth_histogram(counts, bandwidth):
+    if bandwidth <= 0:
+        return list(counts)
+    reach = int(math.ceil(3 * bandwidth))
+    weights = [math.exp(-0.5 * (k / bandwidth) ** 2) for k in range(-reach, reach + 1)]
+    scale = math.fsum(weights)
+    smoothed = []
+    for i in range(len(counts)):
+        lo = max(0, i - reach)
+        hi = min(len(counts), i + reach + 1)
+        smoothed.append(math.fsum(counts[j] * weights[j - i + reach] for j in range(lo, hi)) / scale)
+    return smoothed
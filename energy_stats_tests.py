@@ -0,0 +1,75 @@
+import unittest
+from energy_stats import describe, describe_columns, histogram, rolling_mean, silverman_bandwidth, smooth_histogram, sorted_quartiles
+
+
+class TestDescribe(unittest.TestCase):
+
+    def test_quartiles(self):
+        print("Testing that quartiles are interpolated between sorted values")
+        self.assertEqual(sorted_quartiles([1, 2, 3, 4, 5, 6, 7, 8, 9]), [2.5, 5, 7.5])
+        self.assertEqual(sorted_quartiles([1, 2, 3]), [1, 2, 3])
+        self.assertEqual(sorted_quartiles([4]), [4, 4, 4])
+
+    def test_describe(self):
+        print("Testing the metrics calculated for a small data set")
+        stats = describe([2.0, 4.0, 4.0, 4.0, 5.0, 5.0, 7.0, 9.0])
+        self.assertAlmostEqual(stats['mean'], 5.0)
+        self.assertAlmostEqual(stats['std_dev'], 2.0)
+        self.assertEqual([stats['lower_quartile'], stats['median'], stats['upper_quartile']], [4.0, 4.5, 6.5])
+        self.assertAlmostEqual(stats['iqr'], stats['upper_quartile'] - stats['lower_quartile'])
+        self.assertAlmostEqual(stats['skew'], 1.0, places=5)
+        self.assertAlmostEqual(stats['kurtosis'], 2.72857, places=5)
+
+    def test_constant(self):
+        print("Testing that a constant data set has no skew or kurtosis")
+        stats = describe([3.0] * 10)
+        self.assertEqual(stats['std_dev'], 0)
+        self.assertEqual(stats['skew'], 0)
+        self.assertEqual(stats['kurtosis'], 0)
+
+    def test_columns(self):
+        print("Testing that several columns are described at once")
+        stats = describe_columns({'a': [1.0, 2.0], 'b': [5.0]})
+        self.assertEqual(list(stats.keys()), ['a', 'b'])
+        self.assertEqual(stats['b']['mean'], 5.0)
+        with self.assertRaises(ValueError):
+            describe([])
+
+
+class TestRollingMean(unittest.TestCase):
+
+    def test_window(self):
+        print("Testing that moving averages use the values seen so far, then a full window")
+        self.assertEqual(rolling_mean([1, 2, 3, 4, 5, 6], 3), [1.0, 1.5, 2.0, 3.0, 4.0, 5.0])
+        self.assertEqual(rolling_mean([1, 2], 30), [1.0, 1.5])
+
+    def test_matches_direct_average(self):
+        print("Testing that the running total matches averaging each window directly")
+        data = [(i * 7919) % 101 / 7 for i in range(400)]
+        averages = rolling_mean(data, 30)
+        for i in range(29, 400):
+            self.assertAlmostEqual(averages[i], sum(data[i - 29:i + 1]) / 30)
+        with self.assertRaises(ValueError):
+            rolling_mean(data, 0)
+
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_bins(self):
+        print("Testing that values are counted into bins, ignoring values outside them")
+        self.assertEqual(histogram([0.0, 0.4, 0.5, 1.2, 2.9, 3.0, -1.0], 0.0, 0.5, 6), [2, 1, 1, 0, 0, 1])
+        with self.assertRaises(ValueError):
+            histogram([1.0], 0.0, 0.0, 6)
+
+    def test_smoothing(self):
+        print("Testing that smoothing spreads a histogram out without changing its total")
+        smoothed = smooth_histogram([0, 0, 0, 0, 1, 0, 0, 0, 0], 1.0)
+        self.assertAlmostEqual(sum(smoothed), 1.0)
+        self.assertEqual(smoothed, smoothed[::-1])
+        self.assertGreater(smoothed[4], smoothed[3])
+        self.assertAlmostEqual(silverman_bandwidth(2.0, 1.34, 32), 0.45)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+import datetime
+import sys
+from itertools import islice, repeat
+from math import isfinite, isnan
+from operator import gt, sub
+
+'''
+This file checks usage data as it is loaded (see energy_loader.py), and collects every problem it
+finds, with the row and column it was found in, rather than stopping at the first one.
+
+There are two kinds of problem:
+- errors, which mean the file can't be loaded: rows with the wrong number of values, dates which
+  aren't valid yyyymmdd dates, dates which are repeated or out of order, and values which aren't
+  numbers, or are NaN or infinite (which would otherwise break the costs, graphs and metrics).
+  The loader stops at the end of the first chunk of rows with an error in it, so a bad file fails
+  within its first few thousand bad rows, however big it is, and every error in that chunk is
+  reported.
+- warnings, which are reported but don't stop the file loading: negative values, and gaps of one
+  or more days in the dates. When a folder of house files is loaded (see energy_bulk.py), files
+  which can't be loaded and days which aren't in every file are warnings too, with no row or column.
+
+Row numbers count the rows of data from 1, leaving out the header, and column numbers count the
+columns of the file from 1, so the date is column 1. Only the first MAX_PROBLEMS errors and the
+first MAX_PROBLEMS warnings are kept.
+
+Each chunk of rows is first converted in one go, as it always was. The rows are only checked one
+at a time if that fails, to find every error in the chunk. Warnings are looked for with map()
+calls over the converted arrays, which run in C, and are only located row by row when there are any.
+Negative values are looked for in the raw bytes of each column (see high_bytes), which is much
+quicker than comparing every value. The loader finds NaN and infinite values the same way.
+'''
+
+MAX_PROBLEMS = 100
+ERRORS = ('columns', 'date', 'duplicate', 'order', 'number', 'nan')
+WARNINGS = ('gap', 'negative', 'file', 'dates')
+# Position in each 8 byte float of the byte holding its sign bit and the top of its exponent
+HIGH_BYTE = 7 if sys.byteorder == 'little' else 0
+
+
+class Problem:
+
+    def __init__(self, row, column, kind, message):
+        self.row = row
+        # None if the problem is with the whole row
+        self.column = column
+        self.kind = kind
+        self.message = message
+
+    def is_error(self):
+        return self.kind in ERRORS
+
+    def as_dict(self):
+        return {'row': self.row, 'column': self.column, 'kind': self.kind, 'message': self.message}
+
+    def __repr__(self):
+        return self.message
+
+
+'''
+Raised when a file can't be loaded. The message is the first error found, and 'problems' holds
+every problem found up to that point.
+'''
+class ValidationError(ValueError):
+
+    def __init__(self, problems):
+        self.problems = list(problems)
+        errors = [problem for problem in self.problems if problem.is_error()]
+        message = errors[0].message if len(errors) > 0 else "File contains errors"
+        if len(errors) > 1:
+            message += " (and " + str(len(errors) - 1) + " more errors)"
+        super().__init__(message)
+
+
+class Validator:
+
+    def __init__(self, limit=MAX_PROBLEMS):
+        self.limit = limit
+        self.problems = []
+        self.error_count = 0
+        self.warning_count = 0
+        # True if problems were found after the limit was reached, and left out
+        self.truncated = False
+
+    def add(self, row, column, kind, message):
+        error = kind in ERRORS
+        if (self.error_count if error else self.warning_count) >= self.limit:
+            self.truncated = True
+            return False
+        self.problems.append(Problem(row, column, kind, message))
+        if error:
+            self.error_count += 1
+        else:
+            self.warning_count += 1
+        return True
+
+    def errors(self):
+        return [problem for problem in self.problems if problem.is_error()]
+
+    def warnings(self):
+        return [problem for problem in self.problems if not problem.is_error()]
+
+    def error(self):
+        return ValidationError(self.problems)
+
+    '''
+    Checks a chunk of rows one at a time, adding a problem for each row with the wrong number of
+    values or a bad date, each date which is repeated or out of order (compared with 'previous',
+    the ordinal of the row before the chunk, for the first row), and each value in the 'selected'
+    columns which isn't a number, or is NaN or infinite.
+    '''
+    def check_rows(self, chunk, width, selected, first_row=1, previous=None):
+        last = previous
+        for offset, row in enumerate(chunk):
+            number = first_row + offset
+            if len(row) != width:
+                self.add(number, None, 'columns', "Row " + str(number) + " contains wrong number of values")
+                continue
+            ordinal = date_ordinal(row[0])
+            if ordinal is None:
+                self.add(number, 1, 'date', "Row " + str(number) + ": '" + row[0] + "' is not a valid yyyymmdd date")
+            elif last is not None and ordinal == last:
+                self.add(number, 1, 'duplicate', "Row " + str(number) + " is not in date order (its date is repeated)")
+            elif last is not None and ordinal < last:
+                self.add(number, 1, 'order', "Row " + str(number) + " is not in date order")
+            if ordinal is not None:
+                last = ordinal
+            for i in selected:
+                try:
+                    value = float(row[i])
+                except ValueError:
+                    self.add(number, i + 1, 'number', "Row " + str(number) + ", column " + str(i + 1) +
+                             ": '" + row[i] + "' is not a number")
+                    continue
+                if not isfinite(value):
+                    self.add(number, i + 1, 'nan', non_finite_message(number, i, value))
+            if self.truncated and self.error_count >= self.limit:
+                break
+
+    '''
+    Looks for gaps in the dates and negative values in a converted chunk. 'positions' are
+    the header positions of the columns, and 'previous' is the ordinal of the row before the chunk.
+    '''
+    def check_values(self, ordinals, columns, positions, first_row=1, previous=None):
+        if len(ordinals) == 0:
+            return
+        if previous is not None and ordinals[0] - previous > 1:
+            self.add_gap(first_row, previous, ordinals[0])
+        if any(map(gt, map(sub, islice(ordinals, 1, None), ordinals), repeat(1))):
+            for i in range(1, len(ordinals)):
+                if ordinals[i] - ordinals[i - 1] > 1:
+                    self.add_gap(first_row + i, ordinals[i - 1], ordinals[i])
+        for position, column in zip(positions, columns):
+            high = high_bytes(column)
+            if not high.isascii():
+                for offset, value in enumerate(column):
+                    if value < 0 and not self.add(first_row + offset, position + 1, 'negative', "Row " +
+                                                  str(first_row + offset) + ", column " + str(position + 1) +
+                                                  ": value is negative (" + str(value) + ")"):
+                        break
+
+    def add_gap(self, row, before, after):
+        self.add(row, 1, 'gap', "Row " + str(row) + ": " + str(after - before - 1) + " days missing after " +
+                 "{:%Y/%m/%d}".format(datetime.date.fromordinal(before)))
+
+    # Returns a short description of the warnings found, for the status bar
+    def summary(self):
+        warnings = self.warnings()
+        if len(warnings) == 0:
+            return ""
+        count = str(len(warnings)) + ("+" if self.truncated else "")
+        return count + " warning" + ("s" if len(warnings) > 1 else "") + ", first: " + warnings[0].message
+
+
+'''
+Returns the byte of each value of a column of floats which holds its sign bit and the top seven
+bits of its exponent. Any value with its sign bit set (a byte of 0x80 or more) is negative or -0.0,
+and NaN has every exponent bit set (0x7f or 0xff), which otherwise only happens for infinity and
+numbers over about 1e303. These are only used to find out whether a column needs checking value by
+value, so it doesn't matter that -0.0 and very large values are let through.
+'''
+def high_bytes(column):
+    return memoryview(column).tobytes()[HIGH_BYTE::8]
+
+
+# Returns the position of the first NaN or infinite value of a column of floats, or None if there are none
+def first_non_finite(column):
+    high = high_bytes(column)
+    if b'\x7f' not in high and b'\xff' not in high:
+        return None
+    return next((offset for offset, value in enumerate(column) if not isfinite(value)), None)
+
+
+# Message for a NaN or infinite value, given its row number and header position
+def non_finite_message(row, position, value):
+    return ("Row " + str(row) + ", column " + str(position + 1) + ": value is " +
+            ("NaN" if isnan(value) else "infinite"))
+
+
+# Returns the day ordinal of a yyyymmdd date, or None if it isn't a valid date
+def date_ordinal(text):
+    if len(text) != 8 or not text.isdigit():
+        return None
+    try:
+        return datetime.date(int(text[:4]), int(text[4:6]), int(text[6:])).toordinal()
+    except ValueError:
+        return None
@@ -0,0 +1,72 @@
+import unittest
+import os
+import tempfile
+from os import path
+from energy_cache import cache_file, load_cached
+from energy_dataset import EnergyDataset
+from energy_loader import CsvLoader
+from energy_validation import ValidationError, Validator
+
+
+class TestValidation(unittest.TestCase):
+
+    def test_errors(self):
+        print("Testing that every error in a bad chunk is reported with its row and column, up to the limit")
+        file = self.write_file("date,a,b\n20160101,1,2\n20160102,x,2\n20160102,1,2\n20161301,1,2\n20160101,1\n"
+                               "20160101,y,z\n20160102,nan,inf\n")
+        with self.assertRaises(ValidationError) as raised:
+            CsvLoader(file).load(self.dataset)
+        self.assertEqual(str(raised.exception), "Row 2, column 2: 'x' is not a number (and 8 more errors)")
+        self.assertEqual([(p.row, p.column, p.kind) for p in raised.exception.problems],
+                         [(2, 2, 'number'), (3, 1, 'duplicate'), (4, 1, 'date'), (5, None, 'columns'),
+                          (6, 1, 'order'), (6, 2, 'number'), (6, 3, 'number'), (7, 2, 'nan'), (7, 3, 'nan')])
+        self.assertEqual(raised.exception.problems[-1].message, "Row 7, column 3: value is infinite")
+
+        validator = Validator(limit=2)
+        with self.assertRaises(ValidationError) as raised:
+            CsvLoader(file, validator=validator).load(self.dataset)
+        self.assertEqual(len(raised.exception.problems), 2)
+        self.assertTrue(validator.truncated)
+
+    def test_warnings(self):
+        print("Testing that gaps and negative values are reported without stopping the load, even from the cache")
+        file = self.write_file("date,a,b\n20160101,1,-2\n20160102,3,2\n20160105,1,2\n20160106,-1,-3\n")
+        for load in range(2):
+            validator = Validator()
+            load_cached(file, self.dataset, cache_dir=self.cache_dir, validator=validator)
+            self.assertEqual(len(self.dataset), 4)
+            self.assertEqual([(p.row, p.column, p.kind) for p in validator.problems],
+                             [(3, 1, 'gap'), (4, 2, 'negative'), (1, 3, 'negative'), (4, 3, 'negative')])
+            self.assertEqual(validator.problems[0].message, "Row 3: 2 days missing after 2016/01/02")
+            self.assertEqual(validator.errors(), [])
+
+        validator = Validator()
+        load_cached(file, self.dataset, cache_dir=self.cache_dir, select=['b'], validator=validator)
+        self.assertEqual([p.kind for p in validator.problems], ['gap', 'negative', 'negative'])
+
+        # Loading some of the columns from the CSV keeps the problems cached for the others
+        os.remove(cache_file(file, self.cache_dir))
+        load_cached(file, self.dataset, cache_dir=self.cache_dir, select=['a'])
+        load_cached(file, self.dataset, cache_dir=self.cache_dir, select=['b'])
+        validator = Validator()
+        load_cached(file, self.dataset, cache_dir=self.cache_dir, validator=validator)
+        self.assertEqual(sorted((p.row, p.column, p.kind) for p in validator.problems),
+                         [(1, 3, 'negative'), (3, 1, 'gap'), (4, 2, 'negative'), (4, 3, 'negative')])
+
+    def write_file(self, text):
+        file = path.join(self.temp_dir.name, 'usage.csv')
+        with open(file, 'w') as output:
+            output.write(text)
+        return file
+
+    def setUp(self):
+        self.dataset = EnergyDataset()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = path.join(self.temp_dir.name, 'cache')
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+
+if __name__ == '__main__':
+    unittest.main()
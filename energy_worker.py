@@ -0,0 +1,142 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+'''
+This file runs long jobs, such as loading a usage file, on a background thread, so that the
+Energy Monitor's window keeps responding while they run. Like energy_dataset.py, it does not
+depend on tkinter or plotly.
+
+tkinter widgets may only be used from the thread running the main loop, so a job never touches
+them. Instead it reports its progress, and finally its result or the error it stopped with, as
+messages on a queue, and the window collects them every so often with poll() (e.g. from a callback
+scheduled with after()). Nothing the job works out is seen by the window until its result arrives,
+so the window can swap the result in all at once.
+
+A job can be cancelled at any time. It stops the next time it calls check(), which raises
+Cancelled, so jobs should call it regularly (e.g. after each chunk of a file).
+
+Jobs which can run side by side, such as writing out several graphs, can be run on a WorkerPool,
+which hands back each job's result on a queue in the same way.
+'''
+
+
+class Cancelled(Exception):
+    pass
+
+
+class BackgroundTask:
+
+    '''
+    'job' is called on the background thread with the task, which it can use to report progress
+    and check whether it has been cancelled. Its return value is the task's result.
+    '''
+    def __init__(self, job, name=None):
+        self.job = job
+        self.messages = queue.Queue()
+        self.cancelled = threading.Event()
+        self.finished = False
+        self.thread = threading.Thread(target=self.run, name=name, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            result = self.job(self)
+        except BaseException as error:
+            self.messages.put(('error', error))
+        else:
+            self.messages.put(('done', result))
+
+    # Called by the job to send a progress message to the window
+    def report(self, message):
+        self.messages.put(('progress', message))
+
+    # Called by the job, stops it with Cancelled if cancel() has been called
+    def check(self):
+        if self.cancelled.is_set():
+            raise Cancelled()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    '''
+    Returns the messages sent since the last call, without waiting, as a list of (kind, value)
+    pairs: ('progress', message), then finally ('done', result) or ('error', exception).
+    '''
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                return messages
+            if message[0] != 'progress':
+                self.finished = True
+            messages.append(message)
+
+    # Waits for the job to finish (for scripts and tests), then returns its result or raises its error
+    def wait(self, timeout=None):
+        self.thread.join(timeout)
+        result = None
+        for kind, value in self.poll():
+            if kind == 'error':
+                raise value
+            if kind == 'done':
+                result = value
+        return result
+
+
+'''
+Runs jobs on up to 'workers' background threads at once (as many as ThreadPoolExecutor picks if not
+given). Each job is submitted with a key, and once it has finished poll() hands back a message
+for it: (key, 'done', result) or (key, 'error', exception).
+'''
+class WorkerPool:
+
+    def __init__(self, workers=None):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.messages = queue.Queue()
+        # Number of jobs whose results haven't been handed back by poll() yet
+        self.pending = 0
+
+    # Runs job(*args) once a worker is free
+    def submit(self, key, job, *args):
+        self.pending += 1
+        self.executor.submit(self.run, key, job, args)
+
+    def run(self, key, job, args):
+        try:
+            result = job(*args)
+        except BaseException as error:
+            self.messages.put((key, 'error', error))
+        else:
+            self.messages.put((key, 'done', result))
+
+    # Returns the messages of the jobs which have finished since the last call, without waiting
+    def poll(self):
+        messages = []
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                return messages
+            self.pending -= 1
+            messages.append(message)
+
+    # Waits for every job submitted so far to finish (for scripts and tests), then returns their messages
+    def wait(self, timeout=None):
+        messages = []
+        while self.pending > 0:
+            try:
+                message = self.messages.get(timeout=timeout)
+            except queue.Empty:
+                break
+            self.pending -= 1
+            messages.append(message)
+        return messages
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
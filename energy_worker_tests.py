@@ -0,0 +1,75 @@
+import unittest
+import threading
+from energy_worker import BackgroundTask, Cancelled, WorkerPool
+
+
+class TestBackgroundTask(unittest.TestCase):
+
+    def test_result(self):
+        print("Testing that progress and the result are handed back through poll")
+
+        def job(task):
+            for i in range(3):
+                task.report("step " + str(i))
+            return 'result'
+
+        task = BackgroundTask(job).start()
+        self.assertEqual(task.wait(5), 'result')
+        self.assertTrue(task.finished)
+
+        task = BackgroundTask(job).start()
+        task.thread.join(5)
+        self.assertEqual(task.poll(), [('progress', 'step 0'), ('progress', 'step 1'), ('progress', 'step 2'),
+                                       ('done', 'result')])
+        self.assertEqual(task.poll(), [])
+
+    def test_cancel_and_error(self):
+        print("Testing that a cancelled job stops at its next check, and errors are handed back")
+        started = threading.Event()
+
+        def job(task):
+            started.set()
+            while True:
+                task.check()
+
+        task = BackgroundTask(job).start()
+        started.wait(5)
+        task.cancel()
+        with self.assertRaises(Cancelled):
+            task.wait(5)
+
+        def bad_job(task):
+            raise ValueError("Bad file")
+
+        with self.assertRaisesRegex(ValueError, "Bad file"):
+            BackgroundTask(bad_job).start().wait(5)
+
+
+class TestWorkerPool(unittest.TestCase):
+
+    def test_jobs_run_at_once(self):
+        print("Testing that pooled jobs run side by side and each result is handed back with its key")
+        barrier = threading.Barrier(3, timeout=5)
+
+        def job(number):
+            # Only passes once all three jobs are running
+            barrier.wait()
+            if number == 2:
+                raise ValueError("Bad job")
+            return number * 10
+
+        pool = WorkerPool(3)
+        for number in range(3):
+            pool.submit(number, job, number)
+        self.assertEqual(pool.pending, 3)
+        messages = sorted(pool.wait(5), key=lambda message: message[0])
+        pool.shutdown()
+        self.assertEqual(pool.pending, 0)
+        self.assertEqual(messages[:2], [(0, 'done', 0), (1, 'done', 10)])
+        self.assertEqual(messages[2][:2], (2, 'error'))
+        self.assertIsInstance(messages[2][2], ValueError)
+        self.assertEqual(pool.poll(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()